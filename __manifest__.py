@@ -1,6 +1,6 @@
 {
     'name': 'EAUT ZKTeco Integration',
-    'version': '19.0.1.0.0',
+    'version': '19.0.1.1.0',
     'category': 'Human Resources',
     'summary': 'Automate attendance by integrating ZKTeco biometric devices with Odoo.',
     'author': 'Dotsprime System',
@@ -9,6 +9,7 @@
 
     'depends': [
         'base',
+        'bus',
         'hr',
         'hr_attendance',
     ],
@@ -26,6 +27,7 @@
         'wizard/zkteco_device_attendance_report_view.xml',
         'wizard/employee_leave_assign_wizard.xml',
         'wizard/attendance_reports.xml',
+        'wizard/zkteco_fingerprint_replication_view.xml',
         'views/views_inherit.xml',
         'views/attendance_state_views.xml',
         'views/zkteco_device_fingerprints.xml',
@@ -34,12 +36,15 @@
         'views/hr_employee_view.xml',
         'views/resource_calendar_attendance_view.xml',
         'views/device_user_views.xml',
+        'views/zkteco_perf_sample_views.xml',
+        'views/zkteco_device_health_views.xml',
         'views/menus.xml',
     ],
 
     'assets': {
         'web.assets_backend': [
             'dps_zkteco_biometric_integration/static/src/scss/zkteco_dashboard.scss',
+            'dps_zkteco_biometric_integration/static/src/js/zkteco_dashboard_live.js',
         ],
     },
 
@@ -5,4 +5,5 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
-from . import main
\ No newline at end of file
+from . import main
+from . import metrics
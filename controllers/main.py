@@ -10,6 +10,7 @@ from odoo.http import request
 from werkzeug.wrappers import Response
 import time
 from datetime import datetime
+from ..models.zkteco_metrics import INGEST_BUCKETS, inc_counter, mark_seen, observe
 
 
 class ZKTecoController(http.Controller):
@@ -38,6 +39,11 @@ class ZKTecoController(http.Controller):
         }
         request.env['device.stamp.logs'].sudo().create(dict)
 
+    def _record_adms_request(self, route, status, device_id):
+        env = request.env(su=True)
+        inc_counter(env, 'zkteco_adms_requests_total', route=route, status=status)
+        mark_seen(env, device_id)
+
     @http.route('/iclock/cdata', type='http', auth='public', methods=['GET'])
     def zkteco_cdata(self, **kwargs):
         """
@@ -73,7 +79,11 @@ class ZKTecoController(http.Controller):
         ])
 
         if device_id:
-            device_id.sudo().state = 'connected'
+            # the state follows last_seen, updated by _record_adms_request below
+            if device_id.state != 'connected':
+                request.env['dashboard.dashboard'].sudo()._notify_dashboard_deltas([
+                    {'type': 'device_online', 'device': device_id},
+                ])
             now = datetime.now()
             fixed_time = "00:00"
             current_time = now.strftime("%H:%M")
@@ -98,8 +108,10 @@ class ZKTecoController(http.Controller):
                 f"Encrypt=0\n"
             )
 
+            self._record_adms_request('cdata_get', 200, device_id)
             return response
 
+        self._record_adms_request('cdata_get', 405, device_id)
         return Response("No matching device found. Ensure the device is properly registered.", 405)
 
     @http.route('/iclock/cdata', type='http', auth='none', methods=['POST'], csrf=False)
@@ -158,27 +170,27 @@ class ZKTecoController(http.Controller):
         # ])
 
         if device_id:
+            Perf = env['zkteco.perf.sample']
+            line_count = sum(1 for line in base_data.splitlines() if line.strip())
+            started = time.perf_counter()
             if serial_number and table == "OPERLOG":
                 self.generate_zkteco_op_bid_logs(base_data, device_id, stp_value)
-
-                for line in base_data.strip().split('\n'):
-                    if line.startswith("OPLOG"):
-                        values = line.split()
-                        try:
-                            device_id.create_oplog(values, stp_value)
-                        except Exception as e:
-                            print(f"Error processing OPLOG: {e}")
-                    elif line.startswith("FP"):
-                        values = line.split()
-                        device_id.action_create_device_user_fingerprint(values)
-                    elif line.startswith("USER"):
-                        values = line.split()
-                        device_id.action_create_employee_device_user(values)
+                with Perf._span('adms.operlog', device_id, rows=line_count):
+                    device_id._process_operlog(base_data, stp_value)
 
             if serial_number and table == "ATTLOG":
                 self.generate_zkteco_slogs(base_data, device_id, stp_value)
 
-                device_id.action_create_device_zkteco_logs(base_data)
+                with Perf._span('adms.attlog', device_id, rows=line_count):
+                    device_id.action_create_device_zkteco_logs(base_data)
+            with Perf._span('adms.flush', device_id):
+                env.flush_all()
+            if table in ("ATTLOG", "OPERLOG"):
+                observe(env, 'zkteco_ingest_duration_seconds', time.perf_counter() - started, INGEST_BUCKETS,
+                        table=table)
+            if table == "ATTLOG":
+                inc_counter(env, 'zkteco_punches_ingested_total', line_count, device=device_id.name, source='adms')
+        self._record_adms_request('cdata_post', 200, device_id)
         return Response("OK", 200)
     @http.route('/iclock/getrequest', type='http', auth='public', methods=['GET'], csrf=False)
     def get_request(self, **kwargs):
@@ -194,8 +206,9 @@ class ZKTecoController(http.Controller):
 
         **Behavior**:
             - Identifies the device using its serial number.
-            - Fetches the next pending command for the device from Odoo.
-            - Returns the command if available; otherwise, responds with "OK".
+            - Fetches the next batch of pending commands for the device, capped in
+              number and size, and requeues commands whose acknowledgement timed out.
+            - Returns the commands if available; otherwise, responds with "OK".
 
         **Response**:
             str: A pending command for the device, or "OK" if no commands exist.
@@ -204,7 +217,9 @@ class ZKTecoController(http.Controller):
         device_id = request.env['zkteco.device.setting'].sudo().search([
             ('serial_number', '=', device_sn)
         ])
-        command = device_id.action_create_zkteco_device_user_commands()
+        with request.env['zkteco.perf.sample'].sudo()._span('adms.getrequest', device_id):
+            command = device_id.action_create_zkteco_device_user_commands()
+        self._record_adms_request('getrequest', 200, device_id)
 
         return Response(command if command else "OK", 200)
 
@@ -222,13 +237,13 @@ class ZKTecoController(http.Controller):
 
         **Request Body**:
             - Raw data containing acknowledgment details in key-value pairs
-              (e.g., "CMD=DATA&ID=1").
+              (e.g., "ID=1&Return=0&CMD=DATA").
 
         **Behavior**:
             - Decode the incoming raw data.
             - Extract acknowledgment parameters.
             - Identify the executed command (only if CMD is 'DATA' or 'CHECK').
-            - Update the command status in Odoo.
+            - Update the command status in Odoo, as failed when Return is negative.
 
         **Response**:
             str: "OK" to confirm successful processing.
@@ -242,6 +257,7 @@ class ZKTecoController(http.Controller):
             ('serial_number', '=', serial_number)
         ])
 
+        acknowledgements = {}
         for line in base_data.split('\n'):
             if not line.strip():
                 continue
@@ -250,10 +266,15 @@ class ZKTecoController(http.Controller):
             parameters_dictionary = {}
             for param in parameters:
                 if param:
-                    key, value = param.split("=")
+                    key, value = param.split("=", 1)
                     parameters_dictionary[key] = value
 
-            if parameters_dictionary.get("CMD") in ["DATA", "CHECK"]:
-                command_id = parameters_dictionary.get("ID")
-                device_id.action_check_zkteco_device_command_revert_res(command_id)
+            if parameters_dictionary.get("CMD") in ["DATA", "CHECK"] and parameters_dictionary.get("ID"):
+                acknowledgements[parameters_dictionary["ID"]] = parameters_dictionary.get("Return", "0").strip()
+
+        if device_id and acknowledgements:
+            with request.env['zkteco.perf.sample'].sudo()._span('adms.devicecmd', device_id,
+                                                                 rows=len(acknowledgements)):
+                device_id._apply_command_acknowledgements(acknowledgements)
+        self._record_adms_request('devicecmd', 200, device_id)
         return Response("OK", 200)
\ No newline at end of file
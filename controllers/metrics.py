@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import hmac
+
+from odoo import http
+from odoo.http import request
+from werkzeug.wrappers import Response
+
+METRICS_TOKEN_PARAM = 'dps_zkteco_biometric_integration.metrics_token'
+
+
+class ZKTecoMetricsController(http.Controller):
+    """
+    Prometheus scrape endpoint of the ZKTeco integration.
+    """
+
+    @http.route('/zkteco/metrics', type='http', auth='none', methods=['GET'], csrf=False, save_session=False)
+    def zkteco_metrics(self, **kwargs):
+        """
+        Render the integration metrics in the Prometheus text format.
+
+        The endpoint is disabled (404) until a token is set in the
+        'dps_zkteco_biometric_integration.metrics_token' system parameter,
+        and requires the header 'Authorization: Bearer <token>'. Values come
+        from the compact metric ledger and small indexed lookups, never from
+        a scan of the log tables.
+        """
+        env = request.env(su=True)
+        token = env['ir.config_parameter'].get_param(METRICS_TOKEN_PARAM)
+        if not token:
+            return Response("Not Found", 404)
+
+        scheme, _separator, provided = (request.httprequest.headers.get('Authorization') or '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(provided.strip().encode(), token.encode()):
+            return Response("Unauthorized", 401, headers={'WWW-Authenticate': 'Bearer'})
+
+        return Response(
+            env['zkteco.metric.value']._render_metrics(),
+            200,
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """
+    Seed the ADMS PIN counters of the devices, and move the fingerprint
+    templates stored as attachments on zkteco.device.fingerprints into the
+    content-addressed template store.
+    """
+    # the mapping writers keep the counters ahead from now on
+    cr.execute(
+        """
+        UPDATE zkteco_device_setting d
+           SET adms_next_pin = GREATEST(
+                   COALESCE(d.adms_next_pin, 0),
+                   (SELECT MAX(m.zkteco_device_attend_id::bigint)
+                      FROM zkteco_attendance_machine m
+                     WHERE m.device_id = d.id
+                       AND m.zkteco_device_attend_id ~ '^[0-9]{1,9}$') + 1,
+                   (SELECT MAX(c.pin)
+                      FROM zkteco_dcmmand c
+                     WHERE c.device_id = d.id
+                       AND c.status != 'success') + 1,
+                   1
+               )
+        """
+    )
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    attachments = env['ir.attachment'].search([
+        ('res_model', '=', 'zkteco.device.fingerprints'),
+        ('res_field', '=', 'template_data'),
+    ])
+    if not attachments:
+        return
+
+    Template = env['zkteco.fingerprint.template']
+    templates = Template._get_or_create([raw for raw in attachments.mapped('raw') if raw])
+    for attachment in attachments:
+        fingerprint = env['zkteco.device.fingerprints'].browse(attachment.res_id).exists()
+        if fingerprint and attachment.raw:
+            template = templates[Template._compute_checksum(attachment.raw)]
+            cr.execute(
+                "UPDATE zkteco_device_fingerprints SET template_id = %s WHERE id = %s",
+                (template.id, fingerprint.id),
+            )
+    attachments.unlink()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+from odoo.tools.sql import column_exists
+
+
+def migrate(cr, version):
+    """
+    Keep the latest fingerprint of each (device user, finger) so the unique
+    index on them can be created. Before finger_id existed, every row of a
+    device user becomes finger 0.
+    """
+    same_finger = (
+        "AND newer.finger_id IS NOT DISTINCT FROM f.finger_id"
+        if column_exists(cr, 'zkteco_device_fingerprints', 'finger_id') else ""
+    )
+    cr.execute("""
+        DELETE FROM zkteco_device_fingerprints f
+         USING zkteco_device_fingerprints newer
+         WHERE newer.zketco_duser_id = f.zketco_duser_id
+           %s
+           AND newer.id > f.id
+    """ % same_finger)
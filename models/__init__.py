@@ -16,4 +16,7 @@ from . import employee_leave_line
 from . import zkteco_device_states
 from . import zkteco_user_fingerprints
 from . import zkteco_cmds
-from . import dashboard_dashboard
\ No newline at end of file
+from . import dashboard_dashboard
+from . import zkteco_perf_sample
+from . import zkteco_metrics
+from . import zkteco_device_health
@@ -6,10 +6,23 @@ from datetime import datetime,timedelta
 from babel.dates import format_datetime,format_date
 from odoo.tools import DEFAULT_SERVER_DATE_FORMAT as DF,DEFAULT_SERVER_DATETIME_FORMAT as DTF,format_datetime as tool_format_datetime
 from odoo.release import version
+from odoo.tools import SQL
+from collections import defaultdict
 import json
+import operator
 
 DASHBOARD_FIELDS = ['total_attedance_logs','my_total_attedance_logs','total_attedance_state','my_total_attedance_state_color','total_device','my_total_device_color','total_employee','my_total_employee_color','total_absent','my_total_absent_color','total_present','my_total_present_color','total_late','my_total_late_color','total_early_leave','my_total_early_leave_color','present_employee_data','absent_employee_data','late_employee_data','early_leave_employee_data']
 
+# Aggregated tiles per (db, user, companies, filter, day), see _get_dashboard_aggregates;
+# per process, each worker keeps its own copy for up to DASHBOARD_CACHE_TTL seconds
+DASHBOARD_CACHE_TTL = 60
+_DASHBOARD_CACHE = {}
+
+DASHBOARD_BUS_NOTIFICATION = 'zkteco_dashboard/delta'
+_BOUND_OPERATORS = {'>=': operator.ge, '<=': operator.le, '<': operator.lt, '>': operator.gt}
+# precommit data key of the deltas queued by the current transaction
+DASHBOARD_DELTAS = 'zkteco_dashboard_deltas'
+
 class DashboardDashboard(models.Model):
 	_name = 'dashboard.dashboard'
 	_description = "Dashboard Dashboard"
@@ -73,16 +86,26 @@ class DashboardDashboard(models.Model):
 	def all_data(self):
 		self.dashboard_data_filter = 'all'
 
-	def get_filter(self,field_name):
+	@api.model
+	def _get_period_bounds(self, period):
+		"""Return the (operator, value) bounds of a dashboard filter period."""
+		if period=='today':
+			return [('>=',time.strftime('%Y-%m-%d 00:00:00')),('<=',time.strftime('%Y-%m-%d 23:59:59'))]
+		if period=='week':
+			return [('>=',(fields.Datetime.today() + relativedelta(weeks=-1,days=1,weekday=0)).strftime('%Y-%m-%d')),('<=',(fields.Datetime.today() + relativedelta(weekday=6)).strftime('%Y-%m-%d'))]
+		if period=='month':
+			return [('<',(fields.Datetime.today()+relativedelta(months=1)).strftime('%Y-%m-01')),('>=',time.strftime('%Y-%m-01'))]
+		return []
+
+	def _get_filter_bounds(self):
+		"""Return the (operator, value) bounds of the selected period."""
+		bounds = []
 		for rec in self:
-			domain = []
-			if rec.dashboard_data_filter=='today':
-				domain = [(field_name,'>=',time.strftime('%Y-%m-%d 00:00:00')),(field_name,'<=',time.strftime('%Y-%m-%d 23:59:59'))]
-			if rec.dashboard_data_filter=='week':
-				domain = [(field_name,'>=',(fields.Datetime.today() + relativedelta(weeks=-1,days=1,weekday=0)).strftime('%Y-%m-%d')),(field_name,'<=',(fields.Datetime.today() + relativedelta(weekday=6)).strftime('%Y-%m-%d'))]
-			if rec.dashboard_data_filter=='month':
-				domain = [(field_name,'<',(fields.Datetime.today()+relativedelta(months=1)).strftime('%Y-%m-01')),(field_name,'>=',time.strftime('%Y-%m-01'))]
-		return domain
+			bounds = rec._get_period_bounds(rec.dashboard_data_filter)
+		return bounds
+
+	def get_filter(self,field_name):
+		return [(field_name,operator,value) for operator,value in self._get_filter_bounds()]
 
 	@api.depends('dashboard_data_filter')
 	def _compute_total_attendance_logs(self):
@@ -113,68 +136,120 @@ class DashboardDashboard(models.Model):
 	@api.depends('dashboard_data_filter')
 	def _compute_total_absent(self):
 		for rec in self:
-			employees = self.env['hr.employee'].search(rec.get_filter('create_date'))
-			absent_count = 0
-			for emp in employees:
-				if emp.hr_presence_state == 'absent':
-					absent_count += 1
-			rec.total_absent = absent_count
-
+			rec.total_absent = len(rec._get_dashboard_aggregates()['absent'])
 
 	@api.depends('dashboard_data_filter')
 	def _compute_total_present(self):
 		for rec in self:
-			employees = self.env['hr.employee'].search(rec.get_filter('create_date'))
-			present_count = 0
-			for emp in employees:
-				if emp.hr_presence_state == 'present':
-					present_count += 1
-			rec.total_present = present_count
-	
+			rec.total_present = len(rec._get_dashboard_aggregates()['present'])
 
 	@api.depends('dashboard_data_filter')
 	def _compute_total_late(self):
 		for rec in self:
-			domain = rec.get_filter('check_in')
-			today_date = fields.Date.context_today(self)
-			today_9am = fields.Datetime.to_datetime(f"{today_date} 09:00:00")
-			attendances = self.env['hr.attendance'].search(domain)
-			late_employees = set()
-			for att in attendances:
-				if att.check_in and att.check_in > today_9am:
-					late_employees.add(att.employee_id.id)
-
-			rec.total_late = len(late_employees)
-
+			rec.total_late = len(rec._get_dashboard_aggregates()['late'])
 
 	@api.depends('dashboard_data_filter')
 	def _compute_total_early_leave(self):
 		for rec in self:
-			domain = rec.get_filter('check_out')
-			today_date = fields.Date.context_today(self)
-			today_7pm = fields.Datetime.to_datetime(f"{today_date} 19:00:00")
-			attendances = self.env['hr.attendance'].search(domain)
-			early_employee_ids = set()
-			for att in attendances:
-				if att.check_out and att.check_out < today_7pm:
-					early_employee_ids.add(att.employee_id.id)
-			rec.total_early_leave = len(early_employee_ids)
-
-	def open_late(self):
-		domain = self.get_filter('check_in')
+			rec.total_early_leave = len(rec._get_dashboard_aggregates()['early_leave'])
+
+	def _get_dashboard_aggregates(self):
+		"""
+		Compute the present, absent, late and early leave tiles with grouped SQL.
+
+		Returns a dict mapping each tile to a list of (employee id, datetime)
+		pairs, present/absent ordered by employee name and late/early leave
+		by most recent punch. The employees and attendances are restricted by
+		_search queries, so the record rules of the user apply. The result is
+		cached per user, company set and filter for DASHBOARD_CACHE_TTL seconds
+		and shared by the compute methods and the open_* actions; the cache is
+		per process, so each worker may serve its own copy until it expires.
+		"""
+		self.ensure_one()
+		company_ids = tuple(sorted(self.env.companies.ids))
 		today_date = fields.Date.context_today(self)
+		key = (self.env.cr.dbname, self.env.uid, self.env.su, company_ids, self.dashboard_data_filter, today_date)
+		now = time.monotonic()
+		cached = _DASHBOARD_CACHE.get(key)
+		if cached and cached[0] > now:
+			return cached[1]
+
+		bounds = self._get_filter_bounds()
+		Employee = self.env['hr.employee']
+		Attendance = self.env['hr.attendance']
+
+		# Presence: an employee is present while their last attendance is open.
+		employees = Employee._search(
+			[('company_id', 'in', company_ids)] + [('create_date', operator, value) for operator, value in bounds]
+		)
+		last_attendances = Attendance._search([('employee_id', 'in', employees)])
+		self.env.cr.execute(SQL("""
+			SELECT e.id, la.check_in, (la.id IS NOT NULL AND la.check_out IS NULL) AS present
+			  FROM hr_employee e
+			  LEFT JOIN hr_attendance la ON la.id = e.last_attendance_id AND la.id IN %s
+			 WHERE e.id IN %s
+			 ORDER BY e.name, e.id
+		""", last_attendances.subselect(), employees.subselect()))
+		present, absent = [], []
+		for employee_id, check_in, is_present in self.env.cr.fetchall():
+			(present if is_present else absent).append((employee_id, check_in))
+
+		# Late arrivals / early leavings: latest matching punch per employee.
+		def latest_per_employee(column, condition):
+			attendances = Attendance._search(
+				[('employee_id.company_id', 'in', company_ids), condition]
+				+ [(column, operator, value) for operator, value in bounds]
+			)
+			self.env.cr.execute(SQL("""
+				SELECT employee_id, punch_time
+				  FROM (
+					SELECT a.employee_id, %(column)s AS punch_time,
+						   ROW_NUMBER() OVER (PARTITION BY a.employee_id ORDER BY %(column)s DESC) AS rn
+					  FROM hr_attendance a
+					 WHERE a.id IN %(attendances)s
+				  ) punches
+				 WHERE rn = 1
+				 ORDER BY punch_time DESC
+			""", column=SQL.identifier('a', column), attendances=attendances.subselect()))
+			return self.env.cr.fetchall()
+
 		today_9am = fields.Datetime.to_datetime(f"{today_date} 09:00:00")
-		attendances = self.env['hr.attendance'].search(domain)
-		late_employee_ids = []
-		for att in attendances:
-			if att.check_in and att.check_in > today_9am:
-				if att.employee_id.id not in late_employee_ids:
-					late_employee_ids.append(att.employee_id.id)
+		today_7pm = fields.Datetime.to_datetime(f"{today_date} 19:00:00")
+		data = {
+			'present': present,
+			'absent': absent,
+			'late': latest_per_employee('check_in', ('check_in', '>', today_9am)),
+			'early_leave': latest_per_employee('check_out', ('check_out', '<', today_7pm)),
+		}
+
+		for expired_key in [k for k, (expiry, _data) in _DASHBOARD_CACHE.items() if expiry <= now]:
+			_DASHBOARD_CACHE.pop(expired_key, None)
+		_DASHBOARD_CACHE[key] = (now + DASHBOARD_CACHE_TTL, data)
+		return data
+
+	def _prepare_dashboard_employee_data(self, employee_times, time_key):
+		"""Serialize the first 20 (employee id, datetime) pairs of a tile for the kanban lists."""
+		employee_times = employee_times[:20]
+		employees = self.env['hr.employee'].browse([employee_id for employee_id, _dt in employee_times])
+		employee_data = []
+		for emp, (_employee_id, punch_time) in zip(employees, employee_times):
+			employee_data.append({
+				'id': emp.id,
+				'name': emp.name,
+				'department': emp.department_id.name if emp.department_id else '',
+				'job': emp.job_id.name if emp.job_id else '',
+				time_key: tool_format_datetime(self.env, punch_time) if punch_time else '',
+			})
+		return json.dumps(employee_data)
+
+	def _open_dashboard_employees(self, tile):
+		employee_ids = [employee_id for employee_id, _dt in self._get_dashboard_aggregates()[tile]]
 		action = self.env["ir.actions.actions"]._for_xml_id("hr.open_view_employee_list_my")
-		action['domain'] = [('id', 'in', late_employee_ids)]
+		action['domain'] = [('id', 'in', employee_ids)]
 		return action
 
-
+	def open_late(self):
+		return self._open_dashboard_employees('late')
 
 	def open_attendance_log(self):
 		action = self.env["ir.actions.actions"]._for_xml_id("dps_zkteco_biometric_integration.action_zkteco_device_attendance_logs")
@@ -198,156 +273,37 @@ class DashboardDashboard(models.Model):
 
 
 	def open_absent(self):
-		employees = self.env['hr.employee'].search(self.get_filter('create_date'))
-		absent_employee_ids = []
-		for emp in employees:
-			if emp.hr_presence_state == 'absent':
-				absent_employee_ids.append(emp.id)
-		action = self.env["ir.actions.actions"]._for_xml_id("hr.open_view_employee_list_my")
-		action['domain'] = [('id', 'in', absent_employee_ids)]
-		return action
+		return self._open_dashboard_employees('absent')
 
 	def open_present(self):
-		employees = self.env['hr.employee'].search(self.get_filter('create_date'))
-		present_employee_ids = []
-		for emp in employees:
-			if emp.hr_presence_state == 'present':
-				present_employee_ids.append(emp.id)
-		action = self.env["ir.actions.actions"]._for_xml_id("hr.open_view_employee_list_my")
-		action['domain'] = [('id', 'in', present_employee_ids)]
-		return action
-	
+		return self._open_dashboard_employees('present')
 
 	def open_early_leave(self):
-		domain = self.get_filter('check_out')
-
-		today_date = fields.Date.context_today(self)
-		today_7pm = fields.Datetime.to_datetime(f"{today_date} 19:00:00")
-
-		attendances = self.env['hr.attendance'].search(domain)
-
-		early_employee_ids = []
-		for att in attendances:
-			if att.check_out and att.check_out < today_7pm:
-				if att.employee_id.id not in early_employee_ids:
-					early_employee_ids.append(att.employee_id.id)
-
-		action = self.env["ir.actions.actions"]._for_xml_id("hr.open_view_employee_list_my")
-		action['domain'] = [('id', 'in', early_employee_ids)]
-		return action
+		return self._open_dashboard_employees('early_leave')
 
-	
 	@api.depends('dashboard_data_filter')
 	def _compute_present_employee(self):
 		for rec in self:
-			employees = self.env['hr.employee'].search(rec.get_filter('create_date'))
-
-			present_employee_ids = []
-			employee_data = []
-			tzinfo = self.env.context.get('tz') or self.env.user.tz or 'UTC'
-			locale = self.env.context.get('lang') or self.env.user.lang or 'en_US'
-
-			for emp in employees:
-				if emp.hr_presence_state == 'present':
-					present_employee_ids.append(emp.id)
-
-			rec.total_present = len(present_employee_ids)
-
-			for emp in self.env['hr.employee'].browse(present_employee_ids[:20]):
-				last_attendance = emp.attendance_ids.sorted(key=lambda r: r.check_in, reverse=True)
-				last_check_in = last_attendance[0].check_in if last_attendance else ''
-				employee_data.append({
-					'id': emp.id,
-					'name': emp.name,
-					'department': emp.department_id.name if emp.department_id else '',
-					'job': emp.job_id.name if emp.job_id else '',
-					'check_in': tool_format_datetime(self.env, last_check_in) if last_check_in else '',
-				})
-
-			rec.present_employee_data = json.dumps(employee_data)
+			rec.present_employee_data = rec._prepare_dashboard_employee_data(
+				rec._get_dashboard_aggregates()['present'], 'check_in')
 
 	@api.depends('dashboard_data_filter')
 	def _compute_absent_employee(self):
 		for rec in self:
-			employees = self.env['hr.employee'].search(rec.get_filter('create_date'))
-			absent_employee_ids = []
-			employee_data = []
-			tzinfo = self.env.context.get('tz') or self.env.user.tz or 'UTC'
-			locale = self.env.context.get('lang') or self.env.user.lang or 'en_US'
-			for emp in employees:
-				if emp.hr_presence_state == 'absent':
-					absent_employee_ids.append(emp.id)
-			rec.total_absent = len(absent_employee_ids)
-			for emp in self.env['hr.employee'].browse(absent_employee_ids[:20]):
-				last_attendance = emp.attendance_ids.sorted(key=lambda r: r.check_in, reverse=True)
-				last_check_in = last_attendance[0].check_in if last_attendance else ''
-				employee_data.append({
-					'id': emp.id,
-					'name': emp.name,
-					'department': emp.department_id.name if emp.department_id else '',
-					'job': emp.job_id.name if emp.job_id else '',
-					'last_check_in': tool_format_datetime(self.env, last_check_in) if last_check_in else '',
-				})
-			rec.absent_employee_data = json.dumps(employee_data)
-
-
+			rec.absent_employee_data = rec._prepare_dashboard_employee_data(
+				rec._get_dashboard_aggregates()['absent'], 'last_check_in')
 
 	@api.depends('dashboard_data_filter')
 	def _compute_late_employee(self):
 		for rec in self:
-			domain = rec.get_filter('check_in')
-			today_date = fields.Date.context_today(self)
-			today_9am = fields.Datetime.to_datetime(f"{today_date} 09:00:00")
-			attendances = self.env['hr.attendance'].search(domain)
-			late_employee_ids = set()
-			for att in attendances:
-				if att.check_in and att.check_in > today_9am:
-					late_employee_ids.add(att.employee_id.id)
-			rec.total_late = len(late_employee_ids)
-
-			employee_data = []
-			for emp in self.env['hr.employee'].browse(list(late_employee_ids)[:20]):
-				last_attendance = emp.attendance_ids.sorted(key=lambda r: r.check_in, reverse=True)
-				last_check_in = last_attendance[0].check_in if last_attendance else ''
-				employee_data.append({
-					'id': emp.id,
-					'name': emp.name,
-					'department': emp.department_id.name if emp.department_id else '',
-					'job': emp.job_id.name if emp.job_id else '',
-					'last_check_in': tool_format_datetime(self.env, last_check_in) if last_check_in else '',
-				})
-
-			rec.late_employee_data = json.dumps(employee_data or [])
+			rec.late_employee_data = rec._prepare_dashboard_employee_data(
+				rec._get_dashboard_aggregates()['late'], 'last_check_in')
 
 	@api.depends('dashboard_data_filter')
 	def _compute_early_leave_employee(self):
 		for rec in self:
-			domain = rec.get_filter('check_out')
-			today_date = fields.Date.context_today(self)
-			today_7pm = fields.Datetime.to_datetime(f"{today_date} 19:00:00")
-			
-			attendances = self.env['hr.attendance'].search(domain)
-			early_employee_ids = set()
-			
-			for att in attendances:
-				if att.check_out and att.check_out < today_7pm:
-					early_employee_ids.add(att.employee_id.id)
-			
-			rec.total_early_leave = len(early_employee_ids)
-			employee_data = []
-			for emp in self.env['hr.employee'].browse(list(early_employee_ids)[:20]):
-				last_attendance = emp.attendance_ids.sorted(key=lambda r: r.check_out, reverse=True)
-				last_check_out = last_attendance[0].check_out if last_attendance else ''
-				employee_data.append({
-					'id': emp.id,
-					'name': emp.name,
-					'department': emp.department_id.name if emp.department_id else '',
-					'job': emp.job_id.name if emp.job_id else '',
-					'last_check_out': tool_format_datetime(self.env, last_check_out) if last_check_out else '',
-				})
-			rec.early_leave_employee_data = json.dumps(employee_data or [])
-
-	
+			rec.early_leave_employee_data = rec._prepare_dashboard_employee_data(
+				rec._get_dashboard_aggregates()['early_leave'], 'last_check_out')
 
 	def main_open_dashboard_action(self):
 		method = self._context.get('main_action')
@@ -356,4 +312,118 @@ class DashboardDashboard(models.Model):
 		result = getattr(self,method)()
 		return result
 
-
+	@api.model
+	def _notify_dashboard_deltas(self, events):
+		"""
+		Queue compact dashboard deltas, published on the bus for live dashboards
+		when the current transaction commits, with one message per company.
+
+		``events`` is a list of dicts holding a ``type`` (``check_in``,
+		``check_out``, ``device_online`` or ``device_offline``) and either an
+		``employee`` or a ``device`` record; attendance events also hold the
+		``attendance`` they come from.
+		"""
+		if not events:
+			return
+		precommit = self.env.cr.precommit
+		queued = precommit.data.get(DASHBOARD_DELTAS)
+		if queued is None:
+			queued = precommit.data[DASHBOARD_DELTAS] = []
+
+			@precommit.add
+			def _publish_dashboard_deltas():
+				self.sudo()._publish_dashboard_deltas(precommit.data.pop(DASHBOARD_DELTAS, []))
+		queued.extend(events)
+
+	@api.model
+	def _get_new_tile_employees(self, events, period_bounds):
+		"""
+		Return {(tile, employee id): [periods]} of the employees the attendances
+		of events bring into the late and early leave tiles: the tiles count
+		employees, so an attendance only adds one when it is the only matching
+		attendance of its employee in the period. One grouped count per tile
+		and period with candidates.
+		"""
+		today_date = fields.Date.context_today(self)
+		tiles = {
+			'late': ('check_in', 'check_in', '>', fields.Datetime.to_datetime(f"{today_date} 09:00:00")),
+			'early_leave': ('check_out', 'check_out', '<', fields.Datetime.to_datetime(f"{today_date} 19:00:00")),
+		}
+		new_tiles = defaultdict(list)
+		for tile, (event_type, column, operator, limit) in tiles.items():
+			attendances = [
+				event['attendance'] for event in events
+				if event['type'] == event_type and event.get('attendance') and event['attendance'][column]
+				and _BOUND_OPERATORS[operator](event['attendance'][column], limit)
+			]
+			for period, bounds in period_bounds.items():
+				candidates = defaultdict(int)
+				for attendance in attendances:
+					punch_time = fields.Datetime.to_string(attendance[column])
+					if all(_BOUND_OPERATORS[bound_operator](punch_time, value) for bound_operator, value in bounds):
+						candidates[attendance.employee_id.id] += 1
+				if not candidates:
+					continue
+				counts = dict(self.env['hr.attendance']._read_group(
+					[('employee_id', 'in', list(candidates)), (column, operator, limit)]
+					+ [(column, bound_operator, value) for bound_operator, value in bounds],
+					['employee_id'], ['__count'],
+				))
+				for employee, count in counts.items():
+					if count == candidates[employee.id]:
+						new_tiles[tile, employee.id].append(period)
+		return new_tiles
+
+	@api.model
+	def _publish_dashboard_deltas(self, events):
+		"""
+		Send the queued deltas, one bus message per company. Employee events
+		carry the filter periods the employee is counted in, so the client only
+		adjusts the counters of the filter it displays; ``late`` and
+		``early_leave`` events are added for the employees entering those
+		tiles. Cached tiles of the affected companies are dropped so the next
+		reload re-aggregates.
+		"""
+		if not events:
+			return
+		period_bounds = {
+			period: self._get_period_bounds(period)
+			for period, _label in self._fields['dashboard_data_filter'].selection
+		}
+		payloads = defaultdict(list)
+		for event in events:
+			if event.get('employee'):
+				employee = event['employee']
+				create_date = fields.Datetime.to_string(employee.create_date)
+				payloads[employee.company_id.id].append({
+					'type': event['type'],
+					'employee_id': employee.id,
+					'filters': [
+						period for period, bounds in period_bounds.items()
+						if all(_BOUND_OPERATORS[operator](create_date, value) for operator, value in bounds)
+					],
+				})
+			elif event.get('device'):
+				device = event['device']
+				payloads[device.company_id.id].append({
+					'type': event['type'],
+					'device_id': device.id,
+					'name': device.name,
+				})
+		for (tile, employee_id), periods in self._get_new_tile_employees(events, period_bounds).items():
+			employee = self.env['hr.employee'].browse(employee_id)
+			payloads[employee.company_id.id].append({
+				'type': tile,
+				'employee_id': employee_id,
+				'filters': periods,
+			})
+
+		group = self.env.ref('hr_attendance.group_hr_attendance_manager', raise_if_not_found=False)
+		for company_id, company_events in payloads.items():
+			if group:
+				self.env['bus.bus']._sendone(group, DASHBOARD_BUS_NOTIFICATION, {
+					'company_id': company_id,
+					'events': company_events,
+				})
+			for key in [key for key in _DASHBOARD_CACHE if company_id in key[3]]:
+				_DASHBOARD_CACHE.pop(key, None)
@@ -5,9 +5,13 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
+import re
+
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.tools import SQL
 
+from .zkteco_device_settings import NUMERIC_PIN_PATTERN
 from odoo import models, fields, _
 from odoo.exceptions import UserError
 
@@ -54,27 +58,46 @@ class HrEmployee(models.Model):
         if existing_command:
             raise UserError(_("A pending 'DATA' command already exists for this employee on this device."))
 
-        all_zketco_duser_ids = self.env['zkteco.attendance.machine'].sudo().search([]).mapped('zkteco_device_attend_id')
-        int_user_ids_list = [int(uid) for uid in all_zketco_duser_ids]
-
-        pending_pin_list = self.env['zkteco.dcmmand'].search([('status', '!=', 'success')]).mapped('pin')
-
-        combined_pin_list = int_user_ids_list + pending_pin_list
-        next_pin = max(combined_pin_list) + 1 if combined_pin_list else 1
-
-        command = self.env['zkteco.dcmmand'].sudo().create({
-            'name': 'DATA',
-            'device_id': device_id.id,
-            'employee_id': self.id,
-            'status': 'pending',
-            'pin': next_pin,
-        })
-
-        card_number = self.barcode if self.barcode else "0000000000"
-        command.execution_log = (
-            f"C:{command.id}:DATA USER PIN={next_pin} "
-            f"Name={self.name} Pri=0 Passwd= Card=[{card_number}] Grp=1 TZ=0000000000000000\n"
-        )
+        return self.create_export_commands(self, device_id)
+
+    @api.model
+    def create_export_commands(self, employees, device_id):
+        """
+        Create the 'DATA USER' commands exporting many employees to an ADMS
+        device with a single create. Employees that already have a pending
+        'DATA' command for the device are skipped.
+        """
+        pending_commands = self.env['zkteco.dcmmand'].sudo().search([
+            ('employee_id', 'in', employees.ids),
+            ('device_id', '=', device_id.id),
+            ('name', '=', 'DATA'),
+            ('status', '=', 'pending')
+        ])
+        employees -= pending_commands.employee_id
+        if not employees:
+            return self.env['zkteco.dcmmand']
+
+        next_pin = device_id.sudo()._allocate_adms_pins(len(employees))
+
+        vals_list = []
+        for pin, employee in enumerate(employees, start=next_pin):
+            card_number = employee.barcode if employee.barcode else "0000000000"
+            vals_list.append({
+                'name': 'DATA',
+                'device_id': device_id.id,
+                'employee_id': employee.id,
+                'status': 'pending',
+                'pin': pin,
+                'device_user_pin': str(pin),
+                'device_user_name': employee.name,
+                'execution_log': (
+                    f"DATA USER PIN={pin} "
+                    f"Name={employee.name} Pri=0 Passwd= Card=[{card_number}] Grp=1 TZ=0000000000000000\n"
+                ),
+            })
+        commands = self.env['zkteco.dcmmand'].sudo().create(vals_list)
+        commands._prefix_execution_log()
+        return commands
 
     def employee_del_command(self, device_id):
 
@@ -97,6 +120,7 @@ class HrEmployee(models.Model):
             'employee_id': self.id,
             'status': 'pending',
             'pin': matched_device.zkteco_device_attend_id,
+            'device_user_pin': matched_device.zkteco_device_attend_id,
         })
 
         command.execution_log = f"C:{command.id}:DATA DEL_USER PIN={matched_device.zkteco_device_attend_id} \n"
@@ -122,6 +146,8 @@ class HrEmployee(models.Model):
             'employee_id': self.id,
             'status': 'pending',
             'pin': matched_device.zkteco_device_attend_id,
+            'device_user_pin': matched_device.zkteco_device_attend_id,
+            'device_user_name': self.name,
         })
 
         command.execution_log = f"C:{command.id}:DATA USER PIN={matched_device.zkteco_device_attend_id} Name={self.name} \n"
@@ -165,6 +191,46 @@ class ZktecoAttendanceMachine(models.Model):
         help='Employee badge barcode, automatically fetched from the employee record.'
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        mappings = super().create(vals_list)
+        mappings._sync_device_pin_counters()
+        return mappings
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'zkteco_device_attend_id' in vals or 'device_id' in vals:
+            self._sync_device_pin_counters()
+        return res
+
+    def _sync_device_pin_counters(self):
+        """
+        Keep the ADMS PIN counter of the devices of self past their numeric
+        PINs, with one UPDATE that only touches the devices left behind.
+        """
+        highest_pins = {}
+        for mapping in self:
+            pin = mapping.zkteco_device_attend_id
+            if pin and re.match(NUMERIC_PIN_PATTERN, pin):
+                device_id = mapping.device_id.id
+                highest_pins[device_id] = max(highest_pins.get(device_id, 0), int(pin))
+        if not highest_pins:
+            return
+        Device = self.env['zkteco.device.setting']
+        Device.flush_model(['adms_next_pin'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE zkteco_device_setting d
+               SET adms_next_pin = v.pin + 1
+              FROM (VALUES %s) AS v(id, pin)
+             WHERE d.id = v.id
+               AND COALESCE(d.adms_next_pin, 0) <= v.pin
+            """,
+            SQL(", ").join(SQL("(%s, %s)", device_id, pin) for device_id, pin in highest_pins.items()),
+        ))
+        if self.env.cr.rowcount:
+            Device.browse(list(highest_pins)).invalidate_recordset(['adms_next_pin'])
+
 
 class ResourceCalendarInherit(models.Model):
     """
@@ -15,6 +15,7 @@ class ResConfigSettingsInherit(models.TransientModel):
     Provides:
     - Minimal Attendance: Enables a mode where attendance records are stored in minimal form.
     - Multiple Shift: Allows multiple shift handling for employees.
+    - Performance Instrumentation: Records pipeline timings in zkteco.perf.sample.
     """
     _inherit = 'res.config.settings'
 
@@ -29,3 +30,8 @@ class ResConfigSettingsInherit(models.TransientModel):
         string='User Minimal Attendance',
         config_parameter='dps_zkteco_biometric_integration.minimal_attendance'
     )
+
+    perf_instrumentation = fields.Boolean(
+        string='Performance Instrumentation',
+        config_parameter='dps_zkteco_biometric_integration.perf_instrumentation'
+    )
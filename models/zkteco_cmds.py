@@ -5,7 +5,18 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
-from odoo import models, fields
+import re
+from datetime import timedelta
+
+from odoo import api, models, fields
+from odoo.tools import SQL
+
+# Defaults of the per-poll dispatch limits, overridable through
+# ir.config_parameter (see DeviceCommand._get_dispatch_limits).
+COMMAND_BATCH_SIZE = 50
+COMMAND_BATCH_BYTES = 16384
+COMMAND_ACK_TIMEOUT = 300
+COMMAND_MAX_RETRIES = 3
 
 class DeviceCommand(models.Model):
     _name = 'zkteco.dcmmand'
@@ -21,5 +32,136 @@ class DeviceCommand(models.Model):
         ('failed', 'Failed'),
     ], string='Status', default='pending')
     pin = fields.Integer('PIN')
+    device_user_pin = fields.Char(
+        string='Device PIN',
+        help='PIN exactly as sent to the device (e.g. with leading zeros), matched against the device users on acknowledgement.'
+    )
+    device_user_name = fields.Char(
+        string='Device User Name',
+        help='Name sent to the device with the command, stored so acknowledgements need not parse the log.'
+    )
     execution_log = fields.Text(string='Execution Log')
+    dispatch_date = fields.Datetime(
+        string='Dispatched On', readonly=True, copy=False,
+        help='Last time the command was handed to the device through /iclock/getrequest.'
+    )
+    retry_count = fields.Integer(
+        string='Retries', readonly=True, copy=False,
+        help='Number of times the command was requeued after an acknowledgement timeout.'
+    )
+
+    _device_status_idx = models.Index('(device_id, status)')
+    # the open commands are few next to the acknowledged history, counted on every metrics scrape
+    _open_status_idx = models.Index("(status) WHERE status IN ('pending', 'executed')")
+
+    @api.model
+    def _get_dispatch_limits(self):
+        """
+        Return (max commands, max bytes, ack timeout in seconds, max retries)
+        used when handing pending commands to a device.
+        """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        prefix = 'dps_zkteco_biometric_integration.'
+        return (
+            int(get_param(prefix + 'command_batch_size', COMMAND_BATCH_SIZE)),
+            int(get_param(prefix + 'command_batch_bytes', COMMAND_BATCH_BYTES)),
+            int(get_param(prefix + 'command_ack_timeout', COMMAND_ACK_TIMEOUT)),
+            int(get_param(prefix + 'command_max_retries', COMMAND_MAX_RETRIES)),
+        )
+
+    @api.model
+    def _requeue_unacknowledged(self, device, ack_timeout, max_retries):
+        """
+        Put back in the queue the commands of the device that were dispatched
+        but not acknowledged within ``ack_timeout`` seconds, or mark them as
+        failed once they have been retried ``max_retries`` times. Executed
+        commands without dispatch date, dispatched before it was recorded,
+        are requeued at once.
+        """
+        self.flush_model(['status', 'dispatch_date', 'retry_count'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE zkteco_dcmmand
+               SET status = CASE WHEN COALESCE(retry_count, 0) >= %(max_retries)s
+                                 THEN 'failed' ELSE 'pending' END,
+                   retry_count = COALESCE(retry_count, 0) + 1
+             WHERE device_id = %(device_id)s
+               AND status = 'executed'
+               -- commands executed before dispatch_date existed are as late as can be
+               AND (dispatch_date < %(deadline)s OR dispatch_date IS NULL)
+            """,
+            device_id=device.id,
+            max_retries=max_retries,
+            deadline=fields.Datetime.now() - timedelta(seconds=ack_timeout),
+        ))
+        if self.env.cr.rowcount:
+            self.invalidate_model(['status', 'retry_count'])
+
+    @api.model
+    def _dispatch_pending(self, device):
+        """
+        Return the next batch of pending commands of the device, oldest first,
+        bounded by the configured number of commands and bytes, and mark the
+        batch as executed with a single write. Rows locked by a concurrent
+        poll are skipped rather than sent twice.
+        """
+        max_commands, max_bytes, ack_timeout, max_retries = self._get_dispatch_limits()
+        self._requeue_unacknowledged(device, ack_timeout, max_retries)
+
+        self.flush_model(['status', 'device_id'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT id, execution_log
+              FROM zkteco_dcmmand
+             WHERE device_id = %(device_id)s AND status = 'pending'
+          ORDER BY id
+             LIMIT %(limit)s
+               FOR UPDATE SKIP LOCKED
+            """,
+            device_id=device.id,
+            limit=max_commands,
+        ))
+        command_ids, payload, payload_size = [], [], 0
+        for command_id, execution_log in self.env.cr.fetchall():
+            execution_log = execution_log or ''
+            log_size = len(execution_log.encode('utf-8'))
+            if command_ids and payload_size + log_size > max_bytes:
+                break
+            command_ids.append(command_id)
+            payload.append(execution_log)
+            payload_size += log_size
+
+        if command_ids:
+            self.browse(command_ids).write({
+                'status': 'executed',
+                'dispatch_date': fields.Datetime.now(),
+            })
+        return ''.join(payload)
+
+    def _get_device_user_pin(self):
+        """
+        Return the PIN text of the command as sent to the device. Commands
+        queued before the PIN text was stored fall back on the PIN= token of
+        their execution log, then on the numeric PIN.
+        """
+        self.ensure_one()
+        if self.device_user_pin:
+            return self.device_user_pin
+        match = re.search(r'\bPIN=([^\s]+)', self.execution_log or '')
+        if match:
+            return match.group(1)
+        return str(self.pin)
 
+    def _prefix_execution_log(self):
+        """
+        Prefix the execution logs with the 'C:<id>:' header that ADMS devices
+        echo back when acknowledging, in one UPDATE for commands created in bulk.
+        """
+        if not self:
+            return
+        self.flush_recordset(['execution_log'])
+        self.env.cr.execute(SQL(
+            "UPDATE zkteco_dcmmand SET execution_log = 'C:' || id || ':' || execution_log WHERE id = ANY(%s)",
+            self.ids,
+        ))
+        self.invalidate_recordset(['execution_log'])
@@ -6,7 +6,7 @@
 ########################################################
 
 from odoo import api, fields, models
-from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
 
 
 class ZKTecoDeviceEventLog(models.Model):
@@ -107,19 +107,47 @@ class ZKTecoDeviceEventLog(models.Model):
         help="Operation stamp number used for synchronization and ordering."
     )
 
-    @api.constrains('log_code', 'device_id')
-    def _check_unique_log_per_device(self):
+    _natural_key_uniq = models.UniqueIndex(
+        "(device_id, op_time, COALESCE(log_code, ''), COALESCE(operator, ''),"
+        " COALESCE(value_1, ''), COALESCE(value_2, ''), COALESCE(value_3, ''))",
+        "This operation log was already recorded for the device.",
+    )
+
+    # Columns written by _insert_skip_duplicates, in VALUES order, with the
+    # casts needed since a multi-row VALUES list types bare literals as text
+    _INSERT_FIELDS = (
+        ('device_id', 'integer'), ('log_code', 'varchar'), ('description', 'varchar'),
+        ('operator', 'varchar'), ('op_time', 'timestamp'), ('value_1', 'varchar'),
+        ('value_2', 'varchar'), ('value_3', 'varchar'), ('reserved', 'varchar'),
+        ('opStamp', 'integer'),
+    )
+
+    @api.model
+    def _insert_skip_duplicates(self, vals_list):
         """
-        Ensures that the same log code cannot be duplicated
-        for the same device. This avoids redundant log entries.
+        Insert operation logs in a single statement, silently skipping the
+        rows already recorded (per the natural key unique index). Returns the
+        number of inserted rows.
         """
-        for log in self:
-            duplicate = self.search([
-                ('log_code', '=', log.log_code),
-                ('device_id', '=', log.device_id.id),
-                ('id', '!=', log.id)
-            ], limit=1)
-            if duplicate:
-                raise ValidationError(
-                    f"The log with code '{log.log_code}' already exists for the selected device."
-                )
+        if not vals_list:
+            return 0
+        self.flush_model()
+        uid = self.env.uid
+        columns = [field_name for field_name, _cast in self._INSERT_FIELDS]
+        columns += ['create_uid', 'create_date', 'write_uid', 'write_date']
+        rows = SQL(", ").join(
+            SQL("(%s)", SQL(", ").join(
+                [SQL(f"%s::{cast}", vals.get(field_name) if vals.get(field_name) != '' else None)
+                 for field_name, cast in self._INSERT_FIELDS]
+                + [SQL("%s", uid), SQL("(now() at time zone 'UTC')"),
+                   SQL("%s", uid), SQL("(now() at time zone 'UTC')")]
+            ))
+            for vals in vals_list
+        )
+        self.env.cr.execute(SQL(
+            "INSERT INTO %s (%s) VALUES %s ON CONFLICT DO NOTHING",
+            SQL.identifier(self._table),
+            SQL(", ").join(SQL.identifier(column) for column in columns),
+            rows,
+        ))
+        return self.env.cr.rowcount
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..zk import ZK
+from .zkteco_metrics import mark_seen
+
+_logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_WORKERS = 16
+# socket timeout of a probe, the connection itself is bounded by ZK's connect_timeout
+HEALTH_PROBE_TIMEOUT = 5
+HEALTH_RETENTION_DAYS = 30
+# seconds without news after which a device is offline: two monitor runs for
+# binary devices, three missed polls (at least a minute) for ADMS devices
+DEVICE_STALE_AFTER = 600
+ADMS_MISSED_POLLS = 3
+ADMS_STALE_AFTER_MIN = 60
+# seconds between two writes of the last-seen time of a device by a process
+LAST_SEEN_WRITE_INTERVAL = 30
+
+
+def probe_device(ip, port, password):
+    """
+    Connect to a binary-protocol device and read its sizes; return the
+    values of a health sample. Runs in a worker thread, without any env.
+    """
+    zk = ZK(ip, port, timeout=HEALTH_PROBE_TIMEOUT, password=password)
+    try:
+        zk.connect()
+    except Exception as exc:
+        return {'online': False, 'error': str(exc)[:200]}
+    try:
+        started = time.perf_counter()
+        zk.read_sizes()
+        return {
+            'online': True,
+            'rtt_ms': (time.perf_counter() - started) * 1000.0,
+            'users': zk.users,
+            'users_cap': zk.users_cap,
+            'fingers': zk.fingers,
+            'fingers_cap': zk.fingers_cap,
+            'records': zk.records,
+            'records_cap': zk.rec_cap,
+        }
+    except Exception as exc:
+        return {'online': False, 'error': str(exc)[:200]}
+    finally:
+        try:
+            zk.disconnect()
+        except Exception:
+            pass
+
+
+class ZktecoDeviceHealth(models.Model):
+    """
+    Health history of the device fleet.
+
+    A cron probes every binary device concurrently (connection, one
+    read_sizes round trip for the RTT and the storage usage), and judges the
+    ADMS and live-captured devices from their last-seen time, writing one
+    compact sample per device and run.
+    """
+    _name = 'zkteco.device.health'
+    _description = 'ZKTeco Device Health Sample'
+    _order = 'sample_date desc, id desc'
+    _rec_name = 'device_id'
+    _log_access = False
+
+    sample_date = fields.Datetime(
+        string='Checked At',
+        required=True,
+        default=fields.Datetime.now,
+        readonly=True
+    )
+    device_id = fields.Many2one(
+        'zkteco.device.setting',
+        string='Device',
+        required=True,
+        ondelete='cascade',
+        readonly=True
+    )
+    online = fields.Boolean(
+        string='Online',
+        readonly=True
+    )
+    rtt_ms = fields.Float(
+        string='RTT (ms)',
+        readonly=True,
+        aggregator='avg',
+        help='Round trip of one command to a binary device, empty for the devices judged from their last-seen time.'
+    )
+    users = fields.Integer(string='Users', readonly=True, aggregator='max')
+    users_cap = fields.Integer(string='User Capacity', readonly=True, aggregator='max')
+    fingers = fields.Integer(string='Fingerprints', readonly=True, aggregator='max')
+    fingers_cap = fields.Integer(string='Fingerprint Capacity', readonly=True, aggregator='max')
+    records = fields.Integer(string='Records', readonly=True, aggregator='max')
+    records_cap = fields.Integer(string='Record Capacity', readonly=True, aggregator='max')
+    error = fields.Char(
+        string='Error',
+        readonly=True
+    )
+
+    _device_date_idx = models.Index('(device_id, sample_date)')
+
+    @api.model
+    def _last_online(self, devices):
+        """ {device id: online} of the latest sample of each device """
+        if not devices:
+            return {}
+        self.env.cr.execute(SQL(
+            """
+            SELECT DISTINCT ON (device_id) device_id, online
+              FROM zkteco_device_health
+             WHERE device_id IN %s
+             ORDER BY device_id, sample_date DESC, id DESC
+            """,
+            tuple(devices.ids),
+        ))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _cron_monitor_devices(self):
+
+        devices = self.env['zkteco.device.setting'].search([])
+        now = fields.Datetime.now()
+        busy_ids = devices._get_busy_device_ids()
+        # a live-capture session, pull or synchronization holds the connection
+        # of its device, its last-seen time is enough
+        probed = devices.filtered(
+            lambda device: not device.is_adms and device.zkteco_device_ip_address
+            and not (device.live_capture_lease_until and device.live_capture_lease_until > now)
+            and device.id not in busy_ids
+        )
+        targets = {
+            device.id: (device.zkteco_device_ip_address, device.port, device.zkteco_device_pass or 0)
+            for device in probed
+        }
+        results = {}
+        if targets:
+            with ThreadPoolExecutor(max_workers=min(HEALTH_PROBE_WORKERS, len(targets))) as executor:
+                futures = {executor.submit(probe_device, *target): device_id for device_id, target in targets.items()}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+
+        for device in probed:
+            if results[device.id]['online']:
+                mark_seen(self.env, device)
+
+        previous = self._last_online(devices)
+        values_list, events = [], []
+        for device in devices:
+            values = results.get(device.id) or {'online': device.state == 'connected'}
+            values_list.append(dict(values, device_id=device.id, sample_date=now))
+            if device.id in previous and previous[device.id] != values['online']:
+                # ADMS devices announce themselves when they come back, on /iclock/cdata
+                if not values['online'] or device.id in results:
+                    events.append({'type': 'device_online' if values['online'] else 'device_offline',
+                                   'device': device})
+        self.create(values_list)
+        self.env['dashboard.dashboard']._notify_dashboard_deltas(events)
+        _logger.info("Device health: %s of %s devices online (%s probed)",
+                     sum(values['online'] for values in values_list), len(devices), len(results))
+
+    @api.autovacuum
+    def _gc_health_samples(self):
+        self.search([
+            ('sample_date', '<', fields.Datetime.now() - timedelta(days=HEALTH_RETENTION_DAYS))
+        ]).unlink()
@@ -5,10 +5,14 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
+from collections import defaultdict
+
 from odoo import api, fields, models, _
+from odoo.tools import SQL
 from datetime import datetime, timedelta
 from odoo.exceptions import UserError, ValidationError
 from convertdate import islamic
+from .zkteco_perf_sample import perf_stage
 
 
 # ======================================================
@@ -171,55 +175,96 @@ class ZktecoDeviceLogs(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         records = super().create(vals_list)
-        Attendance = self.env['hr.attendance']
+        self.env['zkteco.metric.value']._add_uncalculated_logs(
+            len(records.filtered(lambda r: not r.user_punch_calculated))
+        )
+        records._update_employee_attendances()
+        return records
 
-        for record in records:
-            employee = record.employee_id
-            punch_time = record.user_punch_time
+    def write(self, values):
+        if 'user_punch_calculated' in values:
+            calculated = bool(values['user_punch_calculated'])
+            changed = self.filtered(lambda r: r.user_punch_calculated != calculated)
+            self.env['zkteco.metric.value']._add_uncalculated_logs(-len(changed) if calculated else len(changed))
+        return super().write(values)
 
-            if not employee or not punch_time:
-                continue
+    @perf_stage('logs.attendance_state')
+    def _update_employee_attendances(self):
+        """
+        Open or close the hr.attendance of each new punch from its status number.
 
-            last_attendance = Attendance.search(
-                [('employee_id', '=', employee.id)],
-                order='check_in desc',
-                limit=1
-            )
+        The punches are replayed in memory from the latest attendance of each
+        employee, read with one query, then the closed attendances are written,
+        the new ones created in one batch and the statuses written per value.
+        """
+        Attendance = self.env['hr.attendance']
+        punches = self.filtered(lambda record: record.employee_id and record.user_punch_time)
+        if not punches:
+            return
+
+        Attendance.flush_model(['employee_id', 'check_in'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT DISTINCT ON (employee_id) id
+              FROM hr_attendance
+             WHERE employee_id IN %s
+             ORDER BY employee_id, check_in DESC, id DESC
+            """,
+            tuple(punches.employee_id.ids),
+        ))
+        stored = Attendance.browse([attendance_id for attendance_id, in self.env.cr.fetchall()])
+        # the stored attendances replayed in memory, the latest attendance of each employee
+        replayed = [
+            (attendance, {'check_in': attendance.check_in, 'check_out': attendance.check_out})
+            for attendance in stored
+        ]
+        latest = {attendance.employee_id.id: values for attendance, values in replayed}
+        created = []
+        statuses = defaultdict(list)
+
+        for record in punches:
+            employee_id = record.employee_id.id
+            punch_time = record.user_punch_time
+            last_attendance = latest.get(employee_id)
+            status = '2'
 
             # ===== CHECK IN =====
             if record.status_number == '0':
-                if last_attendance and not last_attendance.check_out:
+                if last_attendance and not last_attendance['check_out']:
                     # Attendance treo quá 12h → auto close
-                    if punch_time - last_attendance.check_in > timedelta(hours=12):
-                        last_attendance.write({
-                            'check_out': last_attendance.check_in + timedelta(hours=8)
-                        })
+                    if punch_time - last_attendance['check_in'] > timedelta(hours=12):
+                        last_attendance['check_out'] = last_attendance['check_in'] + timedelta(hours=8)
                     else:
-                        record.status = '2'  # ignore
+                        statuses['2'].append(record.id)  # ignore
                         continue
 
-                Attendance.create({
-                    'employee_id': employee.id,
-                    'check_in': punch_time,
-                })
-                record.status = '0'
+                latest[employee_id] = {'check_in': punch_time, 'check_out': False}
+                created.append((employee_id, latest[employee_id]))
+                status = '0'
 
             # ===== CHECK OUT =====
             elif record.status_number == '1':
-                if last_attendance and not last_attendance.check_out:
-                    if punch_time > last_attendance.check_in:
-                        last_attendance.write({'check_out': punch_time})
-                        record.status = '1'
-                    else:
-                        record.status = '2'
-                else:
-                    record.status = '2'
-
-            # ===== OTHER =====
-            else:
-                record.status = '2'
-
-        return records
+                if last_attendance and not last_attendance['check_out'] and punch_time > last_attendance['check_in']:
+                    last_attendance['check_out'] = punch_time
+                    status = '1'
+
+            statuses[status].append(record.id)
+
+        # close the stored attendances first, the new ones may start after them
+        for attendance, values in replayed:
+            if values['check_out'] != attendance.check_out:
+                attendance.write({'check_out': values['check_out']})
+        if created:
+            Attendance.create([
+                {
+                    'employee_id': employee_id,
+                    'check_in': values['check_in'],
+                    'check_out': values['check_out'] or False,
+                }
+                for employee_id, values in created
+            ])
+        for status, record_ids in statuses.items():
+            self.browse(record_ids).write({'status': status})
 
     # --------------------------------------------------
     # UNLINK PROTECTION
@@ -229,6 +274,7 @@ class ZktecoDeviceLogs(models.Model):
         processed = self.filtered(lambda r: r.user_punch_calculated)
         if processed:
             raise UserError(_("You cannot delete processed attendance logs."))
+        self.env['zkteco.metric.value']._add_uncalculated_logs(-len(self))
         return super().unlink()
 
     # --------------------------------------------------
@@ -306,12 +352,25 @@ class HrAttendance(models.Model):
         for vals in vals_list:
             if 'is_multiple_shift' not in vals:
                 vals['is_multiple_shift'] = self._get_multiple_shift_status()
-        return super().create(vals_list)
+        records = super().create(vals_list)
+        events = []
+        for attendance in records.filtered('employee_id'):
+            events.append({'type': 'check_in', 'employee': attendance.employee_id, 'attendance': attendance})
+            if attendance.check_out:
+                events.append({'type': 'check_out', 'employee': attendance.employee_id, 'attendance': attendance})
+        self.env['dashboard.dashboard']._notify_dashboard_deltas(events)
+        return records
 
     def write(self, values):
         if 'is_multiple_shift' not in values:
             values['is_multiple_shift'] = self._get_multiple_shift_status()
-        return super().write(values)
+        closing = self.filtered(lambda a: not a.check_out) if values.get('check_out') else self.browse()
+        res = super().write(values)
+        self.env['dashboard.dashboard']._notify_dashboard_deltas([
+            {'type': 'check_out', 'employee': attendance.employee_id, 'attendance': attendance}
+            for attendance in closing if attendance.employee_id
+        ])
+        return res
 
     # --------------------------------------------------
     # RAMADAN CALENDAR
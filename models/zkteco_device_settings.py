@@ -6,16 +6,40 @@
 ########################################################
 
 import base64
+import logging
+import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from odoo import api, fields, models, _
 from collections import defaultdict
 from odoo.addons.base.models.res_partner import _tz_get
 import pytz
 from datetime import datetime
 from ..zk import ZK
+from ..zk.user import User
+from ..zk.finger import Finger
+from .zkteco_device_health import (
+    ADMS_MISSED_POLLS, ADMS_STALE_AFTER_MIN, DEVICE_STALE_AFTER, LAST_SEEN_WRITE_INTERVAL,
+)
+from .zkteco_live_capture import LIVE_CAPTURE_LEASE, supervise_live_capture
+from .zkteco_metrics import PULL_BUCKETS, inc_counter, mark_seen, observe
+from .zkteco_perf_sample import perf_stage
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
 import re
 
+# {(dbname, device id): monotonic time of the last last_seen write}, per process
+_last_seen_writes = {}
+
+_logger = logging.getLogger(__name__)
+
+# Upper bound of terminals talked to concurrently by fleet-wide actions
+DEVICE_SYNC_MAX_WORKERS = 8
+# first key of the advisory locks marking the devices a transaction is talking to
+DEVICE_BUSY_LOCK = 0x5a4b
+# device PINs counted by adms_next_pin, short enough for its integer column
+NUMERIC_PIN_PATTERN = '^[0-9]{1,9}$'
+
 
 class ZktecoDeviceSetting(models.Model):
     """
@@ -44,7 +68,8 @@ class ZktecoDeviceSetting(models.Model):
         device_stamp_logs: Stamp logs.
         device_attendance_logs_no: Computed number of attendance logs.
         device_command_no_count: Computed number of device commands.
-        state: Device connection state.
+        state: Device connection state, derived from the staleness of last_seen.
+        last_seen: Last time the device contacted or answered Odoo.
         zkteco_attendance_device_status_ids: Attendance state records for the device.
     """
 
@@ -127,6 +152,32 @@ class ZktecoDeviceSetting(models.Model):
         help='Device serial number for identification.',
         tracking=True
     )
+    adms_next_pin = fields.Integer(
+        string='Next ADMS PIN',
+        readonly=True,
+        copy=False,
+        help='Next device user PIN handed out when exporting employees to this ADMS device. '
+             'Never below the highest PIN already mapped or pending on the device.'
+    )
+    read_pipeline_depth = fields.Integer(
+        string='Read Pipeline Depth',
+        default=4,
+        help='Chunk requests kept in flight when downloading users, templates and attendance logs over TCP. '
+             '1 reads in lock-step; a firmware that rejects pipelining falls back to it by itself.'
+    )
+    live_capture_owner = fields.Char(
+        string='Live Capture Process',
+        readonly=True,
+        copy=False,
+        help='Server process holding the live-capture session of this device.'
+    )
+    live_capture_lease_until = fields.Datetime(
+        string='Live Capture Lease',
+        readonly=True,
+        copy=False,
+        help='The live-capture session renews this lease while it runs; '
+             'another process may take the device over once it expired.'
+    )
 
     zkteco_device_user_ids = fields.One2many(
         'zkteco.attendance.machine', 'device_id', string='Users',
@@ -156,9 +207,14 @@ class ZktecoDeviceSetting(models.Model):
 
     state = fields.Selection(
         [('not_connected', 'Not Connected'), ('connected', 'Connected')],
-        default='not_connected',
-        help='Connection status of the device.',
-        tracking=True
+        compute='_compute_state',
+        help='Connected while the device contacted or answered Odoo recently, see Last Seen.'
+    )
+    last_seen = fields.Datetime(
+        string='Last Seen',
+        readonly=True,
+        copy=False,
+        help='Last time the device contacted Odoo (ADMS) or answered it (pull, live capture, health probe).'
     )
 
     zkteco_attendance_device_status_ids = fields.One2many(
@@ -167,6 +223,50 @@ class ZktecoDeviceSetting(models.Model):
     )
 
 
+    @api.depends('last_seen', 'is_adms', 'delay')
+    def _compute_state(self):
+
+        now = fields.Datetime.now()
+        for zkteco_device in self:
+            fresh = zkteco_device.last_seen and (
+                (now - zkteco_device.last_seen).total_seconds() <= zkteco_device._get_stale_after()
+            )
+            zkteco_device.state = 'connected' if fresh else 'not_connected'
+
+    def _get_stale_after(self):
+        """ seconds without news after which the device is considered offline """
+        self.ensure_one()
+        if self.is_adms:
+            return max(ADMS_MISSED_POLLS * (self.delay or 10), ADMS_STALE_AFTER_MIN)
+        return DEVICE_STALE_AFTER
+
+    def _touch_last_seen(self):
+        """
+        Set last_seen to now, without ORM write (no tracking nor write_date),
+        at most every LAST_SEEN_WRITE_INTERVAL seconds per device and process.
+        """
+        now = time.monotonic()
+        dbname = self.env.cr.dbname
+        due = [
+            device_id for device_id in self.ids
+            if now - _last_seen_writes.get((dbname, device_id), float('-inf')) >= LAST_SEEN_WRITE_INTERVAL
+        ]
+        if not due:
+            return
+        for device_id in due:
+            _last_seen_writes[(dbname, device_id)] = now
+        self.env.cr.execute(SQL(
+            """
+            UPDATE zkteco_device_setting
+               SET last_seen = NOW() AT TIME ZONE 'UTC'
+             WHERE id IN %s
+               AND (last_seen IS NULL
+                    OR last_seen < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => %s))
+            """,
+            tuple(due), LAST_SEEN_WRITE_INTERVAL,
+        ))
+        self.browse(due).invalidate_recordset(['last_seen', 'state'])
+
     @api.onchange('password_configured')
     def onchange_password_configured(self):
 
@@ -240,87 +340,29 @@ class ZktecoDeviceSetting(models.Model):
 
     def action_synchronize_employees(self):
 
-        max_uid = 0
-        next_user_id_str = '1'
-        uid_list = []
-        device_user_id_list = []
-
-        all_employees = self.env['hr.employee'].search([])
+        self.ensure_one()
+        self._mark_device_busy()
 
         device_ip = self.zkteco_device_ip_address
         device_port = self.port
         device_password = self.zkteco_device_pass
 
-        zk_device = ZK(device_ip, device_port, password=device_password)
+        zk_device = ZK(device_ip, device_port, password=device_password,
+                       pipeline_depth=self.read_pipeline_depth or 1)
 
         try:
             connection_result = zk_device.connect()
             if not connection_result:
                 raise ValidationError(_("Failed to establish connection with the ZKTeco device."))
 
-            existing_users = zk_device.get_users()
-            print("USERS", existing_users)
-
-            def generate_next_user_id(current_user_id):
-
-                pattern = r'(\d+)'
-
-                def increment(match):
-                    number = match.group(0)
-                    incremented_number = str(int(number) + 1)
-                    return incremented_number
-
-                return re.sub(pattern, increment, current_user_id)
-
-            if existing_users:
-                for user in existing_users:
-                    uid_list.append(user.uid)
-                    device_user_id_list.append(user.user_id)
-
-                uid_list.sort()
-                device_user_id_list.sort()
-                max_uid = uid_list[-1]
-                next_user_id_str = str(generate_next_user_id(device_user_id_list[-1]))
-
-                attempt_counter = 2
-                while True:
-                    if next_user_id_str in device_user_id_list:
-                        next_user_id_str = str(generate_next_user_id(device_user_id_list[-1 * attempt_counter]))
-                        attempt_counter += 1
-                    else:
-                        for emp_index in range(len(all_employees)):
-                            test_user_id = generate_next_user_id(next_user_id_str)
-                            if test_user_id in device_user_id_list:
-                                next_user_id_str = test_user_id
-                                continue
-                        break
-
-            for employee in all_employees:
-                biometric_device_record = employee.biometric_device_ids.search([
-                    ('employee_id', '=', employee.id),
-                    ('device_id', '=', self.id)
-                ])
-
-                if not biometric_device_record:
-                    max_uid += 1
-                    employee.biometric_device_ids = [(0, 0, {
-                        'employee_id': employee.id,
-                        'zkteco_device_attend_id': next_user_id_str,
-                        'device_id': self.id,
-                    })]
-
-                    # Customized By Tunn
-                    clean_name = self._clean_username(employee.name)
-                    zk_device.set_user(
-                        max_uid,
-                        clean_name,
-                        0,
-                        '',
-                        '',
-                        str(next_user_id_str)
-                    )
-
-                    next_user_id_str = generate_next_user_id(next_user_id_str)
+            try:
+                snapshot = self._get_device_sync_snapshot()
+                diff = self._compute_device_user_diff(zk_device.get_users(), snapshot, zk_device.user_packet_size)
+                self._push_device_user_diff(zk_device, diff)
+            finally:
+                zk_device.disconnect()
+
+            self._apply_device_user_diff(diff)
 
             return {
                 'name': 'Success Message',
@@ -336,20 +378,162 @@ class ZktecoDeviceSetting(models.Model):
                 f"An unexpected error occurred during employee synchronization: {sync_exception}"
             ))
 
+    def _allocate_adms_pins(self, count):
+        """
+        Reserve a block of ``count`` consecutive PINs on the device and return
+        the first one, in O(1). The row lock taken by the UPDATE serializes
+        concurrent exports to the same device, so two transactions never get
+        the same block. The counter is seeded by the 19.0.1.1.0 migration from
+        the PINs already mapped or pending, and every mapping created or renumbered elsewhere
+        (OPERLOG, ATTLOG, binary synchronization) pushes it past its PIN, see
+        zkteco.attendance.machine._sync_device_pin_counters.
+        """
+        self.ensure_one()
+        if count <= 0:
+            return 0
+        self.flush_recordset(['adms_next_pin'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE zkteco_device_setting
+               SET adms_next_pin = GREATEST(COALESCE(adms_next_pin, 0), 1) + %(count)s
+             WHERE id = %(device_id)s
+         RETURNING adms_next_pin - %(count)s
+            """,
+            device_id=self.id,
+            count=count,
+        ))
+        first_pin = self.env.cr.fetchone()[0]
+        self.invalidate_recordset(['adms_next_pin'])
+        return first_pin
+
+    def _get_device_sync_snapshot(self, employees=None):
+        """
+        Read everything the employee/device diff needs in a few queries.
+
+        Returns plain data (no records) so the diff can be computed and pushed
+        outside of the ORM, e.g. from a worker thread:
+            employees: list of (employee id, device username) for active employees.
+            mapped: {employee id: device user id} of employees already mapped on the device.
+            archived: device user ids mapped to archived employees.
+            reserved_pins: every device user id known for the device in Odoo.
+        """
+        self.ensure_one()
+        mappings = self.env['zkteco.attendance.machine'].search([
+            ('device_id', '=', self.id)
+        ])
+        if employees is None:
+            employees = self.env['hr.employee'].search([])
+        return {
+            'employees': [(employee.id, self._clean_username(employee.name)) for employee in employees],
+            'mapped': {
+                mapping.employee_id.id: mapping.zkteco_device_attend_id
+                for mapping in mappings if mapping.employee_id.active
+            },
+            'archived': {
+                mapping.zkteco_device_attend_id
+                for mapping in mappings if mapping.employee_id and not mapping.employee_id.active
+            },
+            'reserved_pins': set(mappings.mapped('zkteco_device_attend_id')),
+        }
+
+    @api.model
+    def _compute_device_user_diff(self, device_users, snapshot, user_packet_size=72):
+        """
+        Three-way diff between the terminal users, the Odoo employees and
+        the zkteco.attendance.machine mapping of one device.
+
+        Returns a dict with:
+            add: list of (employee id, User) to upload; employees mapped to a
+                 PIN missing on the terminal are re-added under that PIN.
+            rename: list of User whose name on the terminal is outdated.
+            delete: list of User mapped to archived employees.
+            mappings: zkteco.attendance.machine values for newly allocated PINs.
+
+        An optional ``preferred_pins`` snapshot entry ({employee id: PIN}) lets
+        unmapped employees keep the PIN they use on other devices when free.
+        """
+        name_size = 8 if user_packet_size == 28 else 24
+        users_by_user_id = {user.user_id: user for user in device_users}
+        used_uids = {user.uid for user in device_users}
+        used_pins = set(users_by_user_id) | snapshot['reserved_pins']
+        next_uid = max(used_uids, default=0) + 1
+        next_pin = max((int(pin) for pin in used_pins if str(pin).isdigit()), default=0) + 1
+
+        diff = {'add': [], 'rename': [], 'delete': [], 'mappings': []}
+        for employee_id, name in snapshot['employees']:
+            name = name.encode('UTF-8', errors='ignore')[:name_size].decode('UTF-8', errors='ignore')
+            pin = snapshot['mapped'].get(employee_id)
+            device_user = users_by_user_id.get(pin) if pin else None
+            if device_user:
+                if device_user.name != name:
+                    diff['rename'].append(User(device_user.uid, name, device_user.privilege, device_user.password,
+                                               device_user.group_id, device_user.user_id, device_user.card))
+                continue
+
+            while next_uid in used_uids:
+                next_uid += 1
+            used_uids.add(next_uid)
+            if not pin:
+                pin = snapshot.get('preferred_pins', {}).get(employee_id)
+                if not pin or pin in used_pins:
+                    while str(next_pin) in used_pins:
+                        next_pin += 1
+                    pin = str(next_pin)
+                used_pins.add(pin)
+                diff['mappings'].append({
+                    'employee_id': employee_id,
+                    'zkteco_device_attend_id': pin,
+                    'zkteco_device_username': name,
+                })
+            diff['add'].append((employee_id, User(next_uid, name, 0, '', '', pin)))
+
+        diff['delete'] = [users_by_user_id[pin] for pin in snapshot['archived'] if pin in users_by_user_id]
+        return diff
+
+    @api.model
+    def _push_device_user_diff(self, zk_device, diff):
+        """Upload a device user diff with one buffered write and a single refresh."""
+        users = [user for _employee_id, user in diff['add']] + diff['rename']
+        if users:
+            zk_device.HR_save_usertemplates([(user, []) for user in users])
+        for user in diff['delete']:
+            zk_device.delete_user(uid=user.uid, refresh=False)
+        if diff['delete']:
+            zk_device.refresh_data()
+
+    def _apply_device_user_diff(self, diff):
+        """Record the mapping rows of newly allocated PINs with a single create."""
+        self.ensure_one()
+        if diff['mappings']:
+            self.env['zkteco.attendance.machine'].create([
+                dict(vals, device_id=self.id) for vals in diff['mappings']
+            ])
+
+    @perf_stage('binary.pull', device=lambda device: device[:1])
     def action_pull_attendance_logs(self):
 
         attendance_model = self.env['zkteco.device.logs']
+        self._mark_device_busy()
 
         device_ip = self.zkteco_device_ip_address
         device_port = self.port
         device_password = self.zkteco_device_pass
-        zk = ZK(device_ip, device_port, password=device_password)
+        zk = ZK(device_ip, device_port, password=device_password, pipeline_depth=self.read_pipeline_depth or 1)
 
         try:
+            pull_started = time.perf_counter()
             connection = zk.connect()
             if connection:
-                raw_attendance_records = zk.get_attendance()
-                print("Retrieved attendance records:", raw_attendance_records)
+                with self.env['zkteco.perf.sample']._span('binary.pull.download', self) as span:
+                    raw_attendance_records = zk.get_attendance()
+                    span.rows = len(raw_attendance_records)
+                observe(self.env, 'zkteco_binary_pull_duration_seconds', time.perf_counter() - pull_started,
+                        PULL_BUCKETS, device=self.name)
+                inc_counter(self.env, 'zkteco_punches_ingested_total', len(raw_attendance_records),
+                            device=self.name, source='binary')
+                mark_seen(self.env, self)
+                _logger.debug("Retrieved %s attendance records from device %s",
+                              len(raw_attendance_records), self.name)
                 device_name = self.name
                 company = self.company_id
 
@@ -527,6 +711,12 @@ class ZktecoDeviceSetting(models.Model):
 
     def create_oplog(self, log_values, op_stamp):
 
+        self.env['zkteco.device.event.log'].sudo()._insert_skip_duplicates([
+            self._prepare_oplog_values(log_values, op_stamp)
+        ])
+
+    def _prepare_oplog_values(self, log_values, op_stamp):
+
         combined_datetime = datetime.strptime(f"{log_values[3]} {log_values[4]}", "%Y-%m-%d %H:%M:%S")
 
         local_timezone = pytz.timezone('Asia/Kolkata')
@@ -535,7 +725,7 @@ class ZktecoDeviceSetting(models.Model):
         utc_datetime = localized_datetime.astimezone(pytz.utc)
         formatted_utc_datetime = utc_datetime.strftime('%Y-%m-%d %H:%M:%S')
 
-        self.env['zkteco.device.event.log'].sudo().create({
+        return {
             'device_id': self.id,
             'log_code': log_values[1],
             'description': log_values[1],
@@ -546,220 +736,465 @@ class ZktecoDeviceSetting(models.Model):
             'value_3': log_values[7],
             'reserved': log_values[8],
             'opStamp': op_stamp,
-        })
-
-    def action_create_employee_device_user(self, raw_values):
-
-        device_user_id = raw_values[1].split('=')[1]
-        device_user_name = raw_values[2].split('=')[1]
-
-        existing_employee = self.env['zkteco.attendance.machine'].sudo().search([
-            ('zkteco_device_attend_id', '=', device_user_id)
-        ])
-
-        if existing_employee:
-            existing_employee.zkteco_device_username = device_user_name
-            employee_record = existing_employee
-        else:
-            employee_record = self.env['zkteco.attendance.machine'].sudo().create({
-                'zkteco_device_attend_id': device_user_id,
-                'device_id': self.id,
-                'zkteco_device_username': device_user_name,
-            })
-
-        return employee_record
+        }
 
     def action_create_device_zkteco_logs(self, raw_data):
+        """
+        Create the device logs of the ATTLOG lines of raw_data in a constant
+        number of queries: one search each for the device users, the already
+        stored punches and the device states of the batch, then one create
+        for the missing device users and one for the new logs. Punches already
+        stored, or repeated in the batch, are skipped.
+        """
+        DeviceUser = self.env['zkteco.attendance.machine'].sudo()
+        DeviceLog = self.env['zkteco.device.logs'].sudo()
+        local_tz = pytz.timezone(self.time_zone)
 
+        punches = []
         for record_line in raw_data.splitlines():
             line_values = record_line.split()
+            if not line_values:
+                continue
             device_user_id = line_values[0]
             punch_date = line_values[1]
             punch_time = line_values[2]
             punch_number = line_values[3]
             punch_status_code = int(line_values[4])
 
-            # Customized by Tunn
-            # device_user_record = self.env['zkteco.attendance.machine'].sudo().search([
-            #     ('zkteco_device_attend_id', '=', device_user_id)
-            # ])
-            device_user_record = self.env['zkteco.attendance.machine'].sudo().search([
-                ('zkteco_device_attend_id', '=', device_user_id),
-                ('device_id', '=', self.id)
-            ], limit=1)
-
-            if not device_user_record:
-                device_user_record = self.env['zkteco.attendance.machine'].sudo().create({
-                    'zkteco_device_attend_id': device_user_id,
-                    'device_id': self.id
-                })
-
             local_datetime = datetime.strptime(f"{punch_date} {punch_time}", "%Y-%m-%d %H:%M:%S")
-            local_tz = pytz.timezone(self.time_zone)
-            localized_datetime = local_tz.localize(local_datetime)
-            utc_datetime = localized_datetime.astimezone(pytz.utc)
-            timestamp = local_datetime.timestamp()
-            formatted_utc_datetime = utc_datetime.strftime('%Y-%m-%d %H:%M:%S')
-
-            # Customized by Tunn
-            # existing_log = self.env['zkteco.device.logs'].sudo().search([
-            #     ('zketco_duser_id', '=', device_user_record.id),
-            #     ('timestamp', '=', timestamp)
-            # ])
-            existing_log = self.env['zkteco.device.logs'].sudo().search([
-                ('zketco_duser_id', '=', device_user_record.id),
-                ('timestamp', '=', timestamp)
-            ], limit=1)
-
-            state_record = self.env['zkteco.device.states'].search([
-                ('code', '=', punch_status_code),
-                ('device_id', '=', self.id)
-            ], limit=1)
-
-            if state_record:
-                if state_record.activity_type == 'check_in':
-                    punch_status = '0'
-                elif state_record.activity_type == 'check_out':
-                    punch_status = '1'
-                else:
-                    punch_status = '2'
-            else:
-                punch_status = '2'
-
-            if not existing_log:
-                self.env['zkteco.device.logs'].sudo().create({
-                    'zketco_duser_id': device_user_record.id,
-                    'company_id': self.company_id.id,
-                    'user_punch_time': formatted_utc_datetime,
-                    'status_number': punch_status_code,
-                    'number': punch_number,
-                    'status': punch_status,
-                    'device': self.name,
-                    'timestamp': timestamp,
-                })
+            utc_datetime = local_tz.localize(local_datetime).astimezone(pytz.utc)
+            punches.append((
+                device_user_id, utc_datetime.strftime('%Y-%m-%d %H:%M:%S'),
+                punch_number, punch_status_code, int(local_datetime.timestamp()),
+            ))
+        if not punches:
+            return DeviceLog
 
-    def action_create_device_user_fingerprint(self, values):
+        device_users = {}
+        for device_user in DeviceUser.search_fetch([
+            ('device_id', '=', self.id),
+            ('zkteco_device_attend_id', 'in', list({punch[0] for punch in punches})),
+        ], ['zkteco_device_attend_id']):
+            device_users.setdefault(device_user.zkteco_device_attend_id, device_user.id)
+        missing_pins = list(dict.fromkeys(punch[0] for punch in punches if punch[0] not in device_users))
+        if missing_pins:
+            created_users = DeviceUser.create([
+                {'zkteco_device_attend_id': pin, 'device_id': self.id} for pin in missing_pins
+            ])
+            device_users.update(zip(missing_pins, created_users.ids))
+
+        stored = {
+            (log.zketco_duser_id.id, log.timestamp)
+            for log in DeviceLog.search_fetch([
+                ('zketco_duser_id', 'in', list(set(device_users.values()))),
+                ('timestamp', 'in', list({punch[4] for punch in punches})),
+            ], ['zketco_duser_id', 'timestamp'])
+        }
 
+        activity_by_code = {}
+        for state in self.env['zkteco.device.states'].search_fetch([
+            ('device_id', '=', self.id),
+            ('code', 'in', list({str(punch[3]) for punch in punches})),
+        ], ['code', 'activity_type']):
+            activity_by_code.setdefault(state.code, state.activity_type)
+
+        company_id = self.company_id.id
+        vals_list = []
+        for device_user_id, punch_time, punch_number, punch_status_code, timestamp in punches:
+            key = (device_users[device_user_id], timestamp)
+            if key in stored:
+                continue
+            stored.add(key)
+            activity_type = activity_by_code.get(str(punch_status_code))
+            vals_list.append({
+                'zketco_duser_id': key[0],
+                'company_id': company_id,
+                'user_punch_time': punch_time,
+                'status_number': punch_status_code,
+                'number': punch_number,
+                'status': {'check_in': '0', 'check_out': '1'}.get(activity_type, '2'),
+                'device': self.name,
+                'timestamp': timestamp,
+            })
+        return DeviceLog.create(vals_list)
 
-        user_device_id = values[1].split('=')[1]
-        fingerprint_template = values[5].split('=')[1]
+    def _renew_live_capture_lease(self, owner):
+        """ take or extend the live-capture lease of the device for owner, return whether owner holds it """
+        self.ensure_one()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE zkteco_device_setting
+               SET live_capture_owner = %(owner)s,
+                   live_capture_lease_until = (NOW() AT TIME ZONE 'UTC') + make_interval(secs => %(lease)s)
+             WHERE id = %(id)s
+               AND zkteco_device_real_time IS TRUE
+               AND is_adms IS NOT TRUE
+               AND (live_capture_owner IS NULL
+                    OR live_capture_owner = %(owner)s
+                    OR live_capture_lease_until < (NOW() AT TIME ZONE 'UTC'))
+         RETURNING id
+            """,
+            owner=owner, lease=LIVE_CAPTURE_LEASE, id=self.id,
+        ))
+        held = bool(self.env.cr.fetchone())
+        self.invalidate_recordset(['live_capture_owner', 'live_capture_lease_until'])
+        return held
+
+    def _mark_device_busy(self):
+        """
+        Mark the devices busy until the current transaction ends, with a
+        shared advisory lock per device: the health monitor leaves them alone
+        rather than opening a second connection to a terminal being pulled or
+        synchronized. Concurrent pulls of a device do not block each other.
+        """
+        if self.ids:
+            self.env.cr.execute(SQL(
+                "SELECT pg_advisory_xact_lock_shared(%s, id) FROM unnest(%s::int[]) AS id",
+                DEVICE_BUSY_LOCK, list(self.ids),
+            ))
 
-        fixed_template = self._base64_fix_padding(fingerprint_template)
-        
-        # Customized by Tunn
-        # db_user_device = self.env['zkteco.attendance.machine'].sudo().search(
-        #     [('zkteco_device_attend_id', '=', user_device_id)]
-        # )
-        db_user_device = self.env['zkteco.attendance.machine'].sudo().search([
-            ('zkteco_device_attend_id', '=', user_device_id),
-            ('device_id', '=', self.id)
-        ], limit=1)
+    @api.model
+    def _get_busy_device_ids(self):
+        """ ids of the devices marked busy by a running transaction of this database """
+        self.env.cr.execute(SQL(
+            """
+            SELECT objid::int
+              FROM pg_locks
+             WHERE locktype = 'advisory'
+               AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+               AND classid = %s
+               AND objsubid = 2
+            """,
+            DEVICE_BUSY_LOCK,
+        ))
+        return {device_id for device_id, in self.env.cr.fetchall()}
+
+    def _release_live_capture_lease(self, owner):
+
+        self.env.cr.execute(SQL(
+            """
+            UPDATE zkteco_device_setting
+               SET live_capture_owner = NULL, live_capture_lease_until = NULL
+             WHERE id IN %s AND live_capture_owner = %s
+            """,
+            tuple(self.ids), owner,
+        ))
+        self.invalidate_recordset(['live_capture_owner', 'live_capture_lease_until'])
+
+    def _store_live_punches(self, punches):
+        """
+        Create the device logs of punches captured live, a list of
+        (user_id, device local time, status, punch) tuples, through the
+        ATTLOG path so they are mapped exactly like the pushed ones.
+        """
+        self.ensure_one()
+        with self.env['zkteco.perf.sample']._span('live.flush', self, rows=len(punches)):
+            self.action_create_device_zkteco_logs('\n'.join(
+                '%s\t%s\t%s\t%s' % (user_id, punch_time.strftime('%Y-%m-%d %H:%M:%S'), punch, status)
+                for user_id, punch_time, status, punch in punches
+            ))
+        inc_counter(self.env, 'zkteco_punches_ingested_total', len(punches), device=self.name, source='live')
+        mark_seen(self.env, self)
+
+    @api.model
+    def _cron_supervise_live_capture(self):
+        """ keep a live-capture session running for every real-time binary device """
+        supervise_live_capture(self.search([
+            ('zkteco_device_real_time', '=', True),
+            ('is_adms', '=', False),
+            ('zkteco_device_ip_address', '!=', False),
+        ]))
 
+    def action_create_device_user_fingerprint(self, values):
 
-        if not db_user_device:
-            db_user_device = self.env['zkteco.attendance.machine'].sudo().create({
-                'zkteco_device_attend_id': user_device_id,
-                'device_id': self.id
-            })
+        line_fields = dict(value.split('=', 1) for value in values[1:] if '=' in value)
+        return self._upsert_operlog_fingerprints([(
+            line_fields['PIN'],
+            int(line_fields.get('FID') or 0),
+            self._decode_fingerprint_template(line_fields['TMP']),
+        )])
+
+    def _process_operlog(self, raw_data, op_stamp):
+        """
+        Store an OPERLOG upload: the body is parsed into operation logs, device
+        users and fingerprints, and each list is upserted with one prefetch
+        and one create. A malformed or rejected line is logged and skipped
+        without discarding the rest of the batch.
+        """
+        self.ensure_one()
+        Perf = self.env['zkteco.perf.sample']
+        with Perf._span('adms.operlog.parse', self) as span:
+            oplogs, users, fingerprints = self._parse_operlog(raw_data, op_stamp)
+            span.rows = len(oplogs) + len(users) + len(fingerprints)
+        with Perf._span('adms.operlog.events', self, rows=len(oplogs)):
+            self._upsert_operlog_events(oplogs)
+        with Perf._span('adms.operlog.users', self, rows=len(users)):
+            self._upsert_operlog_users(users)
+        with Perf._span('adms.operlog.fingerprints', self, rows=len(fingerprints)):
+            self._upsert_operlog_fingerprints(fingerprints)
+
+    def _parse_operlog(self, raw_data, op_stamp):
+        """
+        Split an OPERLOG body into three typed lists:
+            - zkteco.device.event.log values for OPLOG lines,
+            - (PIN, name) pairs for USER lines,
+            - (PIN, finger id, raw template bytes) for FP lines.
+        """
+        oplogs, users, fingerprints = [], [], []
+        for line in raw_data.strip().split('\n'):
+            try:
+                if line.startswith("OPLOG"):
+                    oplogs.append(self._prepare_oplog_values(line.split(), op_stamp))
+                elif line.startswith("FP"):
+                    line_fields = self._parse_operlog_fields(line)
+                    fingerprints.append((
+                        line_fields['PIN'],
+                        int(line_fields.get('FID') or 0),
+                        self._decode_fingerprint_template(line_fields['TMP']),
+                    ))
+                elif line.startswith("USER"):
+                    line_fields = self._parse_operlog_fields(line)
+                    users.append((line_fields['PIN'], line_fields.get('Name', '')))
+            except Exception as parse_exception:
+                _logger.warning("Skipping malformed OPERLOG line from device %s: %s", self.name, parse_exception)
+        return oplogs, users, fingerprints
+
+    @staticmethod
+    def _parse_operlog_fields(line):
+        """Return the KEY=VALUE pairs of a USER or FP line as a dict."""
+        parts = line.split(None, 1)
+        body = parts[1] if len(parts) > 1 else ''
+        tokens = body.split('\t') if '\t' in body else body.split()
+        return dict(token.split('=', 1) for token in tokens if '=' in token)
+
+    def _create_isolated(self, model, vals_list):
+        """
+        Create all ``vals_list`` rows at once; if the batch is rejected, retry
+        row by row, each in its own savepoint, so only the faulty rows are lost.
+        """
+        if not vals_list:
+            return model.browse()
+        try:
+            with self.env.cr.savepoint():
+                return model.create(vals_list)
+        except Exception as batch_exception:
+            _logger.info("Batch create of %s %s rows failed, retrying row by row: %s",
+                         len(vals_list), model._name, batch_exception)
+        record_ids = []
+        for vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    record_ids.append(model.create(vals).id)
+            except Exception as row_exception:
+                _logger.warning("Skipping %s row from device %s: %s", model._name, self.name, row_exception)
+        return model.browse(record_ids)
+
+    def _upsert_operlog_events(self, oplogs):
 
-        existing_fp = self.env['zkteco.device.fingerprints'].sudo().search([
+        return self.env['zkteco.device.event.log'].sudo()._insert_skip_duplicates(oplogs)
+
+    def _get_operlog_device_users(self, pins):
+        """Return {PIN: device user} for the given PINs on this device."""
+        device_users = self.env['zkteco.attendance.machine'].sudo().search([
             ('device_id', '=', self.id),
-            ('zketco_duser_id', '=', db_user_device.id)
+            ('zkteco_device_attend_id', 'in', list(pins)),
         ])
+        users_by_pin = {}
+        for device_user in device_users:
+            users_by_pin.setdefault(device_user.zkteco_device_attend_id, device_user)
+        return users_by_pin
+
+    def _upsert_operlog_users(self, users):
+
+        DeviceUser = self.env['zkteco.attendance.machine'].sudo()
+        user_names = dict(users)
+        users_by_pin = self._get_operlog_device_users(user_names)
+
+        write_groups = defaultdict(list)
+        for pin, device_user in users_by_pin.items():
+            if device_user.zkteco_device_username != user_names[pin]:
+                write_groups[user_names[pin]].append(device_user.id)
+        for user_name, user_ids in write_groups.items():
+            DeviceUser.browse(user_ids).write({'zkteco_device_username': user_name})
+
+        return self._create_isolated(DeviceUser, [{
+            'zkteco_device_attend_id': pin,
+            'device_id': self.id,
+            'zkteco_device_username': user_name,
+        } for pin, user_name in user_names.items() if pin not in users_by_pin])
 
-        if existing_fp:
-            existing_fp.template_data = fixed_template
-        else:
-            self.env['zkteco.device.fingerprints'].sudo().create({
-                'zketco_duser_id': db_user_device.id,
-                'device_id': self.id,
-                'template_data': fixed_template
-            })
-########################################################################################################################
+    def _upsert_operlog_fingerprints(self, fingerprints):
+        """
+        Store one row per (device user, finger), pointing to the shared
+        content-addressed template. Rows whose template checksum is unchanged
+        are left untouched.
+        """
+        DeviceUser = self.env['zkteco.attendance.machine'].sudo()
+        Fingerprint = self.env['zkteco.device.fingerprints'].sudo()
+        Template = self.env['zkteco.fingerprint.template'].sudo()
+
+        raw_by_finger = {(pin, finger_id): raw for pin, finger_id, raw in fingerprints}
+        if not raw_by_finger:
+            return Fingerprint
+        templates = Template._get_or_create(raw_by_finger.values())
+        users_by_pin = self._get_operlog_device_users({pin for pin, _finger_id in raw_by_finger})
+
+        new_users = self._create_isolated(DeviceUser, [{
+            'zkteco_device_attend_id': pin,
+            'device_id': self.id,
+        } for pin in {pin for pin, _finger_id in raw_by_finger} if pin not in users_by_pin])
+        for device_user in new_users:
+            users_by_pin[device_user.zkteco_device_attend_id] = device_user
+
+        existing_fingerprints = {
+            (fingerprint.zketco_duser_id.id, fingerprint.finger_id): fingerprint
+            for fingerprint in Fingerprint.search([
+                ('device_id', '=', self.id),
+                ('zketco_duser_id', 'in', [user.id for user in users_by_pin.values()]),
+            ])
+        }
+
+        write_groups = defaultdict(list)
+        create_vals = []
+        for (pin, finger_id), raw_template in raw_by_finger.items():
+            device_user = users_by_pin.get(pin)
+            if not device_user:
+                continue
+            template = templates[Template._compute_checksum(raw_template)]
+            fingerprint = existing_fingerprints.get((device_user.id, finger_id))
+            if not fingerprint:
+                create_vals.append({
+                    'zketco_duser_id': device_user.id,
+                    'device_id': self.id,
+                    'finger_id': finger_id,
+                    'template_id': template.id,
+                })
+            elif fingerprint.template_id != template:
+                write_groups[template.id].append(fingerprint.id)
 
-    def _base64_fix_padding(self, encoded_string):
+        for template_id, fingerprint_ids in write_groups.items():
+            Fingerprint.browse(fingerprint_ids).write({'template_id': template_id})
+        return self._create_isolated(Fingerprint, create_vals)
 
+########################################################################################################################
+
+    def _decode_fingerprint_template(self, encoded_string):
+        """Return the raw bytes of a base64 template sent by the device, padding it if needed."""
         padding_needed = len(encoded_string) % 4
         if padding_needed:
             encoded_string += '=' * (4 - padding_needed)
-        decoded_data = base64.b64decode(encoded_string)
-        return base64.b64encode(decoded_data)
+        return base64.b64decode(encoded_string)
 
     def action_create_zkteco_device_user_commands(self):
 
-        pending_commands = self.env['zkteco.dcmmand'].sudo().search([
-            ('status', '=', 'pending'),
-            ('device_id', '=', self.id)
-        ])
-        combined_log = ""
-        for cmd in pending_commands:
-            combined_log += cmd.execution_log
-            cmd.status = 'executed'
-        return combined_log
+        if not self:
+            return ""
+        self.ensure_one()
+        return self.env['zkteco.dcmmand'].sudo()._dispatch_pending(self)
 
-    def action_check_zkteco_device_command_revert_res(self, command_record_id):
+    def action_check_zkteco_device_command_revert_res(self, command_record_id, return_code=0):
 
         if not command_record_id:
             return
+        return self._apply_command_acknowledgements({command_record_id: return_code})
 
-        command_record = self.env['zkteco.dcmmand'].search([('id', '=', command_record_id)])
-        if not command_record:
-            return
-
-        if command_record.employee_id and command_record.name == "DATA":
-            log_values = command_record.execution_log.split()
-            device_user_id = log_values[2].split('=')[1]
-            device_user_name = log_values[3].split('=')[1]
+    def _apply_command_acknowledgements(self, acknowledgements):
+        """
+        Apply the acknowledgements {command id: Return code} posted by the
+        device on /iclock/devicecmd in bulk: one search for the commands of
+        this device, one for the device users they reference, then grouped
+        create, write and unlink calls. Commands the device reports as failed
+        (negative Return) are marked as such and have no effect. The user
+        commands are replayed in order, so only the last action on a PIN
+        counts, and matched on the PIN text sent to the device.
+        """
+        self.ensure_one()
+        DeviceUser = self.env['zkteco.attendance.machine'].sudo()
+        return_codes = {}
+        for command_id, return_code in acknowledgements.items():
+            if str(command_id).isdigit():
+                try:
+                    return_codes[int(command_id)] = int(return_code or 0)
+                except ValueError:
+                    return_codes[int(command_id)] = -1
+        if not return_codes:
+            return self.env['zkteco.dcmmand']
+        commands = self.env['zkteco.dcmmand'].sudo().search([
+            ('id', 'in', list(return_codes)),
+            ('device_id', '=', self.id),
+        ], order='id')
+        if not commands:
+            return commands
 
-            device_user = self.env['zkteco.attendance.machine'].sudo().search([
-                ('zkteco_device_attend_id', '=', device_user_id),
-                ('device_id', '=', self.id)
-            ])
+        failed_commands = commands.filtered(lambda c: return_codes[c.id] < 0)
+        commands -= failed_commands
+        user_commands = commands.filtered(lambda c: c.employee_id and c.name in ('DATA', 'DEL', 'UPDATE'))
+        done_commands = user_commands | commands.filtered(lambda c: c.name in ('USERINFO', 'CHECK', 'FP'))
 
-            if not device_user:
-                device_user = self.env['zkteco.attendance.machine'].sudo().create({
-                    'zkteco_device_attend_id': device_user_id,
+        command_pins = {command.id: command._get_device_user_pin() for command in user_commands}
+        device_users = DeviceUser.search([
+            ('device_id', '=', self.id),
+            ('zkteco_device_attend_id', 'in', list(set(command_pins.values()))),
+        ])
+        users_by_pin = {user.zkteco_device_attend_id: user for user in device_users}
+
+        # {pin: (employee id, user name)} or {pin: None} once deleted
+        final_users = {}
+        for command in user_commands:
+            pin = command_pins[command.id]
+            user_name = command.device_user_name or command.employee_id.name
+            if command.name == 'DATA':
+                final_users[pin] = (command.employee_id.id, user_name)
+            elif command.name == 'DEL':
+                final_users[pin] = None
+            else:
+                if pin in final_users:
+                    current = final_users[pin]
+                elif pin in users_by_pin:
+                    current = (users_by_pin[pin].employee_id.id, users_by_pin[pin].zkteco_device_username)
+                else:
+                    current = None
+                # renaming a user absent from the device changes nothing
+                if current:
+                    final_users[pin] = (current[0], user_name)
+
+        create_vals = []
+        write_groups = defaultdict(list)
+        unlink_ids = []
+        for pin, values in final_users.items():
+            device_user = users_by_pin.get(pin)
+            if values is None:
+                if device_user:
+                    unlink_ids.append(device_user.id)
+            elif device_user:
+                write_groups[values].append(device_user.id)
+            else:
+                create_vals.append({
+                    'zkteco_device_attend_id': pin,
                     'device_id': self.id,
-                    'zkteco_device_username': device_user_name,
-                    'employee_id': command_record.employee_id.id
+                    'zkteco_device_username': values[1],
+                    'employee_id': values[0],
                 })
-            else:
-                device_user.employee_id = command_record.employee_id
-                device_user.zkteco_device_username = command_record.employee_id.name
-
-            command_record.status = 'success'
-
-        elif command_record.employee_id and command_record.name == "DEL":
-            log_values = command_record.execution_log.split()
-            device_user_id = log_values[2].split('=')[1]
-
-            device_user = self.env['zkteco.attendance.machine'].sudo().search([
-                ('zkteco_device_attend_id', '=', device_user_id),
-                ('device_id', '=', self.id)
-            ])
-            device_user.unlink()
-            command_record.status = 'success'
-
-        elif command_record.employee_id and command_record.name == "UPDATE":
-            device_user = self.env['zkteco.attendance.machine'].sudo().search([
-                ('zkteco_device_attend_id', '=', command_record.pin),
-                ('device_id', '=', self.id)
-            ])
-            device_user.zkteco_device_username = command_record.employee_id.name
-            command_record.status = 'success'
 
-        elif command_record.name in ["USERINFO", "CHECK"]:
-            command_record.status = 'success'
-
-        return command_record
+        for (employee_id, user_name), user_ids in write_groups.items():
+            DeviceUser.browse(user_ids).write({
+                'employee_id': employee_id,
+                'zkteco_device_username': user_name,
+            })
+        if unlink_ids:
+            DeviceUser.browse(unlink_ids).unlink()
+        if create_vals:
+            DeviceUser.create(create_vals)
+        done_commands.write({'status': 'success'})
+        failed_commands.write({'status': 'failed'})
+        return done_commands | failed_commands
 
     def action_export_device_employee(self):
 
         employees_to_export = self.env['hr.employee'].search([
             ('biometric_device_ids', '=', False)
         ])
-        for employee in employees_to_export:
-            employee.create_export_command(self)
+        self.env['hr.employee'].create_export_commands(employees_to_export, self)
 
     def action_zkteco_device_user_data_download(self):
 
@@ -794,62 +1229,128 @@ class ZktecoDeviceSetting(models.Model):
             pending_check_cmd.execution_log = f"C:{pending_check_cmd.id}:CHECK\n"
 
     def action_sync_employees_all_devices(self):
-
-
-        all_employees = self.env['hr.employee'].search([])
+        """
+        Export the employees missing on every device: commands for the ADMS
+        devices, a parallel upload for the binary ones. Return a notification
+        listing the devices whose synchronization failed.
+        """
         all_devices = self.search([])
+        all_employees = self.env['hr.employee'].search([])
+        mappings = self.env['zkteco.attendance.machine'].search([
+            ('employee_id', 'in', all_employees.ids)
+        ])
 
-        for employee in all_employees:
-            for device in all_devices:
-
-                existing_record = self.env['zkteco.attendance.machine'].search([
-                    ('employee_id', '=', employee.id),
-                    ('device_id', '=', device.id),
-                ])
+        mapped_employee_ids = defaultdict(set)
+        preferred_pins = {}
+        for mapping in mappings:
+            mapped_employee_ids[mapping.device_id.id].add(mapping.employee_id.id)
+            preferred_pins.setdefault(mapping.employee_id.id, mapping.zkteco_device_attend_id)
+
+        for device in all_devices.filtered('is_adms'):
+            missing_employees = all_employees.filtered(lambda e: e.id not in mapped_employee_ids[device.id])
+            self.env['hr.employee'].create_export_commands(missing_employees, device)
+
+        errors = []
+        binary_devices = all_devices.filtered(lambda d: not d.is_adms)
+        if binary_devices:
+            errors = self._sync_binary_devices(binary_devices, all_employees, preferred_pins)
+        if errors:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _("Employee synchronization failed on %(failed)s of %(total)s devices",
+                               failed=len(errors), total=len(all_devices)),
+                    'message': '\n'.join(errors),
+                    'type': 'warning',
+                    'sticky': True,
+                },
+            }
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Employee Data Sync Completed"),
+                'message': _("Employees synchronized to %s devices.", len(all_devices)),
+                'type': 'success',
+                'sticky': False,
+            },
+        }
 
+    def _sync_binary_devices(self, binary_devices, all_employees, preferred_pins):
+        """
+        Upload the missing employees to the binary devices in parallel, one
+        connection each, and return the error messages of the failed devices.
+        """
+        binary_devices._mark_device_busy()
+        jobs = {}
+        for device in binary_devices:
+            snapshot = device._get_device_sync_snapshot(all_employees)
+            snapshot['preferred_pins'] = preferred_pins
+            jobs[device] = (device.zkteco_device_ip_address, device.port, device.zkteco_device_pass, snapshot,
+                            device.read_pipeline_depth or 1)
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=min(DEVICE_SYNC_MAX_WORKERS, len(jobs))) as executor:
+            futures = {
+                executor.submit(self._sync_missing_device_users, *job): device
+                for device, job in jobs.items()
+            }
+            for future in as_completed(futures):
+                device = futures[future]
                 try:
-                    if not existing_record:
-                        if device.is_adms:
-                            employee.create_export_command(device)
-                        else:
-                            device_user_id = ''
-                            for line in employee.biometric_device_ids:
-                                device_user_id = line.zkteco_device_attend_id
-
-                            ip_address = device.zkteco_device_ip_address
-                            port_number = device.port
-                            device_password = device.zkteco_device_pass
-
-                            zk_connection = ZK(ip_address, port_number, password=device_password)
-                            connection = zk_connection.connect()
-
-                            if connection:
-                                device_users = zk_connection.get_users()
-
-                                already_exists = any(
-                                    user.user_id == device_user_id for user in device_users
-                                )
-
-                                if already_exists:
-                                    continue
-                                else:
-                                    if device_user_id:
-                                        zk_connection.set_user(
-                                            int(device_user_id),
-                                            employee.name,
-                                            0,  # Privilege
-                                            '', '',  # Empty password and card number
-                                            device_user_id
-                                        )
-                                    else:
-                                        employee.update_zkteco_device_emp()
-
-                                zk_connection.disconnect()
-                            else:
-                                raise ValidationError(
-                                    f"Failed to establish connection with the device {device.name} at {ip_address}:{port_number}."
-                                )
-                except Exception:
+                    diff = future.result()
+                except Exception as sync_exception:
+                    _logger.warning("Employee synchronization failed for device %s: %s", device.name, sync_exception)
+                    errors.append(_("%(device)s: %(error)s", device=device.name, error=sync_exception))
                     continue
+                device._apply_device_user_diff(diff)
+        return errors
 
-
+    @api.model
+    def _sync_missing_device_users(self, device_ip, device_port, device_password, snapshot, pipeline_depth=1):
+        """
+        Connect once to a terminal, fetch its users once and upload every
+        missing employee in one batch. Runs in a worker thread, so it only
+        works on the plain data snapshot and never touches the ORM.
+        """
+        zk_device = ZK(device_ip, device_port, password=device_password, pipeline_depth=pipeline_depth)
+        zk_device.connect()
+        try:
+            diff = self._compute_device_user_diff(zk_device.get_users(), snapshot, zk_device.user_packet_size)
+            diff['rename'] = []
+            diff['delete'] = []
+            self._push_device_user_diff(zk_device, diff)
+        finally:
+            zk_device.disconnect()
+        return diff
+
+    @api.model
+    def _push_device_templates(self, device_ip, device_port, device_password, snapshot, fingers_by_employee):
+        """
+        Upload employees and their fingerprint templates to one terminal with
+        a single buffered write, creating the missing device users on the way.
+        Runs in a worker thread, on the plain data snapshot only.
+        """
+        zk_device = ZK(device_ip, device_port, password=device_password)
+        zk_device.connect()
+        try:
+            device_users = zk_device.get_users()
+            diff = self._compute_device_user_diff(device_users, snapshot, zk_device.user_packet_size)
+            users_by_pin = {user.user_id: user for user in device_users}
+            new_users = dict(diff['add'])
+            user_templates = []
+            for employee_id, _name in snapshot['employees']:
+                user = new_users.get(employee_id) or users_by_pin.get(snapshot['mapped'].get(employee_id))
+                if user:
+                    user_templates.append((user, [
+                        Finger(user.uid, finger_id, 1, raw_template)
+                        for finger_id, raw_template in fingers_by_employee.get(employee_id, [])
+                    ]))
+            if user_templates:
+                zk_device.HR_save_usertemplates(user_templates)
+        finally:
+            zk_device.disconnect()
+        diff['rename'] = []
+        diff['delete'] = []
+        return diff, sum(len(fingers) for _user, fingers in user_templates)
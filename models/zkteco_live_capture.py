@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from odoo import api, SUPERUSER_ID
+
+from ..zk import ZK
+from ..zk.attendance import Attendance
+
+_logger = logging.getLogger(__name__)
+
+# seconds between two flushes of the punches captured by a session
+LIVE_CAPTURE_FLUSH_INTERVAL = 5
+LIVE_CAPTURE_BATCH_SIZE = 500
+# punches kept in memory while the database cannot be reached
+LIVE_CAPTURE_MAX_BUFFER = 50000
+# seconds a session owns its device without renewing the lease
+LIVE_CAPTURE_LEASE = 120
+LIVE_CAPTURE_CONNECT_TIMEOUT = 10
+# seconds waited before the successive reconnection attempts
+LIVE_CAPTURE_BACKOFF = (1, 2, 5, 10, 30, 60)
+
+# {(dbname, device id): LiveCaptureSession}, per process
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _owner_tag():
+    """ identify the process holding live-capture leases """
+    return '%s:%s' % (socket.gethostname(), os.getpid())
+
+
+class LiveCaptureSession(threading.Thread):
+    """
+    Hold a live-capture session on one binary-protocol terminal.
+
+    The thread connects to the device, registers for attendance events and
+    buffers the punches it receives, flushing them to zkteco.device.logs
+    every LIVE_CAPTURE_FLUSH_INTERVAL seconds in a transaction of its own.
+    A lost connection is retried with the delays of LIVE_CAPTURE_BACKOFF.
+    The session stops when asked to, or when its lease on the device cannot
+    be renewed: the device left real-time mode or another process took it.
+    """
+
+    def __init__(self, registry, device_id, owner):
+        super().__init__(name='zkteco-live-capture-%s-%s' % (registry.db_name, device_id), daemon=True)
+        self.registry = registry
+        self.device_id = device_id
+        self.owner = owner
+        self.stopped = threading.Event()
+        self.buffer = []
+        self.connection = None
+        self.connected = False
+        self.last_flush = time.monotonic()
+        self.last_renew = time.monotonic()
+
+    def stop(self):
+        self.stopped.set()
+        connection = self.connection
+        if connection:
+            # the generator leaves its loop at the next event or timeout
+            connection.end_live_capture = True
+
+    def run(self):
+        threading.current_thread().dbname = self.registry.db_name
+        attempt = 0
+        while not self.stopped.is_set():
+            self.connected = False
+            try:
+                settings = self._read_device()
+                if not settings:
+                    break
+                self._capture(settings)
+            except Exception as exc:
+                _logger.warning("Live capture of device %s interrupted: %s", self.device_id, exc)
+            finally:
+                self._disconnect()
+                self._flush(force=True)
+            if self.stopped.is_set():
+                break
+            if self.connected:
+                attempt = 0
+            delay = LIVE_CAPTURE_BACKOFF[min(attempt, len(LIVE_CAPTURE_BACKOFF) - 1)]
+            attempt += 1
+            self.stopped.wait(delay)
+        self._release()
+        with _sessions_lock:
+            if _sessions.get((self.registry.db_name, self.device_id)) is self:
+                del _sessions[(self.registry.db_name, self.device_id)]
+        _logger.info("Live capture of device %s stopped", self.device_id)
+
+    def _read_device(self):
+        """ return the connection settings of the device, None when it is no longer live-captured """
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            device = env['zkteco.device.setting'].browse(self.device_id).exists()
+            if not device or not device._renew_live_capture_lease(self.owner):
+                return None
+            return {
+                'ip': device.zkteco_device_ip_address,
+                'port': device.port,
+                'password': device.zkteco_device_pass or 0,
+            }
+
+    def _capture(self, settings):
+        """ buffer the punches of the device until stopped or disconnected """
+        zk = ZK(settings['ip'], settings['port'], timeout=LIVE_CAPTURE_CONNECT_TIMEOUT,
+                password=settings['password'])
+        self.connection = zk.connect()
+        self.connected = True
+        _logger.info("Live capture of device %s started on %s:%s", self.device_id, settings['ip'], settings['port'])
+        for event in self.connection.live_capture(new_timeout=LIVE_CAPTURE_FLUSH_INTERVAL):
+            if self.stopped.is_set():
+                self.connection.end_live_capture = True
+                continue
+            if isinstance(event, Attendance):
+                self.buffer.append((event.user_id, event.timestamp, event.status, event.punch))
+            self._flush()
+
+    def _flush(self, force=False):
+        """ store the buffered punches when a batch is full or the flush interval elapsed """
+        now = time.monotonic()
+        due = now - self.last_flush >= LIVE_CAPTURE_FLUSH_INTERVAL
+        if not (force or due or len(self.buffer) >= LIVE_CAPTURE_BATCH_SIZE):
+            return
+        self.last_flush = now
+        renew = now - self.last_renew >= LIVE_CAPTURE_LEASE / 4
+        if not self.buffer and not renew:
+            return
+        punches, self.buffer = self.buffer, []
+        try:
+            with self.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                device = env['zkteco.device.setting'].browse(self.device_id).exists()
+                if not device:
+                    self.stop()
+                    return
+                if punches:
+                    device._store_live_punches(punches)
+                if renew:
+                    self.last_renew = now
+                    if not device._renew_live_capture_lease(self.owner):
+                        self.stop()
+                    elif self.connection:
+                        device._touch_last_seen()
+        except Exception:
+            _logger.warning("Could not store %s live punches of device %s, retrying at the next flush",
+                            len(punches), self.device_id, exc_info=True)
+            self.buffer = (punches + self.buffer)[-LIVE_CAPTURE_MAX_BUFFER:]
+
+    def _disconnect(self):
+        connection, self.connection = self.connection, None
+        if connection:
+            try:
+                connection.disconnect()
+            except Exception:
+                pass
+
+    def _release(self):
+        try:
+            with self.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['zkteco.device.setting'].browse(self.device_id)._release_live_capture_lease(self.owner)
+        except Exception:
+            _logger.warning("Could not release the live capture lease of device %s", self.device_id, exc_info=True)
+
+
+def supervise_live_capture(devices):
+    """
+    Run one live-capture session per device of devices in this process,
+    for the devices whose lease it holds or can take, and stop the sessions
+    of the other devices of the database.
+    """
+    registry = devices.env.registry
+    dbname = registry.db_name
+    owner = _owner_tag()
+    wanted = set(devices.ids)
+    with _sessions_lock:
+        for (session_dbname, device_id), session in list(_sessions.items()):
+            if session_dbname != dbname:
+                continue
+            if device_id not in wanted:
+                session.stop()
+            elif not session.is_alive():
+                del _sessions[(session_dbname, device_id)]
+        for device_id in wanted:
+            if (dbname, device_id) in _sessions:
+                continue
+            # the lease is committed before the session starts, so no other process starts one
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                if not env['zkteco.device.setting'].browse(device_id)._renew_live_capture_lease(owner):
+                    continue
+            session = LiveCaptureSession(registry, device_id, owner)
+            _sessions[(dbname, device_id)] = session
+            session.start()
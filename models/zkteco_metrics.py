@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import logging
+import threading
+import time
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# seconds between two flushes of the in-process metric deltas of a database
+METRICS_FLUSH_INTERVAL = 30
+INGEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PULL_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600)
+UNCALCULATED_LOGS = 'zkteco_uncalculated_logs'
+
+# name: (type, help) of every metric rendered by /zkteco/metrics
+METRICS = {
+    'zkteco_punches_ingested_total': ('counter', 'Punches received from the devices.'),
+    'zkteco_adms_requests_total': ('counter', 'ADMS requests handled, by route and HTTP status.'),
+    'zkteco_ingest_duration_seconds': ('histogram', 'Processing time of ADMS ATTLOG and OPERLOG uploads.'),
+    'zkteco_binary_pull_duration_seconds': ('histogram', 'Duration of the attendance pulls from binary devices.'),
+    'zkteco_device_last_seen_age_seconds': ('gauge', 'Seconds since the device last contacted or answered Odoo.'),
+    'zkteco_commands': ('gauge', 'Device commands waiting for delivery or acknowledgement, by status.'),
+    UNCALCULATED_LOGS: ('gauge', 'Punch logs not yet turned into attendances.'),
+}
+LAST_SEEN = 'zkteco_device_last_seen'
+
+# {dbname: {(name, labels, kind): value}}, per process
+_metric_deltas = {}
+_metric_last_flush = {}
+_metric_lock = threading.Lock()
+
+
+def _format_labels(labels):
+    """ canonical Prometheus label string of a dict, sorted by name """
+    return ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+
+
+def _record(env, name, value, labels, kind='sum'):
+    dbname = env.cr.dbname
+    key = (name, _format_labels(labels), kind)
+    with _metric_lock:
+        deltas = _metric_deltas.setdefault(dbname, {})
+        if kind == 'max':
+            deltas[key] = max(deltas.get(key, value), value)
+        else:
+            deltas[key] = deltas.get(key, 0) + value
+        due = time.time() - _metric_last_flush.setdefault(dbname, time.time()) >= METRICS_FLUSH_INTERVAL
+    if due:
+        env['zkteco.metric.value']._flush_metrics()
+
+
+def inc_counter(env, name, value=1, **labels):
+    """ add value to a counter """
+    _record(env, name, value, labels)
+
+
+def observe(env, name, seconds, buckets, **labels):
+    """ add an observation to a histogram """
+    for bucket in buckets:
+        if seconds <= bucket:
+            _record(env, name + '_bucket', 1, dict(labels, le=bucket))
+    _record(env, name + '_bucket', 1, dict(labels, le='+Inf'))
+    _record(env, name + '_sum', seconds, labels)
+    _record(env, name + '_count', 1, labels)
+
+
+def mark_seen(env, device):
+    """ remember that device contacted or answered Odoo now """
+    if device:
+        _record(env, LAST_SEEN, time.time(), {'device': device.name}, kind='max')
+        device._touch_last_seen()
+
+
+class ZktecoMetricValue(models.Model):
+    """
+    Ledger of the metrics exposed on /zkteco/metrics.
+
+    Every process aggregates its counter increments, histogram observations
+    and last-seen times in memory and appends them here at most every
+    METRICS_FLUSH_INTERVAL seconds, so every worker renders the same values.
+    A cron compacts the ledger to one row per series, keeping it as small as
+    the number of series.
+    """
+    _name = 'zkteco.metric.value'
+    _description = 'ZKTeco Metric Value'
+    _log_access = False
+
+    name = fields.Char(string='Metric', required=True, index=True)
+    labels = fields.Char(string='Labels', default='')
+    kind = fields.Selection(
+        [('sum', 'Sum'), ('max', 'Maximum')],
+        string='Aggregation',
+        required=True,
+        default='sum'
+    )
+    value = fields.Float(string='Value')
+
+    def init(self):
+        # seed the backlog counter once, it is maintained incrementally afterwards
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO zkteco_metric_value (name, labels, kind, value)
+            SELECT %(name)s, '', 'sum', COUNT(*) FROM zkteco_device_logs
+             WHERE user_punch_calculated IS NOT TRUE
+               AND NOT EXISTS (SELECT 1 FROM zkteco_metric_value WHERE name = %(name)s)
+            """,
+            name=UNCALCULATED_LOGS,
+        ))
+
+    @api.model
+    def _add_uncalculated_logs(self, delta):
+        """
+        Adjust the uncalculated log backlog by delta when the current
+        transaction commits, with one insert whatever the number of calls.
+        """
+        if not delta:
+            return
+        precommit = self.env.cr.precommit
+        pending = precommit.data.setdefault(UNCALCULATED_LOGS, [0])
+        if not pending[0]:
+            @precommit.add
+            def _insert_backlog_delta():
+                change = precommit.data.pop(UNCALCULATED_LOGS, [0])[0]
+                if change:
+                    self.env.cr.execute(SQL(
+                        "INSERT INTO zkteco_metric_value (name, labels, kind, value) VALUES (%s, '', 'sum', %s)",
+                        UNCALCULATED_LOGS, change,
+                    ))
+        pending[0] += delta
+
+    @api.model
+    def _flush_metrics(self):
+        """ append the deltas aggregated by this process, in a separate transaction """
+        dbname = self.env.cr.dbname
+        with _metric_lock:
+            deltas = _metric_deltas.pop(dbname, {})
+            _metric_last_flush[dbname] = time.time()
+        if not deltas:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute(SQL(
+                    "INSERT INTO zkteco_metric_value (name, labels, kind, value) VALUES %s",
+                    SQL(', ').join(
+                        SQL('(%s, %s, %s, %s)', name, labels, kind, value)
+                        for (name, labels, kind), value in deltas.items()
+                    ),
+                ))
+        except Exception:
+            _logger.warning("Could not flush %s metric values", len(deltas), exc_info=True)
+
+    @api.model
+    def _cron_compact_metrics(self):
+        """ replace the ledger rows of every series by their aggregate """
+        self.env.cr.execute(SQL(
+            """
+            WITH removed AS (DELETE FROM zkteco_metric_value RETURNING name, labels, kind, value)
+            INSERT INTO zkteco_metric_value (name, labels, kind, value)
+            SELECT name, labels, kind, CASE WHEN kind = 'max' THEN MAX(value) ELSE SUM(value) END
+              FROM removed
+             GROUP BY name, labels, kind
+            """
+        ))
+
+    @api.model
+    def _get_series(self):
+        """ return {(name, labels): value} aggregated over the ledger """
+        self.flush_model()
+        self.env.cr.execute(SQL(
+            """
+            SELECT name, labels, CASE WHEN kind = 'max' THEN MAX(value) ELSE SUM(value) END
+              FROM zkteco_metric_value
+             GROUP BY name, labels, kind
+            """
+        ))
+        return {(name, labels or ''): value for name, labels, value in self.env.cr.fetchall()}
+
+    @api.model
+    def _render_metrics(self):
+        """ render every metric in the Prometheus text exposition format """
+        self._flush_metrics()
+        series = self._get_series()
+        now = time.time()
+
+        samples = {name: [] for name in METRICS}
+        for (name, labels), value in sorted(series.items()):
+            if name == LAST_SEEN:
+                samples['zkteco_device_last_seen_age_seconds'].append((labels, max(now - value, 0)))
+                continue
+            base = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                    base = name[:-len(suffix)]
+            if base in samples:
+                samples[base].append((name, labels, value))
+
+        # same predicate as the partial index of the open commands, an index-only scan
+        self.env['zkteco.dcmmand'].flush_model(['status'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT status, COUNT(*)
+              FROM zkteco_dcmmand
+             WHERE status IN ('pending', 'executed')
+             GROUP BY status
+             ORDER BY status
+            """
+        ))
+        for status, count in self.env.cr.fetchall():
+            samples['zkteco_commands'].append((_format_labels({'status': status}), count))
+
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for sample in samples[name]:
+                if len(sample) == 2:
+                    sample = (name,) + sample
+                sample_name, labels, value = sample
+                lines.append('%s%s %s' % (sample_name, '{%s}' % labels if labels else '', repr(float(value))))
+        return '\n'.join(lines) + '\n'
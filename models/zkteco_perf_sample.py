@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import functools
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from odoo import api, fields, models, tools, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+# seconds between two flushes of the in-memory spans of a database
+PERF_FLUSH_INTERVAL = 60
+PERF_RETENTION_DAYS = 90
+PERF_ENABLED_PARAM = 'dps_zkteco_biometric_integration.perf_instrumentation'
+
+# {dbname: {(stage, device id): [count, total ms, max ms, rows]}}, per process
+_perf_spans = {}
+_perf_last_flush = {}
+# {dbname: threading.Timer} flushing the spans left when no later span closes
+_perf_timers = {}
+_perf_lock = threading.Lock()
+
+
+def _flush_registry_spans(registry):
+    """ timer callback, flush the spans of the database of registry """
+    try:
+        with registry.cursor() as cr:
+            api.Environment(cr, SUPERUSER_ID, {})['zkteco.perf.sample']._flush_spans()
+    except Exception:
+        _logger.warning("Could not flush the performance samples of %s", registry.db_name, exc_info=True)
+
+
+class _NullSpan(object):
+    """ span returned while the instrumentation is off, does nothing """
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def perf_stage(stage, device=None):
+    """
+    Decorate a method so each call is timed as a span of stage; stage may
+    be a callable returning the stage name from the recordset, and device a
+    callable returning the device the span is attributed to.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stage_name = stage(self) if callable(stage) else stage
+            span_device = device(self) if device else None
+            with self.env['zkteco.perf.sample']._span(stage_name, span_device, rows=len(self)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Span(object):
+    """ time the block and add it to the in-memory aggregate of its stage """
+
+    def __init__(self, sample_model, stage, device_id, rows):
+        self.sample_model = sample_model
+        self.stage = stage
+        self.device_id = device_id
+        self.rows = rows
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000.0
+        dbname = self.sample_model.env.cr.dbname
+        with _perf_lock:
+            spans = _perf_spans.setdefault(dbname, {})
+            aggregate = spans.setdefault((self.stage, self.device_id), [0, 0.0, 0.0, 0])
+            aggregate[0] += 1
+            aggregate[1] += elapsed_ms
+            aggregate[2] = max(aggregate[2], elapsed_ms)
+            aggregate[3] += self.rows or 0
+            due = time.time() - _perf_last_flush.setdefault(dbname, time.time()) >= PERF_FLUSH_INTERVAL
+            if not due and dbname not in _perf_timers:
+                # a quiet database gets its spans written at the end of the interval anyway
+                timer = threading.Timer(PERF_FLUSH_INTERVAL, _flush_registry_spans,
+                                        (self.sample_model.env.registry,))
+                timer.daemon = True
+                _perf_timers[dbname] = timer
+                timer.start()
+        if due:
+            self.sample_model._flush_spans()
+        return False
+
+
+class ZktecoPerfSample(models.Model):
+    """
+    Performance ledger of the integration pipeline.
+
+    Timing spans (ADMS ingestion, binary pulls, attendance calculation,
+    reports) are aggregated in memory per stage and device, and flushed
+    every PERF_FLUSH_INTERVAL seconds as one sample per stage and device,
+    by the next span closing or else by a timer of the process. Spans cost
+    nothing but a cached parameter lookup while the instrumentation is
+    switched off.
+    """
+    _name = 'zkteco.perf.sample'
+    _description = 'ZKTeco Performance Sample'
+    _order = 'sample_date desc, id desc'
+    _rec_name = 'stage'
+
+    sample_date = fields.Datetime(
+        string='Flushed At',
+        required=True,
+        default=fields.Datetime.now,
+        readonly=True
+    )
+    stage = fields.Char(
+        string='Stage',
+        required=True,
+        readonly=True
+    )
+    device_id = fields.Many2one(
+        'zkteco.device.setting',
+        string='Device',
+        ondelete='cascade',
+        readonly=True
+    )
+    count = fields.Integer(
+        string='Calls',
+        readonly=True,
+        aggregator='sum'
+    )
+    total_ms = fields.Float(
+        string='Total (ms)',
+        readonly=True,
+        aggregator='sum'
+    )
+    max_ms = fields.Float(
+        string='Max (ms)',
+        readonly=True,
+        aggregator='max'
+    )
+    rows = fields.Integer(
+        string='Rows',
+        readonly=True,
+        aggregator='sum'
+    )
+    avg_ms = fields.Float(
+        string='Average (ms)',
+        compute='_compute_avg_ms'
+    )
+
+    _stage_date_idx = models.Index('(stage, sample_date)')
+
+    @api.depends('count', 'total_ms')
+    def _compute_avg_ms(self):
+
+        for sample in self:
+            sample.avg_ms = sample.total_ms / sample.count if sample.count else 0.0
+
+    @api.model
+    @tools.ormcache()
+    def _is_enabled(self):
+        return tools.str2bool(
+            self.env['ir.config_parameter'].sudo().get_param(PERF_ENABLED_PARAM) or False
+        )
+
+    @api.model
+    def _span(self, stage, device=None, rows=0):
+        """
+        Return a context manager timing a pipeline stage:
+
+            with self.env['zkteco.perf.sample']._span('adms.attlog', device) as span:
+                ...
+                span.rows = len(lines)
+        """
+        if not self._is_enabled():
+            return _NULL_SPAN
+        return _Span(self, stage, device.id if device else False, rows)
+
+    @api.model
+    def _flush_spans(self):
+        """
+        Write the spans aggregated by this process in a separate transaction,
+        so the samples survive a rollback of the request being measured.
+        """
+        dbname = self.env.cr.dbname
+        with _perf_lock:
+            spans = _perf_spans.pop(dbname, {})
+            _perf_last_flush[dbname] = time.time()
+            timer = _perf_timers.pop(dbname, None)
+        if timer and timer is not threading.current_thread():
+            timer.cancel()
+        if not spans:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                env = self.env(cr=cr, su=True)
+                existing_devices = set(env['zkteco.device.setting'].browse(
+                    list({device_id for _stage, device_id in spans if device_id})
+                ).exists().ids)
+                env[self._name].create([
+                    {
+                        'stage': stage,
+                        'device_id': device_id if device_id in existing_devices else False,
+                        'count': count,
+                        'total_ms': total_ms,
+                        'max_ms': max_ms,
+                        'rows': rows,
+                    }
+                    for (stage, device_id), (count, total_ms, max_ms, rows) in spans.items()
+                ])
+        except Exception:
+            _logger.warning("Could not flush %s performance samples", len(spans), exc_info=True)
+
+    @api.autovacuum
+    def _gc_perf_samples(self):
+        self.search([
+            ('sample_date', '<', fields.Datetime.now() - timedelta(days=PERF_RETENTION_DAYS))
+        ]).unlink()
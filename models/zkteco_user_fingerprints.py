@@ -5,8 +5,113 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
+import base64
+import hashlib
+import zlib
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL
+from odoo.tools.sql import column_exists
+
+
+class ZktecoFingerprintTemplate(models.Model):
+    """
+    Content-addressed store of fingerprint templates.
+
+    Each distinct template is stored once, zlib-compressed and keyed by the
+    SHA-1 of its raw bytes, whatever the number of devices and fingers
+    referencing it. The compressed bytes live in the compressed_template
+    bytea column, created by init and only accessed through SQL: a Binary
+    field would store them base64-encoded, a third larger.
+    """
+    _name = 'zkteco.fingerprint.template'
+    _description = 'ZKTeco Fingerprint Template Store'
+    _rec_name = 'checksum'
+
+    checksum = fields.Char(
+        string='Checksum',
+        required=True,
+        readonly=True,
+        help="SHA-1 of the raw template bytes."
+    )
+    template_size = fields.Integer(
+        string='Size',
+        readonly=True,
+        help="Size in bytes of the uncompressed template."
+    )
+
+    _checksum_uniq = models.UniqueIndex('(checksum)', "A template with the same checksum already exists.")
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute(SQL("ALTER TABLE zkteco_fingerprint_template ADD COLUMN IF NOT EXISTS compressed_template bytea"))
+        if column_exists(cr, 'zkteco_fingerprint_template', 'compressed_data'):
+            # templates stored base64-encoded by the former Binary field, dropped with it
+            cr.execute(SQL(
+                """
+                UPDATE zkteco_fingerprint_template
+                   SET compressed_template = decode(convert_from(compressed_data, 'UTF8'), 'base64')
+                 WHERE compressed_template IS NULL AND compressed_data IS NOT NULL
+                """
+            ))
+
+    @staticmethod
+    def _compute_checksum(raw_template):
+        return hashlib.sha1(raw_template).hexdigest()
+
+    @api.model
+    def _get_or_create(self, raw_templates):
+        """
+        Return {checksum: template} for the given raw template bytes, inserting
+        the unknown ones in a single statement. A template inserted meanwhile
+        by a concurrent transaction makes the INSERT fail with a serialization
+        error, so the whole request is retried and then finds it.
+        """
+        raw_by_checksum = {self._compute_checksum(raw): raw for raw in raw_templates}
+        templates = {
+            template.checksum: template
+            for template in self.search([('checksum', 'in', list(raw_by_checksum))])
+        }
+        missing = [(checksum, raw) for checksum, raw in raw_by_checksum.items() if checksum not in templates]
+        if missing:
+            self.flush_model()
+            uid = self.env.uid
+            self.env.cr.execute(SQL(
+                """
+                INSERT INTO zkteco_fingerprint_template
+                       (checksum, template_size, compressed_template, create_uid, create_date, write_uid, write_date)
+                VALUES %s
+                ON CONFLICT (checksum) DO NOTHING
+             RETURNING id
+                """,
+                SQL(", ").join(
+                    SQL("(%s, %s, %s, %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'))",
+                        checksum, len(raw), zlib.compress(raw), uid, uid)
+                    for checksum, raw in missing
+                ),
+            ))
+            new_templates = self.browse([row[0] for row in self.env.cr.fetchall()])
+            templates.update((template.checksum, template) for template in new_templates)
+        return templates
+
+    def _get_raw_templates(self):
+        """ return {template id: raw template bytes} of the templates of self, with one query """
+        if not self:
+            return {}
+        self.env.cr.execute(SQL(
+            "SELECT id, compressed_template FROM zkteco_fingerprint_template WHERE id IN %s",
+            tuple(self.ids),
+        ))
+        return {
+            template_id: zlib.decompress(compressed) if compressed is not None else b''
+            for template_id, compressed in self.env.cr.fetchall()
+        }
+
+    def _get_raw_template(self):
+        self.ensure_one()
+        return self._get_raw_templates()[self.id]
+
 
 class ZktecoDeviceFingerprints(models.Model):
     """
@@ -45,8 +150,44 @@ class ZktecoDeviceFingerprints(models.Model):
         help="The device user entry associated with this employee on the biometric device."
     )
 
+    finger_id = fields.Integer(
+        string='Finger',
+        default=0,
+        help="Index (0-9) of the enrolled finger on the device."
+    )
+
+    template_id = fields.Many2one(
+        'zkteco.fingerprint.template',
+        string='Stored Template',
+        index=True,
+        ondelete='restrict',
+        help="Deduplicated template referenced by this finger."
+    )
+
     template_data = fields.Binary(
         string='Template Data',
-        required=True,
+        compute='_compute_template_data',
+        inverse='_inverse_template_data',
         help="Binary data representing the employee's fingerprint template."
     )
+
+    _device_user_finger_uniq = models.UniqueIndex(
+        '(zketco_duser_id, finger_id)', "A device user has a single template per finger."
+    )
+
+    @api.depends('template_id')
+    def _compute_template_data(self):
+        raw_templates = self.template_id.sudo()._get_raw_templates()
+        for fingerprint in self:
+            template_id = fingerprint.template_id.id
+            fingerprint.template_data = base64.b64encode(raw_templates[template_id]) if template_id else False
+
+    def _inverse_template_data(self):
+        Template = self.env['zkteco.fingerprint.template'].sudo()
+        for fingerprint in self:
+            if not fingerprint.template_data:
+                fingerprint.template_id = False
+                continue
+            raw_template = base64.b64decode(fingerprint.template_data)
+            templates = Template._get_or_create([raw_template])
+            fingerprint.template_id = templates[Template._compute_checksum(raw_template)]
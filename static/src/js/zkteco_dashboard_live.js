@@ -0,0 +1,49 @@
+import { registry } from "@web/core/registry";
+import { _t } from "@web/core/l10n/translation";
+
+/**
+ * Applies the deltas published by dashboard.dashboard._notify_dashboard_deltas
+ * to the counters of an open ZKTeco dashboard, so a lobby screen stays current
+ * without reloading or re-querying the server.
+ */
+const COUNTER_DELTAS = {
+    check_in: { total_present: 1, total_absent: -1 },
+    check_out: { total_present: -1, total_absent: 1 },
+    late: { total_late: 1 },
+    early_leave: { total_early_leave: 1 },
+};
+
+export const zktecoDashboardLiveService = {
+    dependencies: ["bus_service", "company", "notification"],
+
+    start(env, { bus_service, company, notification }) {
+        bus_service.subscribe("zkteco_dashboard/delta", ({ company_id, events }) => {
+            const dashboard = document.querySelector("#zkteco_dashboard[data-zkteco-filter]");
+            if (!dashboard || !company.activeCompanyIds.includes(company_id)) {
+                return;
+            }
+            const period = dashboard.dataset.zktecoFilter;
+            for (const event of events) {
+                if (event.type === "device_online" || event.type === "device_offline") {
+                    notification.add(
+                        event.type === "device_online"
+                            ? _t("Device %s is online", event.name)
+                            : _t("Device %s is offline", event.name),
+                        { type: event.type === "device_online" ? "info" : "warning" }
+                    );
+                    continue;
+                }
+                if (!event.filters.includes(period)) {
+                    continue;
+                }
+                for (const [counter, delta] of Object.entries(COUNTER_DELTAS[event.type] || {})) {
+                    for (const el of dashboard.querySelectorAll(`[data-zkteco-counter="${counter}"]`)) {
+                        el.textContent = Math.max(0, (parseInt(el.textContent) || 0) + delta);
+                    }
+                }
+            }
+        });
+    },
+};
+
+registry.category("services").add("zkteco_dashboard_live", zktecoDashboardLiveService);
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from ..models import zkteco_device_health
+from ..zk import ZK
+
+
+@tagged('post_install', '-at_install')
+class TestDeviceHealth(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.devices = cls.env['zkteco.device.setting'].create([
+            {
+                'name': 'Health device %s' % index,
+                'zkteco_device_ip_address': '192.0.2.%s' % index,
+                'port': 4370,
+                'time_zone': 'UTC',
+            }
+            for index in (1, 2)
+        ])
+
+    def test_probe_disconnects_on_failure(self):
+        with patch.object(ZK, 'connect') as connect, \
+                patch.object(ZK, 'read_sizes', side_effect=OSError('timed out')), \
+                patch.object(ZK, 'disconnect') as disconnect:
+            values = zkteco_device_health.probe_device('192.0.2.1', 4370, 0)
+        connect.assert_called_once()
+        disconnect.assert_called_once()
+        self.assertEqual(values, {'online': False, 'error': 'timed out'})
+
+    def test_monitor_skips_busy_devices(self):
+        busy, idle = self.devices
+        busy._mark_device_busy()
+        self.assertIn(busy.id, self.env['zkteco.device.setting']._get_busy_device_ids())
+
+        probed = []
+
+        def probe(ip, port, password):
+            probed.append(ip)
+            return {'online': True}
+
+        with patch.object(zkteco_device_health, 'probe_device', probe):
+            self.env['zkteco.device.health']._cron_monitor_devices()
+        self.assertIn(idle.zkteco_device_ip_address, probed)
+        self.assertNotIn(busy.zkteco_device_ip_address, probed)
+        samples = self.env['zkteco.device.health'].search([('device_id', 'in', self.devices.ids)])
+        self.assertEqual(samples.device_id, self.devices)
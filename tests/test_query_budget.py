@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+from odoo.tests import TransactionCase, tagged
+
+from ..tools.odoo_bench import QueryLog
+
+# N, every path also runs over 10N inputs against the same budget
+BUDGET_SIZE = 20
+DASHBOARD_COMPUTED_FIELDS = [
+    'total_attedance_logs', 'total_attedance_state', 'total_device', 'total_employee', 'total_absent',
+    'total_present', 'total_late', 'total_early_leave', 'present_employee_data', 'absent_employee_data',
+    'late_employee_data', 'early_leave_employee_data',
+]
+
+
+@tagged('post_install', '-at_install')
+class TestQueryBudget(TransactionCase):
+    """
+    Query-count budgets of the hot paths. Each path runs over N and 10N
+    inputs in a savepoint and must stay within a budget that does not depend
+    on N, so a path whose cost became per-row fails at 10N; the most
+    frequent query shapes of the failing run are added to the failure.
+
+    Punches of device users linked to employees also open and close
+    hr.attendance records, whose validity checks run per record in
+    hr_attendance itself: those paths get a per-row allowance on top of
+    their fixed budget, so they fail when the module adds queries per row.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tz='UTC', tracking_disable=True))
+        cls.day = date.today() - timedelta(days=1)
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with QueryLog(self.env.cr, keep=True) as query_log:
+            try:
+                with self.assertQueryCount(budget):
+                    yield
+            except AssertionError as exc:
+                raise AssertionError('%s\nmost frequent queries:\n%s' % (exc, '\n'.join(
+                    '%6s x %s' % (count, shape[:200]) for shape, count in query_log.patterns()
+                ))) from None
+
+    def assertPathBudget(self, budget, prepare, per_row=0):
+        """
+        run the function returned by prepare(size) for N and 10N within
+        budget queries, plus per_row queries per input row
+        """
+        for size in (BUDGET_SIZE, BUDGET_SIZE * 10):
+            with self.subTest(size=size):
+                function = prepare(size)
+                self.env.invalidate_all()
+                with self.assertQueryBudget(budget + per_row * size):
+                    function()
+
+    def _create_device(self, size, employees=False):
+        """ a device and size device users, PINs 1..size, linked to new employees if employees """
+        device = self.env['zkteco.device.setting'].create({
+            'name': 'Budget device',
+            'serial_number': 'BUDGET%04d' % size,
+            'time_zone': 'UTC',
+        })
+        staff = self.env['hr.employee']
+        if employees:
+            staff = staff.create([{'name': 'Budget employee %05d' % index} for index in range(1, size + 1)])
+        device_users = self.env['zkteco.attendance.machine'].create([
+            {
+                'device_id': device.id,
+                'zkteco_device_attend_id': str(index),
+                'employee_id': staff[index - 1].id if staff else False,
+            }
+            for index in range(1, size + 1)
+        ])
+        return device, staff, device_users
+
+    def _attlog(self, pins):
+        return '\n'.join('%s\t%s 08:%02d:00\t0\t1\t0\t0\t0' % (pin, self.day, pin % 60) for pin in pins)
+
+    def test_attlog_ingest_new_users(self):
+        def prepare(size):
+            device = self.env['zkteco.device.setting'].create({
+                'name': 'Budget device', 'serial_number': 'BUDGETNEW%04d' % size, 'time_zone': 'UTC',
+            })
+            raw_data = self._attlog(range(1, size + 1))
+            return lambda: device.action_create_device_zkteco_logs(raw_data)
+        self.assertPathBudget(20, prepare)
+
+    def test_attlog_ingest_known_users(self):
+        def prepare(size):
+            device, _staff, _device_users = self._create_device(size)
+            raw_data = self._attlog(range(1, size + 1))
+            return lambda: device.action_create_device_zkteco_logs(raw_data)
+        self.assertPathBudget(16, prepare)
+
+    def test_attlog_ingest_linked_employees(self):
+        # every punch opens an hr.attendance, validated per record by hr_attendance
+        def prepare(size):
+            device, _staff, _device_users = self._create_device(size, employees=True)
+            raw_data = self._attlog(range(1, size + 1))
+            return lambda: device.action_create_device_zkteco_logs(raw_data)
+        self.assertPathBudget(30, prepare, per_row=8)
+
+    def test_attlog_ingest_replayed(self):
+        def prepare(size):
+            device, _staff, _device_users = self._create_device(size)
+            raw_data = self._attlog(range(1, size + 1))
+            device.action_create_device_zkteco_logs(raw_data)
+            return lambda: device.action_create_device_zkteco_logs(raw_data)
+        self.assertPathBudget(8, prepare)
+
+    def test_device_logs_create(self):
+        def prepare(size):
+            _device, _staff, device_users = self._create_device(size)
+            punch = datetime.combine(self.day, time(8, 0))
+            values = [{
+                'zketco_duser_id': device_user.id,
+                'user_punch_time': punch,
+                'status_number': '0',
+                'device': 'Budget device',
+                'timestamp': int(punch.timestamp()),
+            } for device_user in device_users]
+            return lambda: self.env['zkteco.device.logs'].create(values)
+        self.assertPathBudget(12, prepare)
+
+    def test_device_logs_close_attendances(self):
+        # check-outs of open attendances, one write per attendance in hr_attendance
+        def prepare(size):
+            _device, staff, device_users = self._create_device(size, employees=True)
+            check_in = datetime.combine(self.day, time(8, 0))
+            self.env['hr.attendance'].create([
+                {'employee_id': employee.id, 'check_in': check_in} for employee in staff
+            ])
+            values = [{
+                'zketco_duser_id': device_user.id,
+                'user_punch_time': check_in + timedelta(hours=9),
+                'status_number': '1',
+                'device': 'Budget device',
+            } for device_user in device_users]
+            return lambda: self.env['zkteco.device.logs'].create(values)
+        self.assertPathBudget(25, prepare, per_row=8)
+
+    def test_calculate_attendance(self):
+        # follow-up budget: the calculation still runs its searches per punch
+        def prepare(size):
+            _device, _staff, device_users = self._create_device(size, employees=True)
+            punch = datetime.combine(self.day, time(8, 0))
+            self.env['zkteco.device.logs'].create([{
+                'zketco_duser_id': device_user.id,
+                'user_punch_time': punch,
+                'status_number': '2',
+                'device': 'Budget device',
+            } for device_user in device_users])
+            wizard = self.env['zkteco.calculation.wizard'].create({})
+            return wizard.calculate_attendance
+        self.assertPathBudget(30, prepare, per_row=20)
+
+    def test_dashboard(self):
+        def prepare(size):
+            _device, staff, _device_users = self._create_device(size, employees=True)
+            now = datetime.now().replace(microsecond=0)
+            self.env['hr.attendance'].create([
+                {'employee_id': employee.id, 'check_in': now - timedelta(hours=2)} for employee in staff
+            ])
+            dashboard = self.env['dashboard.dashboard'].create({'dashboard_data_filter': 'today'})
+            return lambda: dashboard.read(DASHBOARD_COMPUTED_FIELDS)
+        self.assertPathBudget(25, prepare)
+
+    def test_absence_report(self):
+        def prepare(size):
+            _device, staff, _device_users = self._create_device(size, employees=True)
+            self.env['hr.attendance'].create([
+                {'employee_id': employee.id, 'check_in': datetime.combine(self.day, time(8, 0))}
+                for employee in staff[::2]
+            ])
+            wizard = self.env['employee.attendance.reports'].create({
+                'report_type': 'absence_report',
+                'start_date': self.day - timedelta(days=6),
+                'end_date': self.day,
+                'employee_ids': [(6, 0, staff.ids)],
+            })
+            return wizard.generate_report
+        self.assertPathBudget(15, prepare)
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+"""
+ADMS load generator for the /iclock endpoints of ZKTecoController.
+
+Simulates N virtual ADMS terminals against a running Odoo server. Each
+terminal performs the GET /iclock/cdata handshake, then until the end of
+the run:
+    - pushes ATTLOG batches at the configured punch rate,
+    - pushes OPERLOG batches (OPLOG and USER lines),
+    - polls /iclock/getrequest and acknowledges every returned command on
+      /iclock/devicecmd.
+
+The report gives punches per second and the p50/p95/p99 latency of every
+route. When --odoo-log points to the server log file (log level info), the
+query count Odoo logs for each request is averaged per route too.
+
+Devices are matched on their serial number; --create-devices registers the
+virtual terminals through XML-RPC first.
+
+    python tools/adms_load_test.py --url http://localhost:8069 --terminals 20 \\
+        --duration 60 --punch-rate 2 --batch-size 10 \\
+        --create-devices --db test --login admin --password admin \\
+        --odoo-log /var/log/odoo/odoo.log --save-baseline adms_baseline.json
+
+    python tools/adms_load_test.py ... --compare adms_baseline.json
+
+With --compare, the exit status is 1 when a route's p95 latency or query
+count, or the punch throughput, regresses by more than --tolerance.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import xmlrpc.client
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+ROUTE_HANDSHAKE = 'GET /iclock/cdata'
+ROUTE_ATTLOG = 'POST /iclock/cdata ATTLOG'
+ROUTE_OPERLOG = 'POST /iclock/cdata OPERLOG'
+ROUTE_GETREQUEST = 'GET /iclock/getrequest'
+ROUTE_DEVICECMD = 'POST /iclock/devicecmd'
+
+# werkzeug request line as logged by Odoo: "... HTTP/1.1" 200 - <queries> <query time> <remaining time>
+ODOO_REQUEST_LOG = re.compile(
+    r'"(?P<method>GET|POST) (?P<path>\S+) HTTP/[\d.]+" (?P<status>\d{3}) - (?P<queries>\d+) [\d.]+ [\d.]+'
+)
+
+
+def percentile(values, rank):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(rank / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Stats(object):
+    """ latencies and errors per route, shared by the terminal threads """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.punches = 0
+        self.commands = 0
+
+    def record(self, route, latency, ok):
+        with self.lock:
+            self.latencies[route].append(latency)
+            if not ok:
+                self.errors[route] += 1
+
+
+class VirtualTerminal(threading.Thread):
+    """ one ADMS terminal talking to Odoo over a keep-alive connection """
+
+    def __init__(self, options, serial_number, stats, deadline, seed):
+        super().__init__(daemon=True)
+        self.options = options
+        self.serial_number = serial_number
+        self.stats = stats
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.url = urlsplit(options.url)
+        self.connection = None
+        self.punch_time = datetime(2024, 1, 1, 7, 0, 0) + timedelta(days=seed)
+        self.op_stamp = 0
+
+    def _request(self, route, method, path, params, body=None):
+        query = '%s?%s' % (path, urlencode(params))
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                connection_class = (http.client.HTTPSConnection if self.url.scheme == 'https'
+                                    else http.client.HTTPConnection)
+                self.connection = connection_class(self.url.hostname, self.url.port, timeout=self.options.timeout)
+            headers = {'Content-Type': 'text/plain'} if body is not None else {}
+            # bytes body: sent with the headers in one segment, no delayed-ACK stall
+            self.connection.request(method, query, body=body.encode() if body is not None else None, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read().decode('utf-8', errors='replace')
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            self.connection = None
+            payload, ok = '', False
+        self.stats.record(route, time.perf_counter() - start, ok)
+        return payload if ok else None
+
+    def _attlog_body(self):
+        lines = []
+        for _index in range(self.options.batch_size):
+            self.punch_time += timedelta(seconds=self.random.randint(1, 90))
+            pin = self.random.randint(1, self.options.users)
+            lines.append('%s\t%s\t%s\t1\t0\t0\t0' % (
+                pin, self.punch_time.strftime('%Y-%m-%d %H:%M:%S'), self.random.choice((1, 2))))
+        return '\n'.join(lines) + '\n'
+
+    def _operlog_body(self):
+        lines = []
+        for _index in range(self.options.batch_size):
+            self.op_stamp += 1
+            pin = self.random.randint(1, self.options.users)
+            op_time = (self.punch_time + timedelta(seconds=self.op_stamp)).strftime('%Y-%m-%d %H:%M:%S')
+            lines.append('OPLOG 4\t0\t%s\t%s\t0\t0\t0' % (op_time, pin))
+            lines.append('USER PIN=%s\tName=Load %s\tPri=0\tPasswd=\tCard=\tGrp=1\tTZ=0' % (pin, pin))
+        return '\n'.join(lines) + '\n'
+
+    def _poll_commands(self):
+        response = self._request(ROUTE_GETREQUEST, 'GET', '/iclock/getrequest', {'SN': self.serial_number})
+        if not response or response.strip() == 'OK':
+            return
+        acknowledgements = []
+        for line in response.splitlines():
+            parts = line.split(':', 2)
+            if len(parts) == 3 and parts[0] == 'C':
+                acknowledgements.append('ID=%s&Return=0&CMD=%s' % (parts[1], parts[2].split(' ', 1)[0]))
+        if acknowledgements:
+            self._request(ROUTE_DEVICECMD, 'POST', '/iclock/devicecmd', {'SN': self.serial_number},
+                          '\n'.join(acknowledgements) + '\n')
+            with self.stats.lock:
+                self.stats.commands += len(acknowledgements)
+
+    def run(self):
+        options = self.options
+        self._request(ROUTE_HANDSHAKE, 'GET', '/iclock/cdata',
+                      {'SN': self.serial_number, 'options': 'all', 'pushver': '2.4.1', 'language': '69'})
+        # spread the terminals over the first interval instead of firing together
+        attlog_interval = options.batch_size / float(options.punch_rate)
+        next_attlog = time.time() + self.random.uniform(0, attlog_interval)
+        next_operlog = time.time() + self.random.uniform(0, options.operlog_interval or 1)
+        next_poll = time.time() + self.random.uniform(0, options.poll_interval)
+        while time.time() < self.deadline:
+            now = time.time()
+            if now >= next_attlog:
+                stamp = int(now * 1000)
+                if self._request(ROUTE_ATTLOG, 'POST', '/iclock/cdata',
+                                 {'SN': self.serial_number, 'table': 'ATTLOG', 'Stamp': stamp},
+                                 self._attlog_body()) is not None:
+                    with self.stats.lock:
+                        self.stats.punches += options.batch_size
+                next_attlog += attlog_interval
+            if options.operlog_interval and now >= next_operlog:
+                self._request(ROUTE_OPERLOG, 'POST', '/iclock/cdata',
+                              {'SN': self.serial_number, 'table': 'OPERLOG', 'OpStamp': self.op_stamp},
+                              self._operlog_body())
+                next_operlog += options.operlog_interval
+            if now >= next_poll:
+                self._poll_commands()
+                next_poll += options.poll_interval
+            next_event = min(next_attlog, next_poll, next_operlog if options.operlog_interval else next_poll)
+            time.sleep(max(next_event - time.time(), 0.001))
+
+
+def create_devices(options, serial_numbers):
+    """ register the virtual terminals as ADMS devices through XML-RPC """
+    common = xmlrpc.client.ServerProxy('%s/xmlrpc/2/common' % options.url)
+    uid = common.authenticate(options.db, options.login, options.password, {})
+    if not uid:
+        sys.exit("XML-RPC authentication failed for %s on %s" % (options.login, options.db))
+    models = xmlrpc.client.ServerProxy('%s/xmlrpc/2/object' % options.url)
+    existing = models.execute_kw(options.db, uid, options.password, 'zkteco.device.setting', 'search_read',
+                                 [[('serial_number', 'in', serial_numbers)]], {'fields': ['serial_number']})
+    known = {device['serial_number'] for device in existing}
+    missing = [serial for serial in serial_numbers if serial not in known]
+    if missing:
+        models.execute_kw(options.db, uid, options.password, 'zkteco.device.setting', 'create', [[
+            {'name': 'Load test %s' % serial, 'serial_number': serial, 'is_adms': True, 'time_zone': 'UTC'}
+            for serial in missing
+        ]])
+    print("%s virtual terminals registered, %s already present" % (len(missing), len(known)))
+
+
+def read_query_counts(log_path, offset):
+    """ average the query counts Odoo logged for each route since offset """
+    counts = defaultdict(list)
+    with open(log_path, encoding='utf-8', errors='replace') as log_file:
+        log_file.seek(offset)
+        for line in log_file:
+            match = ODOO_REQUEST_LOG.search(line)
+            if not match or '/iclock/' not in match.group('path'):
+                continue
+            path = match.group('path')
+            route = '%s %s' % (match.group('method'), path.split('?', 1)[0])
+            if route == 'POST /iclock/cdata':
+                route = ROUTE_OPERLOG if 'table=OPERLOG' in path else ROUTE_ATTLOG
+            counts[route].append(int(match.group('queries')))
+    return {route: sum(values) / float(len(values)) for route, values in counts.items()}
+
+
+def build_report(options, stats, elapsed, query_counts):
+    routes = {}
+    for route, latencies in sorted(stats.latencies.items()):
+        routes[route] = {
+            'requests': len(latencies),
+            'errors': stats.errors[route],
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': round(query_counts[route], 2) if route in query_counts else None,
+        }
+    return {
+        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'config': {
+            'terminals': options.terminals, 'duration': options.duration, 'punch_rate': options.punch_rate,
+            'batch_size': options.batch_size, 'operlog_interval': options.operlog_interval,
+            'poll_interval': options.poll_interval, 'users': options.users,
+        },
+        'elapsed': round(elapsed, 2),
+        'punches': stats.punches,
+        'punches_per_second': round(stats.punches / elapsed, 2) if elapsed else 0.0,
+        'commands_acknowledged': stats.commands,
+        'routes': routes,
+    }
+
+
+def print_report(report):
+    print("\n%s punches in %.1fs: %.1f punches/s, %s commands acknowledged" % (
+        report['punches'], report['elapsed'], report['punches_per_second'], report['commands_acknowledged']))
+    print("%-28s %9s %7s %9s %9s %9s %9s" % ('route', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for route, values in report['routes'].items():
+        queries = values['queries_per_request']
+        print("%-28s %9s %7s %9.1f %9.1f %9.1f %9s" % (
+            route, values['requests'], values['errors'], values['p50_ms'], values['p95_ms'], values['p99_ms'],
+            '-' if queries is None else '%.1f' % queries))
+
+
+def compare_report(report, baseline, tolerance):
+    """ print the regressions against the baseline, return their number """
+    regressions = []
+    if report['punches_per_second'] < baseline['punches_per_second'] * (1 - tolerance):
+        regressions.append("throughput %.1f punches/s, baseline %.1f" % (
+            report['punches_per_second'], baseline['punches_per_second']))
+    for route, values in report['routes'].items():
+        reference = baseline['routes'].get(route)
+        if not reference:
+            continue
+        if values['p95_ms'] > reference['p95_ms'] * (1 + tolerance):
+            regressions.append("%s p95 %.1f ms, baseline %.1f ms" % (route, values['p95_ms'], reference['p95_ms']))
+        if values['queries_per_request'] is not None and reference['queries_per_request'] is not None \
+                and values['queries_per_request'] > reference['queries_per_request'] * (1 + tolerance):
+            regressions.append("%s %.1f queries/request, baseline %.1f" % (
+                route, values['queries_per_request'], reference['queries_per_request']))
+    for regression in regressions:
+        print("REGRESSION: %s" % regression)
+    if not regressions:
+        print("No regression against the baseline (tolerance %d%%)" % (tolerance * 100))
+    return len(regressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ADMS endpoints with virtual terminals.")
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--terminals', type=int, default=10)
+    parser.add_argument('--serial-prefix', default='LOADTEST')
+    parser.add_argument('--duration', type=float, default=60, help='seconds')
+    parser.add_argument('--punch-rate', type=float, default=1.0, help='punches per second per terminal')
+    parser.add_argument('--batch-size', type=int, default=10, help='lines per ATTLOG/OPERLOG push')
+    parser.add_argument('--operlog-interval', type=float, default=30, help='seconds, 0 disables OPERLOG pushes')
+    parser.add_argument('--poll-interval', type=float, default=5, help='seconds between command polls')
+    parser.add_argument('--users', type=int, default=200, help='distinct PINs per terminal')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--create-devices', action='store_true')
+    parser.add_argument('--db')
+    parser.add_argument('--login', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--odoo-log', help='Odoo server log file, to report queries per request')
+    parser.add_argument('--save-baseline', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare the report with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    options = parser.parse_args()
+
+    serial_numbers = ['%s%04d' % (options.serial_prefix, index) for index in range(1, options.terminals + 1)]
+    if options.create_devices:
+        if not options.db:
+            parser.error("--create-devices requires --db")
+        create_devices(options, serial_numbers)
+
+    log_offset = os.path.getsize(options.odoo_log) if options.odoo_log else 0
+    stats = Stats()
+    start = time.time()
+    deadline = start + options.duration
+    terminals = [
+        VirtualTerminal(options, serial, stats, deadline, options.seed + index)
+        for index, serial in enumerate(serial_numbers)
+    ]
+    for terminal in terminals:
+        terminal.start()
+    for terminal in terminals:
+        terminal.join()
+    elapsed = time.time() - start
+
+    query_counts = {}
+    if options.odoo_log:
+        time.sleep(1)  # let the server flush its log
+        query_counts = read_query_counts(options.odoo_log, log_offset)
+    report = build_report(options, stats, elapsed, query_counts)
+    print_report(report)
+
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print("Baseline saved to %s" % options.save_baseline)
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare_report(report, baseline, options.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
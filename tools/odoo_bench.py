@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+"""
+Helpers shared by the benchmark tools that run inside an Odoo environment:
+opening a registry cursor outside odoo-bin, running a scenario in a
+savepoint that is rolled back, and measuring its wall time, SQL query count
+and peak RSS.
+"""
+
+import contextlib
+import re
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+@contextlib.contextmanager
+def odoo_environment(database, config_file=None, commit=False):
+    """ yield a superuser environment on database, rolled back unless commit """
+    import odoo
+    from odoo import api, SUPERUSER_ID
+    from odoo.modules.registry import Registry
+    from odoo.tools import config
+
+    args = ['-d', database]
+    if config_file:
+        args = ['-c', config_file] + args
+    config.parse_config(args)
+    registry = Registry(database)
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {'tz': 'UTC'})
+        try:
+            yield env
+            env.flush_all()
+        finally:
+            if not commit:
+                cr.rollback()
+
+
+@contextlib.contextmanager
+def rolled_back(env):
+    """ run the block in a savepoint and undo its changes, flushed or not """
+    env.flush_all()
+    env.cr.execute("SAVEPOINT bench_scenario")
+    try:
+        yield
+        env.flush_all()
+    finally:
+        env.cr.execute("ROLLBACK TO SAVEPOINT bench_scenario")
+        env.invalidate_all(flush=False)
+        env.cr.execute("RELEASE SAVEPOINT bench_scenario")
+
+
+class RssSampler(threading.Thread):
+    """ sample the process RSS every interval and keep the peak """
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.process = psutil.Process() if psutil else None
+        self.peak = self._rss()
+        self.stopped = threading.Event()
+
+    def _rss(self):
+        return self.process.memory_info().rss if self.process else 0
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, self._rss())
+        return self.peak
+
+
+class QueryLog(object):
+    """ count the queries executed on a cursor, optionally keeping their text """
+
+    def __init__(self, cr, keep=False):
+        self.cr = cr
+        self.keep = keep
+        self.queries = []
+        self.count = 0
+        self._execute = None
+
+    def __enter__(self):
+        self._execute = execute = self.cr.execute
+
+        def counted_execute(query, params=None, log_exceptions=True):
+            self.count += 1
+            if self.keep:
+                self.queries.append(str(getattr(query, 'code', query)))
+            return execute(query, params, log_exceptions)
+
+        self.cr.execute = counted_execute
+        return self
+
+    def __exit__(self, *exc_info):
+        del self.cr.execute
+
+    def patterns(self, limit=10):
+        """ the most frequent query shapes, literals and numbers removed """
+        shapes = {}
+        for query in self.queries:
+            shape = re.sub(r"'[^']*'|\b\d+\b", '?', ' '.join(query.split()))
+            shapes[shape] = shapes.get(shape, 0) + 1
+        return sorted(shapes.items(), key=lambda item: -item[1])[:limit]
+
+
+def measure(env, function, *args, **kwargs):
+    """ run function, return (result, {'wall': s, 'queries': n, 'peak_rss_mb': mb}) """
+    sampler = RssSampler()
+    sampler.start()
+    with QueryLog(env.cr) as query_log:
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+            env.flush_all()
+        finally:
+            wall = time.perf_counter() - start
+            peak = sampler.stop()
+    return result, {
+        'wall': round(wall, 3),
+        'queries': query_log.count,
+        'peak_rss_mb': round(peak / 1048576.0, 1),
+    }
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+"""
+Synthetic workforce generator and benchmark suite for attendance calculation,
+reports and the dashboard.
+
+Seeds a database with a fleet of devices, employees on a day, night or
+Ramadan calendar, leave lines and months of punch logs with realistic noise
+(double punches, missing check-outs, absences, late arrivals), then times:
+    - zkteco.calculation.wizard.calculate_attendance, single and multiple shift,
+    - employee.attendance.report, from attendance and from logs,
+    - employee.attendance.reports, every report type,
+    - the dashboard.dashboard computes, for every filter period.
+
+Every scenario runs in a savepoint rolled back afterwards, so they all start
+from the same seeded data, and reports its wall time, SQL query count and
+peak RSS. The seeded data is rolled back at the end unless --commit is given.
+
+Run it with the Python environment of the Odoo server, on a database where
+the module is installed:
+
+    python tools/workforce_benchmark.py -c /etc/odoo/odoo.conf -d bench \\
+        --devices 5 --employees 300 --months 3 --output bench.json
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+from odoo_bench import measure, odoo_environment, rolled_back
+
+MULTIPLE_SHIFT_PARAM = 'dps_zkteco_biometric_integration.multiple_shift'
+DASHBOARD_COMPUTED_FIELDS = [
+    'total_attedance_logs', 'total_attedance_state', 'total_device', 'total_employee', 'total_absent',
+    'total_present', 'total_late', 'total_early_leave', 'present_employee_data', 'absent_employee_data',
+    'late_employee_data', 'early_leave_employee_data',
+]
+
+
+class WorkforceGenerator(object):
+    """ create the synthetic fleet, workforce and punch history """
+
+    def __init__(self, env, options):
+        self.env = env
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.end_date = date.today() - timedelta(days=1)
+        self.start_date = self.end_date - timedelta(days=30 * options.months)
+
+    def _calendar(self, name, periods, weekdays=range(5)):
+        return self.env['resource.calendar'].create({
+            'name': name,
+            'tz': 'UTC',
+            'attendance_ids': [
+                (0, 0, {
+                    'name': '%s %s' % (name, weekday),
+                    'dayofweek': str(weekday),
+                    'hour_from': hour_from,
+                    'hour_to': hour_to,
+                    'day_period': 'morning' if hour_from < 12 else 'afternoon',
+                })
+                for weekday in weekdays for hour_from, hour_to in periods
+            ],
+        })
+
+    def seed(self):
+        options = self.options
+        calendars = {
+            'day': self._calendar('Bench day shift', [(8, 12), (13, 17)]),
+            'night': self._calendar('Bench night shift', [(0, 6), (22, 24)]),
+        }
+        ramadan_calendar = self._calendar('Bench Ramadan hours', [(9, 15)])
+
+        devices = self.env['zkteco.device.setting'].create([
+            {
+                'name': 'Bench device %s' % index,
+                'zkteco_device_ip_address': '10.99.0.%s' % index,
+                'port': 4370,
+                'serial_number': 'BENCH%04d' % index,
+                'time_zone': 'UTC',
+            }
+            for index in range(1, options.devices + 1)
+        ])
+
+        employees = self.env['hr.employee'].create([
+            {
+                'name': 'Bench employee %05d' % index,
+                'resource_calendar_id': calendars[
+                    'night' if self.random.random() < options.night_ratio else 'day'].id,
+                'ramadan_resource_calendar_id': ramadan_calendar.id,
+            }
+            for index in range(1, options.employees + 1)
+        ])
+
+        # every employee is enrolled on one device, PINs numbered per device
+        device_users = self.env['zkteco.attendance.machine'].create([
+            {
+                'employee_id': employee.id,
+                'device_id': devices[index % len(devices)].id,
+                'zkteco_device_attend_id': str(index // len(devices) + 1),
+                'zkteco_device_username': employee.name,
+            }
+            for index, employee in enumerate(employees)
+        ])
+
+        leave_values, log_values = [], []
+        for employee, device_user in zip(employees, device_users):
+            night = employee.resource_calendar_id == calendars['night']
+            day = self.start_date
+            while day <= self.end_date:
+                if day.weekday() < 5:
+                    if self.random.random() < options.leave_ratio:
+                        leave_values.append({
+                            'employee_id': employee.id,
+                            'date': day,
+                            'leave_type': self.random.choice(('holiday', 'medical', 'vacation')),
+                        })
+                    elif self.random.random() >= options.absence_ratio:
+                        log_values += self._punches(device_user, day, night)
+                day += timedelta(days=1)
+
+        self.env['employee.leave.line'].create(leave_values)
+        Logs = self.env['zkteco.device.logs']
+        for index in range(0, len(log_values), 1000):
+            Logs.create(log_values[index:index + 1000])
+        self.env.flush_all()
+        print("Seeded %s devices, %s employees, %s leave lines and %s punches over %s to %s" % (
+            len(devices), len(employees), len(leave_values), len(log_values), self.start_date, self.end_date))
+        return employees
+
+    def _punches(self, device_user, day, night):
+        """ the punch log values of one working day, with the usual noise """
+        options = self.options
+        start = datetime.combine(day, time(22, 0) if night else time(8, 0))
+        check_in = start + timedelta(minutes=self.random.gauss(0, 8))
+        if self.random.random() < options.late_ratio:
+            check_in += timedelta(minutes=self.random.randint(20, 90))
+        check_out = start + timedelta(hours=8, minutes=self.random.gauss(10, 15))
+        punches = [(check_in, '0')]
+        if self.random.random() < options.double_punch_ratio:
+            punches.append((check_in + timedelta(seconds=self.random.randint(20, 180)), '0'))
+        if self.random.random() >= options.missing_checkout_ratio:
+            punches.append((check_out, '1'))
+        return [
+            {
+                'zketco_duser_id': device_user.id,
+                'user_punch_time': punch_time.replace(microsecond=0),
+                'status_number': status_number,
+                'number': '1',
+                'device': device_user.device_id.name,
+                'timestamp': int(punch_time.timestamp()),
+            }
+            for punch_time, status_number in punches
+        ]
+
+
+def run_scenarios(env, employees, start_date, end_date):
+    """ yield (scenario name, measures) for every benchmarked path """
+    parameters = env['ir.config_parameter'].sudo()
+
+    for multiple_shift in ('False', 'True'):
+        with rolled_back(env):
+            parameters.set_param(MULTIPLE_SHIFT_PARAM, multiple_shift)
+            wizard = env['zkteco.calculation.wizard'].create({})
+            _result, measures = measure(env, wizard.calculate_attendance)
+        yield 'calculate_attendance multiple_shift=%s' % multiple_shift, measures
+
+    report_start = datetime.combine(start_date, time.min)
+    report_end = datetime.combine(end_date, time.max).replace(microsecond=0)
+    for report_format in ('attend', 'log'):
+        with rolled_back(env):
+            wizard = env['employee.attendance.report'].create({
+                'attendance_report_format': report_format,
+                'report_date_start_from': report_start,
+                'report_date_end_to': report_end,
+                'employee_ids': [(6, 0, employees.ids)],
+            })
+            _result, measures = measure(env, wizard.print_employee_attendance_in_excel)
+        yield 'employee.attendance.report %s' % report_format, measures
+
+    report_types = [value for value, _label in env['employee.attendance.reports']._fields['report_type'].selection]
+    for report_type in report_types:
+        with rolled_back(env):
+            wizard = env['employee.attendance.reports'].create({
+                'report_type': report_type,
+                'start_date': start_date,
+                'end_date': end_date,
+                'employee_ids': [(6, 0, employees.ids)],
+            })
+            _result, measures = measure(env, wizard.generate_report)
+        yield 'employee.attendance.reports %s' % report_type, measures
+
+    periods = [value for value, _label in env['dashboard.dashboard']._fields['dashboard_data_filter'].selection]
+    for period in periods:
+        with rolled_back(env):
+            dashboard = env['dashboard.dashboard'].create({'dashboard_data_filter': period})
+            _result, measures = measure(env, dashboard.read, DASHBOARD_COMPUTED_FIELDS)
+        yield 'dashboard %s' % period, measures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic workforce and benchmark calculation and reports.")
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('-c', '--config', help='Odoo configuration file')
+    parser.add_argument('--devices', type=int, default=3)
+    parser.add_argument('--employees', type=int, default=100)
+    parser.add_argument('--months', type=int, default=1)
+    parser.add_argument('--night-ratio', type=float, default=0.15, help='share of employees on night shift')
+    parser.add_argument('--leave-ratio', type=float, default=0.03)
+    parser.add_argument('--absence-ratio', type=float, default=0.02)
+    parser.add_argument('--late-ratio', type=float, default=0.08)
+    parser.add_argument('--double-punch-ratio', type=float, default=0.05)
+    parser.add_argument('--missing-checkout-ratio', type=float, default=0.04)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skip-seed', action='store_true', help='benchmark the data already in the database')
+    parser.add_argument('--commit', action='store_true', help='keep the seeded data')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    options = parser.parse_args()
+
+    results = []
+    with odoo_environment(options.database, options.config, commit=options.commit) as env:
+        generator = WorkforceGenerator(env, options)
+        if options.skip_seed:
+            employees = env['hr.employee'].search([('biometric_device_ids', '!=', False)])
+        else:
+            employees, seed_measures = measure(env, generator.seed)
+            results.append(dict(scenario='seed', **seed_measures))
+        print("%-55s %10s %10s %12s" % ('scenario', 'wall s', 'queries', 'peak RSS MB'))
+        for name, measures in run_scenarios(env, employees, generator.start_date, generator.end_date):
+            results.append(dict(scenario=name, **measures))
+            print("%-55s %10.2f %10s %12.1f" % (name, measures['wall'], measures['queries'], measures['peak_rss_mb']))
+            sys.stdout.flush()
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump({
+                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'config': {key: value for key, value in vars(options).items() if key not in ('config', 'output')},
+                'results': results,
+            }, output_file, indent=2)
+        print("Results saved to %s" % options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+"""
+Benchmarks of the binary protocol client (zk/), without Odoo nor a device.
+
+    checksum: packet checksum throughput of ZK.__create_checksum against the
+              original word-by-word implementation, for the payload sizes
+              sent by the client (commands, 1 KB upload chunks, 64 KB).
+
+    pipeline: attendance download from a ZKSimulator terminal with the given
+              round-trip latency, in lock-step and with read_with_buffer
+              keeping 2, 4 and 8 chunk requests in flight.
+
+    python tools/zk_benchmark.py checksum --seconds 1
+    python tools/zk_benchmark.py pipeline --records 100000 --latency 0.07 --depth 1 --depth 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zk.base import ZK  # noqa: E402
+from zk.simulator import ZKSimulator  # noqa: E402
+from zk.tests.test_checksum import reference_checksum  # noqa: E402
+
+CHECKSUM_SIZES = (16, 1024, 16384, 65536)
+PIPELINE_DEPTHS = (1, 2, 4, 8)
+
+
+def throughput(function, payload, seconds):
+    """ MB/s of function over payload, repeated for about seconds """
+    calls, start = 0, time.perf_counter()
+    while True:
+        function(payload)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls * len(payload) / elapsed / 1048576.0
+
+
+def bench_checksum(options):
+    zk = ZK('127.0.0.1')
+    checksum = zk._ZK__create_checksum
+    print("%8s %14s %14s %9s" % ('bytes', 'linear MB/s', 'original MB/s', 'speed-up'))
+    for size in CHECKSUM_SIZES:
+        payload = os.urandom(size)
+        assert checksum(payload) == reference_checksum(payload)
+        linear = throughput(checksum, payload, options.seconds)
+        original = throughput(reference_checksum, payload, options.seconds)
+        print("%8s %14.1f %14.1f %8.0fx" % (size, linear, original, linear / original))
+
+
+def bench_pipeline(options):
+    simulator = ZKSimulator(users=options.users, records=options.records, record_size=options.record_size,
+                            latency=options.latency, bandwidth=options.bandwidth)
+    print("%d records of %d bytes, %.0f ms round trip" % (
+        options.records, options.record_size, options.latency * 1000))
+    print("%6s %9s %9s %8s" % ('depth', 'seconds', 'chunks', 'MB/s'))
+    lock_step = None
+    with simulator:
+        for depth in options.depth or PIPELINE_DEPTHS:
+            zk = ZK('127.0.0.1', simulator.port, pipeline_depth=depth)
+            zk.connect()
+            try:
+                chunk_reads = simulator.chunk_reads
+                start = time.perf_counter()
+                attendances = zk.get_attendance()
+                elapsed = time.perf_counter() - start
+            finally:
+                zk.disconnect()
+            assert len(attendances) == options.records
+            lock_step = lock_step or elapsed
+            print("%6d %9.2f %9d %8.2f  %.1fx" % (
+                depth, elapsed, simulator.chunk_reads - chunk_reads,
+                options.records * options.record_size / elapsed / 1048576.0, lock_step / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ZKTeco protocol client.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    checksum = subparsers.add_parser('checksum', help='packet checksum throughput')
+    checksum.add_argument('--seconds', type=float, default=1.0, help='duration of each measure')
+    checksum.set_defaults(function=bench_checksum)
+    pipeline = subparsers.add_parser('pipeline', help='buffered download over a high-latency link')
+    pipeline.add_argument('--records', type=int, default=100000)
+    pipeline.add_argument('--record-size', type=int, choices=(8, 16, 40), default=40)
+    pipeline.add_argument('--users', type=int, default=500)
+    pipeline.add_argument('--latency', type=float, default=0.07, help='round trip in seconds')
+    pipeline.add_argument('--bandwidth', type=int, default=None, help='link bandwidth in bytes/s')
+    pipeline.add_argument('--depth', type=int, action='append', help='pipeline depths, default 1 2 4 8')
+    pipeline.set_defaults(function=bench_pipeline)
+    options = parser.parse_args()
+    options.function(options)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,4 +10,5 @@ from . import zkteco_attendance_device
 from . import zkteco_device_attendance_report
 from . import employee_leave_wizard
 from . import attendance_reports
+from . import zkteco_fingerprint_replication
 
@@ -15,6 +15,7 @@ import xlsxwriter
 
 from collections import defaultdict
 from odoo.exceptions import UserError, ValidationError
+from ..models.zkteco_perf_sample import perf_stage
 
 
 class EmployeeAttendanceReports(models.TransientModel):
@@ -39,6 +40,7 @@ class EmployeeAttendanceReports(models.TransientModel):
         h, m = divmod(total_minutes, 60)
         return f"{h:02d}:{m:02d}"
 
+    @perf_stage(lambda wizard: 'report.%s' % (wizard[:1].report_type or 'daily'))
     def generate_report(self):
         for rec in self:
             employee_ids = rec.employee_ids or self.env['hr.employee'].search([])
@@ -176,6 +178,16 @@ class EmployeeAttendanceReports(models.TransientModel):
                 # Employees
                 employee_ids = rec.employee_ids or self.env['hr.employee'].search([])
 
+                # (employee id, date) of every attendance of the period, in one query
+                attended_days = {
+                    (attendance.employee_id.id, attendance.check_in.date())
+                    for attendance in self.env['hr.attendance'].search_fetch([
+                        ('employee_id', 'in', employee_ids.ids),
+                        ('check_in', '>=', datetime.combine(start_date, datetime.min.time())),
+                        ('check_in', '<=', datetime.combine(end_date, datetime.max.time())),
+                    ], ['employee_id', 'check_in'])
+                }
+
                 for emp in employee_ids:
                     # Create a new worksheet for each employee
                     sheet_name = emp.name[:31] if emp.name else 'Employee'
@@ -191,15 +203,8 @@ class EmployeeAttendanceReports(models.TransientModel):
                     total_absent = 0
 
                     for date in date_range:
-                        # Check if attendance exists for that date
-                        attendance = self.env['hr.attendance'].search([
-                            ('employee_id', '=', emp.id),
-                            ('check_in', '>=', datetime.combine(date, datetime.min.time())),
-                            ('check_in', '<=', datetime.combine(date, datetime.max.time())),
-                        ], limit=1)
-
                         # If no attendance found => mark as absent
-                        if not attendance:
+                        if (emp.id, date) not in attended_days:
                             worksheet.write(row, 0, sr_no, cell_format)
                             worksheet.write(row, 1, emp.name or '', cell_format)
                             worksheet.write(row, 2, emp.barcode or '', cell_format)
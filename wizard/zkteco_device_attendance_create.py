@@ -8,6 +8,7 @@ from pytz import timezone, UTC
 # Customized by Tunn
 from odoo.fields import Domain
 from odoo.tools.intervals import Intervals
+from ..models.zkteco_perf_sample import perf_stage
 
 # # Domain
 # try:
@@ -104,6 +105,7 @@ class ZktecoCalculationWizard(models.TransientModel):
 
         return check_in, check_out
 
+    @perf_stage('calculation.attendance')
     def calculate_attendance(self):
         """
         Calculate and adjust attendance records based on attendance logs and company settings.
@@ -16,6 +16,7 @@ import xlsxwriter
 
 from collections import defaultdict
 from odoo.exceptions import UserError, ValidationError
+from ..models.zkteco_perf_sample import perf_stage
 
 
 class EmployeeAttendanceReport(models.TransientModel):
@@ -117,6 +118,7 @@ class EmployeeAttendanceReport(models.TransientModel):
                 _("An error occurred while updating the attendance report date range. Please try again or contact support. Details: %s") % str(
                     e))
 
+    @perf_stage(lambda wizard: 'report.excel_%s' % (wizard[:1].attendance_report_format or 'attend'))
     def print_employee_attendance_in_excel(self, fl=None):
         """
         Export Attendance Data to XLSX File.
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import base64
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from ..models.zkteco_device_settings import DEVICE_SYNC_MAX_WORKERS
+from ..zk import ZK
+
+_logger = logging.getLogger(__name__)
+
+
+class ZktecoFingerprintReplicationWizard(models.TransientModel):
+    """
+    Copy the fingerprint templates enrolled on one terminal to other
+    terminals, so employees do not have to enroll again on every device.
+
+    Templates are read from the Odoo template store (optionally refreshed
+    from the source terminal first) and pushed in bulk: one buffered upload
+    per binary-protocol terminal, run in parallel, and one batch of
+    'DATA UPDATE FINGERTMP' commands per ADMS device.
+    """
+    _name = 'zkteco.fingerprint.replication.wizard'
+    _description = 'ZKTeco Fingerprint Replication Wizard'
+
+    source_device_id = fields.Many2one(
+        'zkteco.device.setting',
+        string='Source Device',
+        required=True,
+        help='Device the fingerprints were enrolled on.'
+    )
+    template_source = fields.Selection(
+        [
+            ('store', 'Odoo Template Store'),
+            ('device', 'Source Terminal'),
+        ],
+        string='Read Templates From',
+        default='store',
+        required=True,
+        help='Read the templates already stored in Odoo, or download them from the source terminal first.'
+    )
+    target_device_ids = fields.Many2many(
+        'zkteco.device.setting',
+        string='Target Devices',
+        required=True,
+        help='Devices receiving a copy of the templates.'
+    )
+    employee_ids = fields.Many2many(
+        'hr.employee',
+        string='Employees',
+        help='Employees whose templates are replicated. Leave empty for every employee enrolled on the source.'
+    )
+    result_log = fields.Text(
+        string='Result',
+        readonly=True
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        values = super().default_get(fields_list)
+        if self.env.context.get('active_model') == 'hr.employee' and 'employee_ids' in fields_list:
+            values['employee_ids'] = [(6, 0, self.env.context.get('active_ids', []))]
+        return values
+
+    def action_replicate_fingerprints(self):
+
+        self.ensure_one()
+        target_devices = self.target_device_ids - self.source_device_id
+        if not target_devices:
+            raise UserError(_("Select at least one target device other than the source device."))
+
+        if self.template_source == 'device':
+            self._download_source_templates()
+
+        fingers_by_employee = self._get_stored_templates()
+        if not fingers_by_employee:
+            raise UserError(_("No fingerprint template is stored for the selected employees on %s.",
+                              self.source_device_id.name))
+        employees = self.env['hr.employee'].browse(list(fingers_by_employee))
+
+        report = []
+        for device in target_devices.filtered('is_adms'):
+            command_count = self._queue_adms_templates(device, employees, fingers_by_employee)
+            report.append(_("%(device)s: %(count)s fingerprint commands queued.",
+                            device=device.name, count=command_count))
+
+        report += self._replicate_binary_devices(target_devices.filtered(lambda d: not d.is_adms),
+                                                 employees, fingers_by_employee)
+        self.result_log = '\n'.join(report)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _download_source_templates(self):
+        """Refresh the template store with the templates held by the source terminal."""
+        source = self.source_device_id
+        if source.is_adms:
+            raise UserError(_("Templates of an ADMS device are received through its uploads; "
+                              "read them from the Odoo template store instead."))
+        source._mark_device_busy()
+        zk_device = ZK(source.zkteco_device_ip_address, source.port, password=source.zkteco_device_pass,
+                       pipeline_depth=source.read_pipeline_depth or 1)
+        zk_device.connect()
+        try:
+            pins_by_uid = {user.uid: user.user_id for user in zk_device.get_users()}
+            templates = zk_device.get_templates()
+        finally:
+            zk_device.disconnect()
+        source._upsert_operlog_fingerprints([
+            (pins_by_uid[finger.uid], finger.fid, finger.template)
+            for finger in templates if finger.uid in pins_by_uid
+        ])
+
+    def _get_stored_templates(self):
+        """Return {employee id: [(finger id, raw template)]} for the source device."""
+        domain = [
+            ('device_id', '=', self.source_device_id.id),
+            ('employee_id', '!=', False),
+            ('template_id', '!=', False),
+        ]
+        if self.employee_ids:
+            domain.append(('employee_id', 'in', self.employee_ids.ids))
+        fingers_by_employee = defaultdict(list)
+        fingerprints = self.env['zkteco.device.fingerprints'].sudo().search(domain)
+        raw_templates = fingerprints.template_id._get_raw_templates()
+        for fingerprint in fingerprints:
+            fingers_by_employee[fingerprint.employee_id.id].append(
+                (fingerprint.finger_id, raw_templates[fingerprint.template_id.id])
+            )
+        return fingers_by_employee
+
+    def _queue_adms_templates(self, device, employees, fingers_by_employee):
+        """
+        Queue the templates for an ADMS device with a single create, after
+        queueing the user creation of employees not yet on the device.
+        """
+        Command = self.env['zkteco.dcmmand'].sudo()
+        pins = {
+            mapping.employee_id.id: mapping.zkteco_device_attend_id
+            for mapping in self.env['zkteco.attendance.machine'].sudo().search([
+                ('device_id', '=', device.id),
+                ('employee_id', 'in', employees.ids),
+            ])
+        }
+        missing_employees = employees.filtered(lambda e: e.id not in pins)
+        if missing_employees:
+            self.env['hr.employee'].create_export_commands(missing_employees, device)
+            for command in Command.search([
+                ('device_id', '=', device.id),
+                ('employee_id', 'in', missing_employees.ids),
+                ('name', '=', 'DATA'),
+                ('status', 'in', ('pending', 'executed')),
+            ]):
+                pins.setdefault(command.employee_id.id, command._get_device_user_pin())
+
+        vals_list = []
+        for employee in employees:
+            pin = pins.get(employee.id)
+            if not pin:
+                continue
+            for finger_id, raw_template in fingers_by_employee[employee.id]:
+                template = base64.b64encode(raw_template).decode()
+                vals_list.append({
+                    'name': 'FP',
+                    'device_id': device.id,
+                    'employee_id': employee.id,
+                    'status': 'pending',
+                    'pin': int(pin) if str(pin).isdigit() else 0,
+                    'device_user_pin': str(pin),
+                    'execution_log': (
+                        f"DATA UPDATE FINGERTMP PIN={pin}\tFID={finger_id}\tSize={len(template)}"
+                        f"\tValid=1\tTMP={template}\n"
+                    ),
+                })
+        commands = Command.create(vals_list)
+        commands._prefix_execution_log()
+        return len(commands)
+
+    def _replicate_binary_devices(self, devices, employees, fingers_by_employee):
+        """Upload the templates to binary-protocol terminals in parallel, one connection each."""
+        if not devices:
+            return []
+        DeviceSetting = self.env['zkteco.device.setting']
+        devices._mark_device_busy()
+        source_pins = {
+            mapping.employee_id.id: mapping.zkteco_device_attend_id
+            for mapping in self.source_device_id.zkteco_device_user_ids if mapping.employee_id
+        }
+        jobs = {}
+        for device in devices:
+            snapshot = device._get_device_sync_snapshot(employees)
+            snapshot['preferred_pins'] = source_pins
+            snapshot['archived'] = set()
+            jobs[device] = (device.zkteco_device_ip_address, device.port, device.zkteco_device_pass,
+                            snapshot, fingers_by_employee)
+
+        report = []
+        with ThreadPoolExecutor(max_workers=min(DEVICE_SYNC_MAX_WORKERS, len(jobs))) as executor:
+            futures = {
+                executor.submit(DeviceSetting._push_device_templates, *job): device
+                for device, job in jobs.items()
+            }
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                device = futures[future]
+                try:
+                    diff, finger_count = future.result()
+                except Exception as replication_exception:
+                    _logger.warning("Fingerprint replication to %s failed: %s", device.name, replication_exception)
+                    report.append(_("%(device)s: failed (%(error)s)", device=device.name, error=replication_exception))
+                    continue
+                device._apply_device_user_diff(diff)
+                _logger.info("Fingerprint replication %s/%s: %s fingers uploaded to %s",
+                             done_count, len(futures), finger_count, device.name)
+                report.append(_("%(device)s: %(count)s fingerprints uploaded.", device=device.name, count=finger_count))
+        return report
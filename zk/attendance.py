@@ -5,7 +5,16 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
+from array import array
+from datetime import datetime, timedelta
+
+# the terminals count time from 2000-01-01, batches store seconds since then
+EPOCH = datetime(2000, 1, 1)
+
+
 class Attendance(object):
+    __slots__ = ('uid', 'user_id', 'timestamp', 'status', 'punch')
+
     def __init__(self, user_id, timestamp, status, punch=0, uid=0):
         self.uid = uid  # not really used any more
         self.user_id = user_id
@@ -18,3 +27,60 @@ class Attendance(object):
 
     def __repr__(self):
         return '<Attendance>: {} : {} ({}, {})'.format(self.user_id, self.timestamp, self.status, self.punch)
+
+
+class AttendanceBatch(object):
+    """
+    Columnar list of attendance records, as returned by get_attendance.
+
+    Each field is kept in an array (or a list of shared strings for user_id)
+    instead of one object per record; indexing or iterating builds the
+    Attendance objects on demand, so a batch reads like the former list.
+    The rows of every user_id are indexed while the batch is filled.
+    """
+
+    def __init__(self):
+        self.uids = array('l')
+        self.user_ids = []
+        self.seconds = array('I')
+        self.statuses = array('B')
+        self.punches = array('B')
+        self.rows_by_user_id = {}
+
+    def append(self, user_id, timestamp, status, punch=0, uid=0):
+        rows = self.rows_by_user_id.get(user_id)
+        if rows is None:
+            rows = self.rows_by_user_id[user_id] = array('I')
+        else:
+            user_id = self.user_ids[rows[0]]  # share one string per user
+        rows.append(len(self.user_ids))
+        self.uids.append(int(uid))
+        self.user_ids.append(user_id)
+        self.seconds.append(int((timestamp - EPOCH).total_seconds()))
+        self.statuses.append(status)
+        self.punches.append(punch)
+
+    def timestamp(self, row):
+        return EPOCH + timedelta(seconds=self.seconds[row])
+
+    def for_user(self, user_id):
+        """ the records of user_id, in device order """
+        return [self[row] for row in self.rows_by_user_id.get(user_id, ())]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[index] for index in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        return Attendance(self.user_ids[row], self.timestamp(row), self.statuses[row], self.punches[row],
+                          self.uids[row])
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def __repr__(self):
+        return '<AttendanceBatch>: {} records of {} users'.format(len(self), len(self.rows_by_user_id))
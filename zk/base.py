@@ -6,17 +6,31 @@
 ########################################################
 
 import sys
+import time
+from array import array
+from collections import deque
 from datetime import datetime
 from socket import AF_INET, SOCK_DGRAM, SOCK_STREAM, socket, timeout
-from struct import pack, unpack
+from struct import pack, unpack, unpack_from
 import codecs
 
 from . import const
-from .attendance import Attendance
-from .exception import ZKErrorResponse, ZKNetworkError
-from .user import User
+from .attendance import Attendance, AttendanceBatch
+from .exception import ZKBufferChanged, ZKErrorResponse, ZKNetworkError
+from .user import User, UserTable
 from .finger import Finger
 
+# Pipelined buffered reads (TCP only): chunk size bounds for the adaptive sizing
+PIPELINE_INITIAL_CHUNK = 0x4000
+PIPELINE_MIN_CHUNK = 0x1000
+# Interrupted buffered reads: reconnect attempts per failed chunk, first backoff (seconds)
+RESUME_MAX_ATTEMPTS = 4
+RESUME_BACKOFF = 0.5
+# Connection: deadline (seconds) of the TCP connect and of the handshake reply
+CONNECT_TIMEOUT = 3
+# transport that last connected to each (ip, port), tried first next time
+_transports = {}
+
 
 def safe_cast(val, to_type, default=None):
     try:
@@ -97,9 +111,15 @@ class ZK_helper(object):
 class ZK(object):
     """ Clase ZK """
 
-    def __init__(self, ip, port=4370, timeout=60, password=0, force_udp=False, ommit_ping=False, verbose=False,
-                 encoding='UTF-8'):
-        """ initialize instance """
+    def __init__(self, ip, port=4370, timeout=60, password=0, force_udp=False, ommit_ping=True, verbose=False,
+                 encoding='UTF-8', pipeline_depth=1, connect_timeout=CONNECT_TIMEOUT):
+        """ initialize instance
+
+        pipeline_depth: number of buffered read requests kept in flight over
+        TCP by read_with_buffer, 1 keeps the lock-step behaviour
+        connect_timeout: deadline of each connection attempt; ommit_ping=False
+        adds an ICMP ping (a ping process) before it
+        """
         self.is_connect = False
         self.is_enabled = True  # let's asume
         self.helper = ZK_helper(ip, port)
@@ -110,6 +130,7 @@ class ZK(object):
         self.__password = password  # passint
         self.force_udp = force_udp
         self.ommit_ping = ommit_ping
+        self.connect_timeout = connect_timeout
         self.verbose = verbose
         self.encoding = encoding
         User.encoding = encoding
@@ -130,7 +151,9 @@ class ZK(object):
         self.next_uid = 1
         self.next_user_id = '1'
         self.user_packet_size = 28  # default zk6
+        self.__user_cache = None  # UserTable of the connection, see get_users
         self.end_live_capture = False
+        self.pipeline_depth = pipeline_depth
         self.__session_id = 0
         self.__reply_id = const.USHRT_MAX - 1
         self.__data_recv = None
@@ -144,8 +167,13 @@ class ZK(object):
         """ based on self.tcp"""
         if self.tcp:
             self.__sock = socket(AF_INET, SOCK_STREAM)
+            self.__sock.settimeout(self.connect_timeout)
+            try:
+                self.__sock.connect(self.__address)
+            except OSError as e:
+                self.__sock.close()
+                raise ZKNetworkError(str(e))
             self.__sock.settimeout(self.__timeout)
-            self.__sock.connect_ex(self.__address)
         else:
             self.__sock = socket(AF_INET, SOCK_DGRAM)
             self.__sock.settimeout(self.__timeout)
@@ -163,7 +191,6 @@ class ZK(object):
         MODIFIED now, without initial checksum
         '''
         buf = pack('<4H', command, 0, session_id, reply_id) + command_string
-        buf = unpack('8B' + '%sB' % len(command_string), buf)
         checksum = unpack('H', self.__create_checksum(buf))[0]
         reply_id += 1
         if reply_id >= const.USHRT_MAX:
@@ -176,23 +203,22 @@ class ZK(object):
         '''
         Calculates the checksum of the packet to be sent to the time clock
         Copied from zkemsdk.c
+
+        The 16-bit words are summed in one pass; folding the total modulo
+        USHRT_MAX gives the same value as the original subtract-on-overflow
+        loop, then its complement is taken the same way.
         '''
-        l = len(p)
-        checksum = 0
-        while l > 1:
-            checksum += unpack('H', pack('BB', p[0], p[1]))[0]
-            p = p[2:]
-            if checksum > const.USHRT_MAX:
-                checksum -= const.USHRT_MAX
-            l -= 2
-        if l:
-            checksum = checksum + p[-1]
-
-        while checksum > const.USHRT_MAX:
-            checksum -= const.USHRT_MAX
+        p = bytes(p)
+        odd = len(p) % 2
+        words = array('H')
+        words.frombytes(p[:len(p) - odd])
+        checksum = sum(words)
+        if odd:
+            checksum += p[-1]
+        if checksum:
+            checksum = (checksum - 1) % const.USHRT_MAX + 1
 
         checksum = ~checksum
-
         while checksum < 0:
             checksum += const.USHRT_MAX
 
@@ -322,22 +348,39 @@ class ZK(object):
     def connect(self):
         '''
         connect to the device
+
+        the transport that connected last time to this address is tried
+        first, the other one only if it fails
         '''
         self.end_live_capture = False  # jic
+        self.__user_cache = None
         if not self.ommit_ping and not self.helper.test_ping():
             raise ZKNetworkError("can't reach device (ping %s)" % self.__address[0])
-        if not self.force_udp and self.helper.test_tcp() == 0:  # ok
-            self.tcp = True
-            self.user_packet_size = 72  # default zk8
-        self.__create_socket()  # tcp based
-        self.__session_id = 0
-        self.__reply_id = const.USHRT_MAX - 1
-        cmd_response = self.__send_command(const.CMD_CONNECT)
-        self.__session_id = self.__header[2]
-        if cmd_response.get('code') == const.CMD_ACK_UNAUTH:
-            if self.verbose: print("try auth")
-            command_string = make_commkey(self.__password, self.__session_id)
-            cmd_response = self.__send_command(const.CMD_AUTH, command_string)
+        if self.force_udp:
+            transports = ('udp',)
+        elif _transports.get(self.__address) == 'udp':
+            transports = ('udp', 'tcp')
+        else:
+            transports = ('tcp', 'udp')
+        return self.__connect(transports)
+
+    def __connect(self, transports):
+        error = None
+        for transport in transports:
+            self.tcp = transport == 'tcp'
+            try:
+                cmd_response = self.__handshake()
+            except ZKNetworkError as e:
+                if self.verbose: print("connect over {} failed: {}".format(transport, e))
+                error = e
+                self.__sock.close()
+                continue
+            _transports[self.__address] = transport
+            if self.tcp:
+                self.user_packet_size = 72  # default zk8
+            break
+        else:
+            raise ZKNetworkError("can't reach device {}:{} ({})".format(self.__address[0], self.__address[1], error))
         if cmd_response.get('status'):
             self.is_connect = True
             return self
@@ -347,11 +390,29 @@ class ZK(object):
             if self.verbose: print("connect err response {} ".format(cmd_response["code"]))
             raise ZKErrorResponse("Invalid response: Can't connect")
 
+    def __handshake(self):
+        """ open the socket of self.tcp and send CMD_CONNECT (and CMD_AUTH), replies bounded by connect_timeout """
+        self.__create_socket()
+        self.__sock.settimeout(self.connect_timeout)
+        try:
+            self.__session_id = 0
+            self.__reply_id = const.USHRT_MAX - 1
+            cmd_response = self.__send_command(const.CMD_CONNECT)
+            self.__session_id = self.__header[2]
+            if cmd_response.get('code') == const.CMD_ACK_UNAUTH:
+                if self.verbose: print("try auth")
+                command_string = make_commkey(self.__password, self.__session_id)
+                cmd_response = self.__send_command(const.CMD_AUTH, command_string)
+        finally:
+            self.__sock.settimeout(self.__timeout)
+        return cmd_response
+
     def disconnect(self):
         '''
         diconnect from the connected device
         '''
         self.is_connect = False
+        self.__user_cache = None
         cmd_response = self.__send_command(const.CMD_EXIT)
         if cmd_response.get('status'):
             if self.__sock:
@@ -816,41 +877,49 @@ class ZK(object):
         if not cmd_response.get('status'):
             raise ZKErrorResponse("Can't set user")
         self.refresh_data()
+        self.__cache_users([User(uid, name, privilege, password, group_id, user_id, card)])
         if self.next_uid == uid:
             self.next_uid += 1  # better recalculate again
         if self.next_user_id == user_id:
-            self.next_user_id = str(self.next_uid)
+            self.__set_next_user_id(self.next_uid)
 
     def save_user_template(self, user, fingers=[]):
         """ save user and template """
         if not isinstance(user, User):
             users = self.get_users()
-            tusers = list(filter(lambda x: x.uid == user, users))
-            if len(tusers) == 1:
-                user = tusers[0]
+            tuser = users.by_uid(user) or users.by_user_id(str(user))
+            if tuser:
+                user = tuser
             else:
-                tusers = list(filter(lambda x: x.user_id == str(user), users))
-                if len(tusers) == 1:
-                    user = tusers[0]
-                else:
-                    raise ZKErrorResponse("Can't find user")
-        if isinstance(fingers, Finger):
-            fingers = [fingers]
-        fpack = b""
-        table = b""
+                raise ZKErrorResponse("Can't find user")
+        self.HR_save_usertemplates([(user, fingers)])
+
+    def HR_save_usertemplates(self, user_templates):
+        """
+        save many users with their templates in one buffered write
+        user_templates: list of (User, [Finger]) tuples
+        """
+        upacks = []
+        fpacks = []
+        table = []
         fnum = 0x10  # possibly flag
         tstart = 0
-        for finger in fingers:
-            tfp = finger.repack_only()
-            table += pack("<bHbI", 2, user.uid, fnum + finger.fid, tstart)
-            tstart += len(tfp)
-            fpack += tfp
-        if self.user_packet_size == 28:  # self.firmware == 6:
-            upack = user.repack29()
-        else:  # 72
-            upack = user.repack73()
-        head = pack("III", len(upack), len(table), len(fpack))
-        packet = head + upack + table + fpack
+        for user, fingers in user_templates:
+            if isinstance(fingers, Finger):
+                fingers = [fingers]
+            if self.user_packet_size == 28:  # self.firmware == 6:
+                upacks.append(user.repack29())
+            else:  # 72
+                upacks.append(user.repack73())
+            for finger in fingers:
+                tfp = finger.repack_only()
+                table.append(pack("<bHbI", 2, user.uid, fnum + finger.fid, tstart))
+                tstart += len(tfp)
+                fpacks.append(tfp)
+        upack = b''.join(upacks)
+        table = b''.join(table)
+        head = pack("III", len(upack), len(table), tstart)
+        packet = b''.join([head, upack, table] + fpacks)
         self._send_with_buffer(packet)
         command = 110  # Unknown
         command_string = pack('<IHH', 12, 0, 8)  # ??? write? WRQ user data?
@@ -858,6 +927,25 @@ class ZK(object):
         if not cmd_response.get('status'):
             raise ZKErrorResponse("Can't save utemp")
         self.refresh_data()
+        self.__cache_users(user for user, _fingers in user_templates)
+
+    def __cache_users(self, users):
+        """ write users just saved on the device into the user cache, as get_users would read them back """
+        if self.__user_cache is None:
+            return
+        zk6 = self.user_packet_size == 28
+        name_size, password_size = (8, 5) if zk6 else (24, 8)
+        for user in users:
+            group_id, user_id = user.group_id, str(user.user_id)
+            if zk6:  # numeric fields in the 28 bytes record
+                group_id, user_id = str(int(group_id) if group_id else 0), str(int(user_id))
+            name = self.__device_text(user.name, name_size).strip() or "NN-%s" % user_id
+            self.__user_cache.upsert(user.uid, name, user.privilege, self.__device_text(user.password, password_size),
+                                     group_id, user_id, user.card)
+
+    def __device_text(self, text, size):
+        return text.encode(self.encoding, errors='ignore')[:size].split(b'\x00')[0].decode(self.encoding,
+                                                                                           errors='ignore')
 
     def _send_with_buffer(self, buffer):
         MAX_CHUNK = 1024
@@ -899,11 +987,9 @@ class ZK(object):
             else:
                 return False  # probably empty!
         if not uid:
-            users = self.get_users()
-            users = list(filter(lambda x: x.user_id == str(user_id), users))
-            if not users:
+            uid = self.get_users().uid_of(str(user_id))
+            if uid is None:
                 return False
-            uid = users[0].uid
         command = const.CMD_DELETE_USERTEMP
         command_string = pack('hb', uid, temp_id)
         cmd_response = self.__send_command(command, command_string)
@@ -912,9 +998,10 @@ class ZK(object):
         else:
             return False  # probably empty!
 
-    def delete_user(self, uid=0, user_id=''):
+    def delete_user(self, uid=0, user_id='', refresh=True):
         '''
         delete specific user by uid
+        refresh=False lets bulk deletes send a single refresh_data() at the end
         '''
         """if self.tcp: should work but not tested
             if  not user_id:
@@ -927,17 +1014,18 @@ class ZK(object):
             command_string = pack('24s',str(user_id))
         else:"""
         if not uid:
-            users = self.get_users()
-            users = list(filter(lambda x: x.user_id == str(user_id), users))
-            if not users:
+            uid = self.get_users().uid_of(str(user_id))
+            if uid is None:
                 return False
-            uid = users[0].uid
         command = const.CMD_DELETE_USER
         command_string = pack('h', uid)
         cmd_response = self.__send_command(command, command_string)
         if not cmd_response.get('status'):
             raise ZKErrorResponse("Can't delete user")
-        self.refresh_data()
+        if refresh:
+            self.refresh_data()
+        if self.__user_cache is not None:
+            self.__user_cache.remove(uid)
         if uid == (self.next_uid - 1):
             self.next_uid = uid  # quick undo
 
@@ -948,11 +1036,9 @@ class ZK(object):
             command_string = pack('hb', uid, temp_id)
         """
         if not uid:
-            users = self.get_users()
-            users = list(filter(lambda x: x.user_id == str(user_id), users))
-            if not users:
+            uid = self.get_users().uid_of(str(user_id))
+            if uid is None:
                 return False
-            uid = users[0].uid
         for _retries in range(3):
             command = 88  # comando secreto!!! GET_USER_TEMPLATE
             command_string = pack('hb', uid, temp_id)
@@ -981,41 +1067,50 @@ class ZK(object):
             return []
         total_size = unpack('i', templatedata[0:4])[0]
         if self.verbose: print("get template total size {}, size {} len {}".format(total_size, size, len(templatedata)))
-        templatedata = templatedata[4:]  # total size not used
+        offset = 4  # total size not used
         while total_size:
-            size, uid, fid, valid = unpack('HHbb', templatedata[:6])
-            template = unpack("%is" % (size - 6), templatedata[6:size])[0]
+            size, uid, fid, valid = unpack_from('HHbb', templatedata, offset)
+            template = templatedata[offset + 6:offset + size]
             finger = Finger(uid, fid, valid, template)
             if self.verbose: print(finger)  # test
             templates.append(finger)
-            templatedata = templatedata[size:]
+            offset += size
             total_size -= size
         return templates
 
-    def get_users(self):  # ALWAYS CALL TO GET correct user_packet_size
-        """ return all user """
+    def get_users(self, refresh=False):  # ALWAYS CALL TO GET correct user_packet_size
+        """ return all user
+
+        The table is cached for the connection and kept up to date by
+        set_user, delete_user and the template savers; it is downloaded again
+        only when the user count of the device no longer matches, or with
+        refresh=True (e.g. after users were edited on the terminal itself).
+        """
         self.read_sizes()  # last update
+        if not refresh and self.__user_cache is not None and len(self.__user_cache) == self.users:
+            return self.__user_cache
+        self.__user_cache = None
         if self.users == 0:  # lazy
             self.next_uid = 1
             self.next_user_id = '1'
-            return []
-        users = []
+            self.__user_cache = UserTable()
+            return self.__user_cache
+        users = UserTable()
         max_uid = 0
         userdata, size = self.read_with_buffer(const.CMD_USERTEMP_RRQ, const.FCT_USER)
         if self.verbose: print("user size {} (= {})".format(size, len(userdata)))
         if size <= 4:
             print("WRN: missing user data")  # debug
-            return []
+            return UserTable()
         total_size = unpack("I", userdata[:4])[0]
         self.user_packet_size = total_size / self.users
         if not self.user_packet_size in [28, 72]:
             if self.verbose: print("WRN packet size would be  %i" % self.user_packet_size)
-        userdata = userdata[4:]
+        # records are unpacked in place, slicing the rest of the buffer per record is quadratic
         if self.user_packet_size == 28:
-            while len(userdata) >= 28:
-                uid, privilege, password, name, card, group_id, timezone, user_id = unpack('<HB5s8sIxBhI',
-                                                                                           userdata.ljust(28, b'\x00')[
-                                                                                           :28])
+            for offset in range(4, len(userdata) - 27, 28):
+                uid, privilege, password, name, card, group_id, timezone, user_id = unpack_from('<HB5s8sIxBhI',
+                                                                                                userdata, offset)
                 if uid > max_uid: max_uid = uid
                 password = (password.split(b'\x00')[0]).decode(self.encoding, errors='ignore')
                 name = (name.split(b'\x00')[0]).decode(self.encoding, errors='ignore').strip()
@@ -1023,14 +1118,12 @@ class ZK(object):
                 user_id = str(user_id)
                 if not name:
                     name = "NN-%s" % user_id
-                user = User(uid, name, privilege, password, group_id, user_id, card)
-                users.append(user)
+                users.append(uid, name, privilege, password, group_id, user_id, card)
                 if self.verbose: print("[6]user:", uid, privilege, password, name, card, group_id, timezone, user_id)
-                userdata = userdata[28:]
         else:
-            while len(userdata) >= 72:
-                uid, privilege, password, name, card, group_id, user_id = unpack('<HB8s24sIx7sx24s',
-                                                                                 userdata.ljust(72, b'\x00')[:72])
+            for offset in range(4, len(userdata) - 71, 72):
+                uid, privilege, password, name, card, group_id, user_id = unpack_from('<HB8s24sIx7sx24s',
+                                                                                      userdata, offset)
                 password = (password.split(b'\x00')[0]).decode(self.encoding, errors='ignore')
                 name = (name.split(b'\x00')[0]).decode(self.encoding, errors='ignore').strip()
                 group_id = (group_id.split(b'\x00')[0]).decode(self.encoding, errors='ignore').strip()
@@ -1038,20 +1131,20 @@ class ZK(object):
                 if uid > max_uid: max_uid = uid
                 if not name:
                     name = "NN-%s" % user_id
-                user = User(uid, name, privilege, password, group_id, user_id, card)
-                users.append(user)
-                userdata = userdata[72:]
+                users.append(uid, name, privilege, password, group_id, user_id, card)
         max_uid += 1
         self.next_uid = max_uid
-        self.next_user_id = str(max_uid)
-        while True:
-            if any(u for u in users if u.user_id == self.next_user_id):
-                max_uid += 1
-                self.next_user_id = str(max_uid)
-            else:
-                break
+        self.__user_cache = users
+        self.__set_next_user_id(max_uid)
         return users
 
+    def __set_next_user_id(self, start):
+        """ first numeric user_id from start not used on the device, one index lookup per step """
+        next_id = start
+        while self.__user_cache is not None and str(next_id) in self.__user_cache.rows_by_user_id:
+            next_id += 1
+        self.next_user_id = str(next_id)
+
     def cancel_capture(self):
         '''
         cancel capturing finger
@@ -1096,11 +1189,8 @@ class ZK(object):
         command = const.CMD_STARTENROLL
         done = False
         if not user_id:
-            users = self.get_users()
-            users = list(filter(lambda x: x.uid == uid, users))
-            if len(users) >= 1:
-                user_id = users[0].user_id
-            else:  # double? posibly empty
+            user_id = self.get_users().user_id_of(uid)
+            if user_id is None:  # double? posibly empty
                 return False  # can't enroll
         if self.tcp:
             command_string = pack('<24sbb', str(user_id).encode(), temp_id, 1)  # el 1 es misterio
@@ -1218,21 +1308,17 @@ class ZK(object):
                     user_id, status, punch, timehex = unpack('<IBB6s', data)
                     user_id = str(user_id)
                     timestamp = self.__decode_timehex(timehex)
-                    tuser = list(filter(lambda x: x.user_id == user_id, users))
-                    if not tuser:
+                    uid = users.uid_of(user_id)
+                    if uid is None:
                         uid = int(user_id)
-                    else:
-                        uid = tuser[0].uid
                     yield Attendance(user_id, timestamp, status, punch, uid)  # punch test?
                 elif len(data) == 36 or len(data) == 32:  # class 2 attendance
                     user_id, status, punch, timehex = unpack('<24sBB6s', data[:32])
                     user_id = (user_id.split(b'\x00')[0]).decode(errors='ignore')
                     timestamp = self.__decode_timehex(timehex)
-                    tuser = list(filter(lambda x: x.user_id == user_id, users))
-                    if not tuser:
+                    uid = users.uid_of(user_id)
+                    if uid is None:
                         uid = int(user_id)
-                    else:
-                        uid = tuser[0].uid
                     yield Attendance(user_id, timestamp, status, punch, uid)
                 else:
                     if self.verbose: print(codecs.encode(data, 'hex')), len(data)
@@ -1258,6 +1344,7 @@ class ZK(object):
         command_string = pack("B", clear_type)
         cmd_response = self.__send_command(command, command_string)
         if cmd_response.get('status'):
+            self.__user_cache = None
             return True
         else:
             raise ZKErrorResponse("can't clear data")
@@ -1403,13 +1490,153 @@ class ZK(object):
                 response_size = 1024 + 8
             cmd_response = self.__send_command(command, command_string, response_size)
             data = self.__recieve_chunk()
-            if data is not None:
+            if data is not None and len(data) == size:
                 return data
+            if self.verbose and data is not None: print("short chunk {}: {} of {} bytes".format(start, len(data), size))
         else:
             raise ZKErrorResponse("can't read chunk %i:[%i]" % (start, size))
 
-    def read_with_buffer(self, command, fct=0, ext=0):
-        """ Test read info with buffered command (ZK6: 1503) """
+    def __send_request(self, command, command_string=b''):
+        """ send a TCP command without waiting for its response, return its reply id """
+        buf = self.__create_header(command, command_string, self.__session_id, self.__reply_id)
+        reply_id = unpack('<4H', buf[:8])[3]
+        try:
+            self.__sock.sendall(self.__create_tcp_top(buf))
+        except Exception as e:
+            raise ZKNetworkError(str(e))
+        self.__reply_id = reply_id
+        return reply_id
+
+    def __recv_exact(self, size):
+        """ read exactly size bytes from the TCP socket """
+        data = bytearray()
+        while len(data) < size:
+            part = self.__sock.recv(size - len(data))
+            if not part:
+                raise ZKNetworkError("connection closed by the device")
+            data += part
+        return bytes(data)
+
+    def __recv_tcp_frame(self):
+        """ read one framed TCP packet, return (header, payload) """
+        magic1, magic2, length = unpack('<HHI', self.__recv_exact(8))
+        if magic1 != const.MACHINE_PREPARE_DATA_1 or magic2 != const.MACHINE_PREPARE_DATA_2 or length < 8:
+            return None, b''
+        packet = self.__recv_exact(length)
+        return unpack('<4H', packet[:8]), packet[8:]
+
+    def __recieve_pipelined_chunk(self, reply_id, size):
+        """ read the response to a pipelined CMD_READ_BUFFER request """
+        header, payload = self.__recv_tcp_frame()
+        if header is None or header[3] != reply_id:
+            if self.verbose: print("pipelined response out of order: {}".format(header))
+            return None
+        if header[0] == const.CMD_DATA:
+            return payload
+        if header[0] != const.CMD_PREPARE_DATA:
+            return None
+        data = bytearray()
+        while True:
+            header, payload = self.__recv_tcp_frame()
+            if header is None:
+                return None
+            if header[0] == const.CMD_DATA:
+                data += payload
+            elif header[0] == const.CMD_ACK_OK:
+                break
+            else:
+                return None
+        return bytes(data) if len(data) == size else None
+
+    def __drain_socket(self, wait=1):
+        """ discard whatever is left of pipelined responses """
+        self.__sock.settimeout(wait)
+        try:
+            while self.__sock.recv(0x10000):
+                pass
+        except (timeout, OSError):
+            pass
+        finally:
+            self.__sock.settimeout(self.__timeout)
+
+    def __read_chunks_pipelined(self, size, depth, max_chunk):
+        """
+        read the prepared buffer keeping up to depth CMD_READ_BUFFER requests
+        in flight; responses come back in request order and are matched by
+        reply id. The chunk size doubles while the measured throughput keeps
+        improving and halves when it collapses.
+
+        return the chunks read and the offset of the first missing byte; if
+        the firmware does not follow, pipelining is disabled for the session
+        and the caller goes on in lock-step from that offset.
+        """
+        chunks = []
+        pending = deque()
+        next_start = received = 0
+        chunk_size = min(PIPELINE_INITIAL_CHUNK, max_chunk)
+        best_throughput = window_bytes = window_chunks = 0
+        window_start = time.time()
+        try:
+            while received < size:
+                while next_start < size and len(pending) < depth:
+                    length = min(chunk_size, size - next_start)
+                    reply_id = self.__send_request(1504, pack('<ii', next_start, length))
+                    pending.append((reply_id, length))
+                    next_start += length
+                reply_id, length = pending.popleft()
+                chunk = self.__recieve_pipelined_chunk(reply_id, length)
+                if chunk is None:
+                    raise ZKErrorResponse("unexpected pipelined response")
+                chunks.append(chunk)
+                received += length
+
+                # throughput measured over windows of depth chunks
+                window_bytes += length
+                window_chunks += 1
+                if window_chunks >= depth:
+                    now = time.time()
+                    throughput = window_bytes / max(now - window_start, 1e-6)
+                    if throughput >= best_throughput:
+                        best_throughput = throughput
+                        chunk_size = min(chunk_size * 2, max_chunk)
+                    elif throughput < best_throughput / 2:
+                        chunk_size = max(chunk_size // 2, PIPELINE_MIN_CHUNK)
+                    window_start, window_bytes, window_chunks = now, 0, 0
+        except (ZKErrorResponse, ZKNetworkError, timeout) as e:
+            if self.verbose: print("pipelined read stopped at {}: {}, falling back to lock-step".format(received, e))
+            self.pipeline_depth = 1
+            self.__drain_socket()
+        return chunks, received
+
+    def __resume_buffer(self, command_string, size, attempt):
+        """ reconnect after a failed chunk read and prepare the same buffer
+        again, so the read continues from the last good offset """
+        delay = RESUME_BACKOFF * (2 ** attempt)
+        if self.verbose: print("rwb: resuming in {:.1f}s (attempt {})".format(delay, attempt + 1))
+        time.sleep(delay)
+        try:
+            self.__sock.close()
+        except OSError:
+            pass
+        was_enabled = self.is_enabled
+        self.is_connect = False
+        self.__connect(('tcp',) if self.tcp else ('udp',))  # chunk sizes depend on the transport
+        if not was_enabled:
+            self.disable_device()
+        cmd_response = self.__send_command(1503, command_string, 1024)
+        if not cmd_response.get('status'):
+            raise ZKErrorResponse("RWB Not supported")
+        if cmd_response['code'] == const.CMD_DATA or unpack('I', self.__data[1:5])[0] != size:
+            raise ZKBufferChanged("buffer changed on the device, can't resume the read")
+
+    def read_with_buffer(self, command, fct=0, ext=0, pipeline_depth=None):
+        """ Test read info with buffered command (ZK6: 1503)
+
+        pipeline_depth overrides self.pipeline_depth for this read. A chunk
+        that can't be read triggers a reconnection with exponential backoff
+        and the read continues from the last good offset, keeping the chunks
+        already received; a buffer changed meanwhile fails the read at once
+        """
         if self.tcp:
             MAX_CHUNK = 0xFFc0  # arbitrary, below 0x10008
         else:
@@ -1440,16 +1667,29 @@ class ZK(object):
                 return self.__data, size
         size = unpack('I', self.__data[1:5])[0]  # extra info???
         if self.verbose: print("size fill be %i" % size)
-        remain = size % MAX_CHUNK
-        packets = (size - remain) // MAX_CHUNK  # should be size /16k
-        if self.verbose: print(
-            "rwb: #{} packets of max {} bytes, and extra {} bytes remain".format(packets, MAX_CHUNK, remain))
-        for _wlk in range(packets):
-            data.append(self.__read_chunk(start, MAX_CHUNK))
-            start += MAX_CHUNK
-        if remain:
-            data.append(self.__read_chunk(start, remain))
-            start += remain  # Debug
+        depth = self.pipeline_depth if pipeline_depth is None else pipeline_depth
+        if self.tcp and depth > 1 and size > PIPELINE_INITIAL_CHUNK:
+            data, start = self.__read_chunks_pipelined(size, depth, MAX_CHUNK)
+        if self.verbose: print("rwb: {} bytes in chunks of max {} bytes from {}".format(size, MAX_CHUNK, start))
+        failures = 0
+        while start < size:
+            length = min(MAX_CHUNK, size - start)
+            try:
+                if failures:
+                    self.__resume_buffer(command_string, size, failures - 1)
+                chunk = self.__read_chunk(start, length)
+            except ZKBufferChanged:
+                raise
+            except (ZKErrorResponse, ZKNetworkError, OSError) as e:
+                failures += 1
+                if failures > RESUME_MAX_ATTEMPTS:
+                    raise ZKErrorResponse("can't read chunk %i:[%i] after %i reconnections: %s" % (
+                        start, length, RESUME_MAX_ATTEMPTS, e))
+                if self.verbose: print("rwb: chunk {} failed: {}".format(start, e))
+                continue
+            failures = 0
+            data.append(chunk)
+            start += length
         self.free_data()
         if self.verbose: print("_read w/chunk %i bytes" % start)
         return b''.join(data), start
@@ -1458,64 +1698,48 @@ class ZK(object):
         """ return attendance record """
         self.read_sizes()
         if self.records == 0:  # lazy
-            return []
+            return AttendanceBatch()
         users = self.get_users()
         if self.verbose: print(users)
-        attendances = []
+        attendances = AttendanceBatch()
         attendance_data, size = self.read_with_buffer(const.CMD_ATTLOG_RRQ)
         if size < 4:
             if self.verbose: print("WRN: no attendance data")  # debug
-            return []
+            return AttendanceBatch()
         total_size = unpack("I", attendance_data[:4])[0]
         record_size = total_size / self.records
         if self.verbose: print("record_size is ", record_size)
-        attendance_data = attendance_data[4:]  # total size not used
+        # records are unpacked in place, slicing the rest of the buffer per record is quadratic
         if record_size == 8:  # ultra old format
-            while len(attendance_data) >= 8:  # TODO RETEST ZK6!!!
-                uid, status, timestamp, punch = unpack('HB4sB', attendance_data.ljust(8, b'\x00')[:8])
-                if self.verbose: print(codecs.encode(attendance_data[:8], 'hex'))
-                attendance_data = attendance_data[8:]
-                tuser = list(filter(lambda x: x.uid == uid, users))
-                if not tuser:
+            for offset in range(4, len(attendance_data) - 7, 8):  # TODO RETEST ZK6!!!
+                uid, status, timestamp, punch = unpack_from('HB4sB', attendance_data, offset)
+                if self.verbose: print(codecs.encode(attendance_data[offset:offset + 8], 'hex'))
+                user_id = users.user_id_of(uid)
+                if user_id is None:
                     user_id = str(uid)  # TODO revisar pq
-                else:
-                    user_id = tuser[0].user_id
                 timestamp = self.__decode_time(timestamp)
-                attendance = Attendance(user_id, timestamp, status, punch, uid)  # punch?
-                attendances.append(attendance)
+                attendances.append(user_id, timestamp, status, punch, uid)  # punch?
         elif record_size == 16:  # extended
-            while len(attendance_data) >= 16:  # TODO RETEST ZK6
-                user_id, timestamp, status, punch, reserved, workcode = unpack('<I4sBB2sI',
-                                                                               attendance_data.ljust(16, b'\x00')[:16])
+            for offset in range(4, len(attendance_data) - 15, 16):  # TODO RETEST ZK6
+                user_id, timestamp, status, punch, reserved, workcode = unpack_from('<I4sBB2sI',
+                                                                                    attendance_data, offset)
                 user_id = str(user_id)
-                if self.verbose: print(codecs.encode(attendance_data[:16], 'hex'))
-                attendance_data = attendance_data[16:]
-                tuser = list(filter(lambda x: x.user_id == user_id, users))
-                if not tuser:
+                if self.verbose: print(codecs.encode(attendance_data[offset:offset + 16], 'hex'))
+                uid = users.uid_of(user_id)
+                if uid is None:
                     if self.verbose: print("no uid {}", user_id)
-                    uid = str(user_id)
-                    tuser = list(filter(lambda x: x.uid == user_id, users))  # refix
-                    if not tuser:
-                        uid = str(user_id)  # TODO revisar pq
-                    else:
-                        uid = tuser[0].uid
-                        user_id = tuser[0].user_id
-                else:
-                    uid = tuser[0].uid
+                    uid = user_id  # TODO revisar pq
                 timestamp = self.__decode_time(timestamp)
-                attendance = Attendance(user_id, timestamp, status, punch, uid)
-                attendances.append(attendance)
+                attendances.append(user_id, timestamp, status, punch, uid)
         else:
-            while len(attendance_data) >= 40:
-                uid, user_id, status, timestamp, punch, space = unpack('<H24sB4sB8s',
-                                                                       attendance_data.ljust(40, b'\x00')[:40])
-                if self.verbose: print(codecs.encode(attendance_data[:40], 'hex'))
+            for offset in range(4, len(attendance_data) - 39, 40):
+                uid, user_id, status, timestamp, punch, space = unpack_from('<H24sB4sB8s',
+                                                                            attendance_data, offset)
+                if self.verbose: print(codecs.encode(attendance_data[offset:offset + 40], 'hex'))
                 user_id = (user_id.split(b'\x00')[0]).decode(errors='ignore')
                 timestamp = self.__decode_time(timestamp)
 
-                attendance = Attendance(user_id, timestamp, status, punch, uid)
-                attendances.append(attendance)
-                attendance_data = attendance_data[40:]
+                attendances.append(user_id, timestamp, status, punch, uid)
         return attendances
 
     def clear_attendance(self):
@@ -15,3 +15,7 @@ class ZKErrorResponse(ZKError):
 
 class ZKNetworkError(ZKError):
     pass
+
+
+class ZKBufferChanged(ZKErrorResponse):
+    pass
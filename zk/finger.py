@@ -10,13 +10,18 @@ import codecs
 
 
 class Finger(object):
+    __slots__ = ('size', 'uid', 'fid', 'valid', 'template')
+
     def __init__(self, uid, fid, valid, template):
         self.size = len(template)  # template only
         self.uid = int(uid)
         self.fid = int(fid)
         self.valid = int(valid)
         self.template = template
-        self.mark = codecs.encode(template[:8], 'hex') + b'...' + codecs.encode(template[-8:], 'hex')
+
+    @property
+    def mark(self):  # preview, only built when printed
+        return codecs.encode(self.template[:8], 'hex') + b'...' + codecs.encode(self.template[-8:], 'hex')
 
     def repack(self):  # full
         return pack("HHbb%is" % (self.size), self.size + 6, self.uid, self.fid, self.valid, self.template)
@@ -43,7 +48,7 @@ class Finger(object):
         }
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return all(getattr(self, name) == getattr(other, name, None) for name in self.__slots__)
 
     def __str__(self):
         return "<Finger> [uid:{:>3}, fid:{}, size:{:>4} v:{} t:{}]".format(self.uid, self.fid, self.size, self.valid,
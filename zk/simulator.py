@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+"""
+Loopback ZKTeco terminal simulator.
+
+Listens on localhost (TCP and UDP on the same port) and answers the subset
+of the binary protocol used by zk.base.ZK, so the client can be exercised
+and benchmarked without hardware:
+
+    with ZKSimulator(users=500, records=100000, latency=0.06) as terminal:
+        zk = ZK('127.0.0.1', terminal.port, ommit_ping=True)
+        zk.connect()
+        attendances = zk.get_attendance()
+        zk.disconnect()
+
+Supported: CMD_CONNECT/CMD_AUTH (make_commkey), CMD_GET_FREE_SIZES, 1503
+prepared buffers with 1504 chunk reads (users, attendance, templates),
+CMD_USER_WRQ, CMD_DELETE_USER, CMD_PREPARE_DATA/CMD_DATA uploads saved
+with command 110, and CMD_REG_EVENT live attendance events. Any other
+command is acknowledged with CMD_ACK_OK.
+
+latency is added to every response (round trip), bandwidth (bytes/s)
+serializes responses on the link and packet_loss is the probability of a
+response never being sent. drop_every closes the TCP connection on every
+Nth 1504 chunk read, to exercise interrupted downloads.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from socket import AF_INET, SOCK_DGRAM, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, socket, timeout
+from struct import calcsize, pack, unpack
+
+from . import const
+from .base import make_commkey
+
+CMD_PREPARE_BUFFER = 1503
+CMD_READ_BUFFER = 1504
+CMD_SAVE_USERTEMPS = 110
+
+
+def encode_time(t):
+    """ timestamp as stored in attendance records (see ZK.__decode_time) """
+    return (
+        ((t.year % 100) * 12 * 31 + ((t.month - 1) * 31) + t.day - 1) *
+        (24 * 60 * 60) + (t.hour * 60 + t.minute) * 60 + t.second
+    )
+
+
+def encode_timehex(t):
+    """ timestamp as sent in live events (see ZK.__decode_timehex) """
+    return pack("6B", t.year - 2000, t.month, t.day, t.hour, t.minute, t.second)
+
+
+class _Link(object):
+    """ delivers the responses of one client after the simulated delay """
+
+    def __init__(self, simulator, send):
+        self.simulator = simulator
+        self.send = send
+        self.queue = []
+        self.sequence = 0
+        self.link_free_at = 0.0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def busy(self):
+        with self.condition:
+            return bool(self.queue)
+
+    def push(self, data, delay=None):
+        simulator = self.simulator
+        if simulator.packet_loss and simulator.random.random() < simulator.packet_loss:
+            return
+        now = time.time()
+        due = now + (simulator.latency if delay is None else delay)
+        if simulator.bandwidth:
+            due = max(due, self.link_free_at) + len(data) / float(simulator.bandwidth)
+            self.link_free_at = due
+        with self.condition:
+            self.sequence += 1
+            heappush(self.queue, (due, self.sequence, data))
+            self.condition.notify()
+
+    def close(self, flush=False):
+        """ stop delivering, after sending what is queued if flush """
+        with self.condition:
+            while flush and self.queue and not self.closed:
+                self.condition.wait(0.05)
+            self.closed = True
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.queue or self.queue[0][0] > time.time()):
+                    wait = self.queue[0][0] - time.time() if self.queue else None
+                    self.condition.wait(wait)
+                if self.closed:
+                    return
+                _due, _sequence, data = heappop(self.queue)
+                try:
+                    self.send(data)
+                except OSError:
+                    self.closed = True
+                    return
+                self.condition.notify_all()
+
+
+class _Session(object):
+    """ per client protocol state """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.authenticated = False
+        self.buffer = b''
+        self.upload = bytearray()
+        self.live_events = False
+
+
+class ZKSimulator(object):
+    """ fake ZKTeco terminal listening on localhost """
+
+    def __init__(self, host='127.0.0.1', port=0, users=10, records=0, fingers_per_user=0, record_size=40,
+                 user_packet_size=72, password=0, latency=0.0, bandwidth=None, packet_loss=0.0,
+                 live_event_interval=None, pipelining=True, drop_every=None, seed=None):
+        if record_size not in (8, 16, 40):
+            raise ValueError("record_size must be 8, 16 or 40")
+        if user_packet_size not in (28, 72):
+            raise ValueError("user_packet_size must be 28 or 72")
+        self.host = host
+        self.port = port
+        self.record_size = record_size
+        self.user_packet_size = user_packet_size
+        self.password = int(password)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.packet_loss = packet_loss
+        self.live_event_interval = live_event_interval
+        self.pipelining = pipelining
+        self.drop_every = drop_every
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.chunk_reads = 0
+        self.users = {}
+        self.fingers = {}
+        self.attendances = []
+        for uid in range(1, users + 1):
+            self.users[uid] = {
+                'uid': uid, 'privilege': const.USER_DEFAULT, 'password': '', 'name': 'User %s' % uid,
+                'card': 0, 'group_id': '1', 'user_id': str(uid),
+            }
+            for fid in range(fingers_per_user):
+                self.fingers[(uid, fid)] = bytes(self.random.getrandbits(8) for _ in range(512))
+        start = datetime(2024, 1, 1, 7, 0, 0)
+        for index in range(records):
+            uid = index % users + 1 if users else 1
+            self.attendances.append((uid, start + timedelta(seconds=37 * index), index % 2, 1))
+        self.__tcp = None
+        self.__udp = None
+        self.__threads = []
+        self.__running = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ----------------------------------------------------------------- server
+    def start(self):
+        self.__tcp = socket(AF_INET, SOCK_STREAM)
+        self.__tcp.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.__tcp.bind((self.host, self.port))
+        self.port = self.__tcp.getsockname()[1]
+        self.__tcp.listen(16)
+        self.__tcp.settimeout(0.2)
+        self.__udp = socket(AF_INET, SOCK_DGRAM)
+        self.__udp.bind((self.host, self.port))
+        self.__udp.settimeout(0.2)
+        self.__running = True
+        for target in (self.__serve_tcp, self.__serve_udp):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        return self
+
+    def stop(self):
+        self.__running = False
+        for thread in self.__threads:
+            thread.join(2)
+        self.__tcp.close()
+        self.__udp.close()
+
+    def __serve_tcp(self):
+        while self.__running:
+            try:
+                client, _address = self.__tcp.accept()
+            except timeout:
+                continue
+            except OSError:
+                return
+            thread = threading.Thread(target=self.__serve_tcp_client, args=(client,), daemon=True)
+            thread.start()
+
+    def __serve_tcp_client(self, client):
+        client.settimeout(0.2)
+        link = _Link(self, client.sendall)
+        session = None
+        pending = b''
+        try:
+            while self.__running:
+                try:
+                    received = client.recv(0x10000)
+                except timeout:
+                    continue
+                if not received:
+                    break
+                pending += received
+                while len(pending) >= 8:
+                    magic1, magic2, length = unpack('<HHI', pending[:8])
+                    if magic1 != const.MACHINE_PREPARE_DATA_1 or magic2 != const.MACHINE_PREPARE_DATA_2:
+                        return
+                    if len(pending) < 8 + length:
+                        break
+                    packet, pending = pending[8:8 + length], pending[8 + length:]
+                    session, close = self.__dispatch(session, packet, link, tcp=True)
+                    if close:
+                        link.close(flush=True)
+                        return
+        finally:
+            link.close()
+            client.close()
+
+    def __serve_udp(self):
+        sessions = {}
+        links = {}
+        while self.__running:
+            try:
+                packet, address = self.__udp.recvfrom(0x10000)
+            except timeout:
+                continue
+            except OSError:
+                return
+            if address not in links:
+                links[address] = _Link(self, lambda data, address=address: self.__udp.sendto(data, address))
+            session, close = self.__dispatch(sessions.get(address), packet, links[address], tcp=False)
+            sessions[address] = session
+            if close:
+                sessions.pop(address, None)
+
+    # --------------------------------------------------------------- protocol
+    @staticmethod
+    def __packet(command, session_id, reply_id, payload=b'', tcp=True):
+        packet = pack('<4H', command, 0, session_id, reply_id) + payload
+        if tcp:
+            packet = pack('<HHI', const.MACHINE_PREPARE_DATA_1, const.MACHINE_PREPARE_DATA_2, len(packet)) + packet
+        return packet
+
+    def __dispatch(self, session, packet, link, tcp):
+        """ answer one request, return the session and whether to close """
+        command, _checksum, _session_id, reply_id = unpack('<4H', packet[:8])
+        payload = packet[8:]
+        with self.lock:
+            self.requests += 1
+        if command == const.CMD_CONNECT:
+            session = _Session(self.random.randint(1, 0xFFFE))
+            session.authenticated = not self.password
+            code = const.CMD_ACK_OK if session.authenticated else const.CMD_ACK_UNAUTH
+            link.push(self.__packet(code, session.session_id, reply_id, tcp=tcp))
+            return session, False
+        if session is None:
+            return session, False
+        if command == const.CMD_AUTH:
+            session.authenticated = payload[:4] == make_commkey(self.password, session.session_id)
+            code = const.CMD_ACK_OK if session.authenticated else const.CMD_ACK_UNAUTH
+            link.push(self.__packet(code, session.session_id, reply_id, tcp=tcp))
+            return session, False
+        if not session.authenticated:
+            link.push(self.__packet(const.CMD_ACK_UNAUTH, session.session_id, reply_id, tcp=tcp))
+            return session, False
+        if command == CMD_READ_BUFFER:
+            with self.lock:
+                self.chunk_reads += 1
+                drop = tcp and self.drop_every and self.chunk_reads % self.drop_every == 0
+            if drop:
+                link.close()
+                return session, True
+        if command == CMD_READ_BUFFER and not self.pipelining and link.busy():
+            link.push(self.__packet(const.CMD_ACK_ERROR_CMD, session.session_id, reply_id, tcp=tcp))
+            return session, False
+
+        packets = [
+            self.__packet(code, session.session_id, reply_id, data, tcp=tcp)
+            for code, data in self.__handle(session, command, payload, link, tcp)
+        ]
+        if not packets:
+            return session, False
+        if tcp:
+            link.push(b''.join(packets))
+        else:
+            for packet in packets:
+                link.push(packet)
+        return session, command == const.CMD_EXIT
+
+    def __handle(self, session, command, payload, link, tcp):
+        """ return the (command, payload) packets answering a request """
+        ack = [(const.CMD_ACK_OK, b'')]
+        if command == const.CMD_ACK_OK:
+            # the client acknowledging a live event, left unanswered
+            return []
+        if command == const.CMD_GET_FREE_SIZES:
+            fields = [0] * 20
+            fields[4] = len(self.users)
+            fields[6] = len(self.fingers)
+            fields[8] = len(self.attendances)
+            fields[14], fields[15], fields[16] = 3000, 3000, 100000
+            fields[17] = fields[14] - len(self.fingers)
+            fields[18] = fields[15] - len(self.users)
+            fields[19] = fields[16] - len(self.attendances)
+            return [(const.CMD_ACK_OK, pack('20i', *fields) + pack('3i', 0, 0, 0))]
+        if command == CMD_PREPARE_BUFFER:
+            _flag, data_command, fct, _ext = unpack('<bhii', payload[:11])
+            session.buffer = self.__build_buffer(data_command, fct)
+            return [(const.CMD_ACK_OK, b'\x00' + pack('<I', len(session.buffer)) + b'\x00' * 4)]
+        if command == CMD_READ_BUFFER:
+            start, size = unpack('<ii', payload[:8])
+            data = session.buffer[start:start + size]
+            if tcp:
+                return [(const.CMD_PREPARE_DATA, pack('<II', len(data), 0)), (const.CMD_DATA, data)] + ack
+            packets = [(const.CMD_PREPARE_DATA, pack('<II', len(data), 0))]
+            packets += [(const.CMD_DATA, data[index:index + 1024]) for index in range(0, len(data), 1024)]
+            return packets + ack
+        if command == const.CMD_FREE_DATA:
+            session.buffer = b''
+            return ack
+        if command == const.CMD_USER_WRQ:
+            self.__write_user(payload)
+            return ack
+        if command == const.CMD_DELETE_USER:
+            uid = unpack('h', payload[:2])[0]
+            with self.lock:
+                self.users.pop(uid, None)
+                for key in [key for key in self.fingers if key[0] == uid]:
+                    del self.fingers[key]
+            return ack
+        if command == const.CMD_PREPARE_DATA:
+            session.upload = bytearray()
+            return ack
+        if command == const.CMD_DATA:
+            session.upload += payload
+            return ack
+        if command == CMD_SAVE_USERTEMPS:
+            self.__save_usertemplates(bytes(session.upload))
+            return ack
+        if command == const.CMD_REG_EVENT:
+            flags = unpack('I', payload[:4])[0] if len(payload) >= 4 else 0
+            session.live_events = bool(flags)
+            if session.live_events and self.live_event_interval:
+                threading.Thread(target=self.__emit_live_events, args=(session, link, tcp), daemon=True).start()
+            return ack
+        return ack
+
+    # ------------------------------------------------------------------- data
+    def __build_buffer(self, data_command, fct):
+        with self.lock:
+            if data_command == const.CMD_USERTEMP_RRQ and fct == const.FCT_USER:
+                body = b''.join(self.__pack_user(user) for _uid, user in sorted(self.users.items()))
+            elif data_command == const.CMD_ATTLOG_RRQ:
+                body = b''.join(self.__pack_attendance(*record) for record in self.attendances)
+            elif data_command == const.CMD_DB_RRQ and fct == const.FCT_FINGERTMP:
+                body = b''.join(
+                    pack('HHbb%is' % len(template), len(template) + 6, uid, fid, 1, template)
+                    for (uid, fid), template in sorted(self.fingers.items())
+                )
+            else:
+                body = b''
+        return pack('I', len(body)) + body
+
+    def __pack_user(self, user):
+        if self.user_packet_size == 28:
+            return pack('<HB5s8sIxBhI', user['uid'], user['privilege'], user['password'].encode(),
+                        user['name'].encode()[:8], user['card'], int(user['group_id'] or 0), 0,
+                        int(user['user_id']))
+        return pack('<HB8s24sIx7sx24s', user['uid'], user['privilege'], user['password'].encode(),
+                    user['name'].encode()[:24], user['card'], user['group_id'].encode(), user['user_id'].encode())
+
+    def __pack_attendance(self, uid, timestamp, status, punch):
+        user_id = self.users.get(uid, {}).get('user_id', str(uid))
+        encoded = pack('<I', encode_time(timestamp))
+        if self.record_size == 8:
+            return pack('<HB4sB', uid, status, encoded, punch)
+        if self.record_size == 16:
+            return pack('<I4sBB2sI', int(user_id), encoded, status, punch, b'\x00\x00', 0)
+        return pack('<H24sB4sB8s', uid, user_id.encode(), status, encoded, punch, b'')
+
+    def __write_user(self, payload):
+        if self.user_packet_size == 28:
+            uid, privilege, password, name, card, group_id, _timezone, user_id = unpack(
+                'HB5s8sIxBHI', payload[:calcsize('HB5s8sIxBHI')])
+            group_id, user_id = str(group_id), str(user_id)
+        else:
+            uid, privilege, password, name, card, group_id, user_id = unpack(
+                'HB8s24s4sx7sx24s', payload[:calcsize('HB8s24s4sx7sx24s')])
+            card = unpack('i', card)[0]
+            group_id = group_id.split(b'\x00')[0].decode()
+            user_id = user_id.split(b'\x00')[0].decode()
+        with self.lock:
+            self.users[uid] = {
+                'uid': uid, 'privilege': privilege, 'password': password.split(b'\x00')[0].decode(),
+                'name': name.split(b'\x00')[0].decode(errors='ignore'), 'card': card,
+                'group_id': group_id, 'user_id': user_id,
+            }
+
+    def __save_usertemplates(self, data):
+        """ store the users and fingers of a ZK.HR_save_usertemplates upload """
+        user_size, table_size, finger_size = unpack('III', data[:12])
+        users = data[12:12 + user_size]
+        table = data[12 + user_size:12 + user_size + table_size]
+        fingers = data[12 + user_size + table_size:12 + user_size + table_size + finger_size]
+        packet_size = 29 if self.user_packet_size == 28 else 73
+        with self.lock:
+            for index in range(0, len(users), packet_size):
+                packed = users[index:index + packet_size]
+                if packet_size == 29:
+                    _tag, uid, privilege, password, name, card, group_id, _tz, user_id = unpack(
+                        '<BHB5s8sIxBhI', packed)
+                    group_id, user_id = str(group_id), str(user_id)
+                else:
+                    _tag, uid, privilege, password, name, card, _flag, group_id, user_id = unpack(
+                        '<BHB8s24sIB7sx24s', packed)
+                    group_id = group_id.split(b'\x00')[0].decode()
+                    user_id = user_id.split(b'\x00')[0].decode()
+                self.users[uid] = {
+                    'uid': uid, 'privilege': privilege, 'password': password.split(b'\x00')[0].decode(),
+                    'name': name.split(b'\x00')[0].decode(errors='ignore'), 'card': card,
+                    'group_id': group_id, 'user_id': user_id,
+                }
+            for index in range(0, len(table), 8):
+                _tag, uid, fnum, offset = unpack('<bHbI', table[index:index + 8])
+                size = unpack('H', fingers[offset:offset + 2])[0]
+                self.fingers[(uid, fnum - 0x10)] = fingers[offset + 2:offset + 2 + size]
+
+    def __emit_live_events(self, session, link, tcp):
+        """ send a CMD_REG_EVENT attendance for a random user every interval """
+        while self.__running and session.live_events:
+            time.sleep(self.live_event_interval)
+            with self.lock:
+                if not self.users or not session.live_events:
+                    continue
+                user = self.users[self.random.choice(list(self.users))]
+                now = datetime.now().replace(microsecond=0)
+                self.attendances.append((user['uid'], now, 0, 1))
+            if self.user_packet_size == 28:
+                data = pack('<IBB6s', int(user['user_id']), 0, 1, encode_timehex(now))
+            else:
+                data = pack('<24sBB6s', user['user_id'].encode(), 0, 1, encode_timehex(now)) + b'\x00' * 4
+            link.push(self.__packet(const.CMD_REG_EVENT, session.session_id, 0, data, tcp=tcp))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a fake ZKTeco terminal until interrupted.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4370)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--fingers-per-user', type=int, default=0)
+    parser.add_argument('--record-size', type=int, choices=(8, 16, 40), default=40)
+    parser.add_argument('--user-packet-size', type=int, choices=(28, 72), default=72)
+    parser.add_argument('--password', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=int, default=None)
+    parser.add_argument('--packet-loss', type=float, default=0.0)
+    parser.add_argument('--live-event-interval', type=float, default=None)
+    options = parser.parse_args()
+    simulator = ZKSimulator(
+        host=options.host, port=options.port, users=options.users, records=options.records,
+        fingers_per_user=options.fingers_per_user, record_size=options.record_size,
+        user_packet_size=options.user_packet_size, password=options.password, latency=options.latency,
+        bandwidth=options.bandwidth, packet_loss=options.packet_loss,
+        live_event_interval=options.live_event_interval,
+    )
+    with simulator:
+        print("ZKTeco simulator listening on %s:%s" % (simulator.host, simulator.port))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+"""
+Tests of the protocol client, runnable without Odoo nor a device:
+
+    python -m unittest discover -s zk/tests -t .
+"""
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import random
+import unittest
+from struct import pack, unpack
+
+from .. import const
+from ..base import ZK
+
+
+def reference_checksum(p):
+    """ the original zkemsdk.c port, one word at a time """
+    l = len(p)
+    checksum = 0
+    while l > 1:
+        checksum += unpack('H', pack('BB', p[0], p[1]))[0]
+        p = p[2:]
+        if checksum > const.USHRT_MAX:
+            checksum -= const.USHRT_MAX
+        l -= 2
+    if l:
+        checksum = checksum + p[-1]
+
+    while checksum > const.USHRT_MAX:
+        checksum -= const.USHRT_MAX
+
+    checksum = ~checksum
+
+    while checksum < 0:
+        checksum += const.USHRT_MAX
+
+    return pack('H', checksum)
+
+
+class TestChecksum(unittest.TestCase):
+
+    def setUp(self):
+        self.zk = ZK('127.0.0.1')
+        self.checksum = self.zk._ZK__create_checksum
+        self.addCleanup(self.zk._ZK__sock.close)
+
+    def test_random_payloads(self):
+        generator = random.Random(4370)
+        for _index in range(2000):
+            size = generator.choice((generator.randrange(0, 64), generator.randrange(64, 4096)))
+            payload = bytes(generator.getrandbits(8) for _ in range(size))
+            self.assertEqual(self.checksum(payload), reference_checksum(payload), payload.hex())
+
+    def test_edge_payloads(self):
+        payloads = [b'', b'\x00', b'\xff', b'\x00' * 1024, b'\xff' * 1024, b'\xff' * 1025,
+                    b'\xff\xfe', b'\x01\x00' * 0xffff, pack('<H', const.USHRT_MAX) * 3]
+        for payload in payloads:
+            self.assertEqual(self.checksum(payload), reference_checksum(payload), payload[:16].hex())
+
+    def test_accepts_bytearray_and_memoryview(self):
+        payload = bytes(range(256)) * 5
+        expected = reference_checksum(payload)
+        self.assertEqual(self.checksum(bytearray(payload)), expected)
+        self.assertEqual(self.checksum(memoryview(payload)), expected)
+
+    def test_header_checksum(self):
+        """ a header rebuilt with its checksum word zeroed sums to the original checksum """
+        command_string = bytes(range(200))
+        header = self.zk._ZK__create_header(const.CMD_DATA, command_string, 1234, 7)
+        command, checksum, session_id, reply_id = unpack('<4H', header[:8])
+        self.assertEqual((command, session_id, reply_id), (const.CMD_DATA, 1234, 8))
+        unsigned = pack('<4H', command, 0, session_id, reply_id - 1) + command_string
+        self.assertEqual(checksum, unpack('H', reference_checksum(unsigned))[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) 2024 DOTSPRIME SYSTEM LLP
+#    Email : sales@dotsprime.com / dotsprime@gmail.com
+########################################################
+
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from .. import base
+from ..base import ZK
+from ..finger import Finger
+from ..simulator import ZKSimulator
+from ..user import User
+
+USERS = 50
+RECORDS = 3000
+
+
+class SimulatorCase(unittest.TestCase):
+    """ run the client against a ZKSimulator terminal on localhost """
+
+    def start_terminal(self, **options):
+        options.setdefault('users', USERS)
+        options.setdefault('seed', 4370)
+        terminal = ZKSimulator(**options).start()
+        self.addCleanup(terminal.stop)
+        return terminal
+
+    def connect(self, terminal, **options):
+        base._transports.clear()
+        zk = ZK('127.0.0.1', terminal.port, timeout=5, **options)
+        zk.connect()
+        self.addCleanup(self.disconnect, zk)
+        return zk
+
+    def disconnect(self, zk):
+        if zk.is_connect:
+            zk.disconnect()
+
+    def expected_attendances(self, terminal):
+        return [
+            (terminal.users[uid]['user_id'], timestamp, status, punch)
+            for uid, timestamp, status, punch in terminal.attendances
+        ]
+
+    def assertAttendances(self, attendances, terminal):
+        self.assertEqual(
+            [(a.user_id, a.timestamp, a.status, a.punch) for a in attendances],
+            self.expected_attendances(terminal),
+        )
+
+
+class TestRoundTrip(SimulatorCase):
+
+    def test_get_users(self):
+        for user_packet_size in (28, 72):
+            with self.subTest(user_packet_size=user_packet_size):
+                terminal = self.start_terminal(user_packet_size=user_packet_size)
+                zk = self.connect(terminal)
+                users = zk.get_users()
+                self.assertEqual(zk.user_packet_size, user_packet_size)
+                self.assertEqual(
+                    [(u.uid, u.user_id, u.privilege, u.card) for u in users],
+                    [(u['uid'], u['user_id'], u['privilege'], u['card'])
+                     for _uid, u in sorted(terminal.users.items())],
+                )
+                # names are truncated to 8 bytes by the 28 bytes layout
+                self.assertEqual(users[0].name, 'User 1')
+
+    def test_get_attendance(self):
+        for record_size in (8, 16, 40):
+            with self.subTest(record_size=record_size):
+                terminal = self.start_terminal(records=RECORDS, record_size=record_size)
+                zk = self.connect(terminal)
+                attendances = zk.get_attendance()
+                self.assertEqual(len(attendances), RECORDS)
+                self.assertAttendances(attendances, terminal)
+
+    def test_get_attendance_udp(self):
+        terminal = self.start_terminal(records=RECORDS)
+        zk = self.connect(terminal, force_udp=True)
+        self.assertFalse(zk.tcp)
+        self.assertAttendances(zk.get_attendance(), terminal)
+
+    def test_set_and_delete_user(self):
+        terminal = self.start_terminal()
+        zk = self.connect(terminal)
+        zk.set_user(uid=USERS + 1, name='Added', user_id='9001')
+        self.assertEqual(terminal.users[USERS + 1]['user_id'], '9001')
+        self.assertEqual(zk.get_users()[-1].name, 'Added')
+        zk.delete_user(uid=USERS + 1)
+        self.assertNotIn(USERS + 1, terminal.users)
+        self.assertEqual(len(zk.get_users()), USERS)
+
+    def test_save_user_templates(self):
+        for user_packet_size in (28, 72):
+            with self.subTest(user_packet_size=user_packet_size):
+                terminal = self.start_terminal(user_packet_size=user_packet_size)
+                zk = self.connect(terminal)
+                # the user packet size is only known once the users were read
+                zk.get_users()
+                templates = {
+                    (uid, fid): bytes((uid + fid + index) % 256 for index in range(300 + fid))
+                    for uid in (USERS + 1, USERS + 2) for fid in (0, 6)
+                }
+                new_users = [User(uid, 'Saved %s' % uid, 0, '', '1', str(9000 + uid)) for uid in (USERS + 1, USERS + 2)]
+                zk.HR_save_usertemplates([
+                    (user, [Finger(user.uid, fid, 1, templates[user.uid, fid]) for fid in (0, 6)])
+                    for user in new_users
+                ])
+                # a single user through save_user_template, found by its user id
+                zk.save_user_template('1', Finger(1, 3, 1, b'\x01' * 100))
+                templates[1, 3] = b'\x01' * 100
+                for (uid, fid), template in templates.items():
+                    self.assertEqual(terminal.fingers[uid, fid], template)
+                self.assertEqual(terminal.users[USERS + 2]['user_id'], str(9000 + USERS + 2))
+                self.assertEqual([user.uid for user in zk.get_users()], list(range(1, USERS + 3)))
+
+    def test_authentication(self):
+        terminal = self.start_terminal(password=1234)
+        zk = self.connect(terminal, password=1234)
+        self.assertEqual(len(zk.get_users()), USERS)
+
+    def test_live_capture(self):
+        terminal = self.start_terminal(live_event_interval=0.05)
+        zk = self.connect(terminal)
+        events = []
+        for event in zk.live_capture(new_timeout=2):
+            if event is None:
+                break
+            events.append(event)
+            if len(events) == 3:
+                zk.end_live_capture = True
+        self.assertEqual(len(events), 3)
+        for event, (uid, timestamp, status, punch) in zip(events, terminal.attendances):
+            self.assertEqual((event.user_id, event.timestamp, event.status, event.punch),
+                             (terminal.users[uid]['user_id'], timestamp, status, punch))
+
+
+class TestInterruptedRead(SimulatorCase):
+
+    def setUp(self):
+        # no backoff between the reconnections of a resumed read
+        patcher = patch.object(base, 'RESUME_BACKOFF', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resume_after_drops(self):
+        for record_size in (8, 16, 40):
+            with self.subTest(record_size=record_size):
+                # chunks of 0xFFc0 bytes: every layout needs several of them
+                terminal = self.start_terminal(records=20000, record_size=record_size, drop_every=2)
+                zk = self.connect(terminal)
+                attendances = zk.get_attendance()
+                self.assertAttendances(attendances, terminal)
+                self.assertGreater(terminal.chunk_reads, 2)
+
+    def test_resume_gives_up(self):
+        terminal = self.start_terminal(records=20000, drop_every=1)
+        zk = self.connect(terminal)
+        with self.assertRaises(base.ZKErrorResponse):
+            zk.read_with_buffer(base.const.CMD_ATTLOG_RRQ)
+        zk.is_connect = False  # the terminal closed the connection
+
+    def test_buffer_changed_not_retried(self):
+        terminal = self.start_terminal(records=20000, drop_every=2)
+        zk = self.connect(terminal)
+        resumes = []
+
+        def punch_while_disconnected(delay):
+            resumes.append(delay)
+            terminal.attendances.append((1, datetime(2024, 1, 1, 8, 0), 0, 1))
+
+        with patch.object(base.time, 'sleep', punch_while_disconnected):
+            with self.assertRaises(base.ZKBufferChanged):
+                zk.read_with_buffer(base.const.CMD_ATTLOG_RRQ)
+        self.assertEqual(len(resumes), 1)
+
+
+class TestPipelinedRead(SimulatorCase):
+
+    def test_pipelined_matches_lock_step(self):
+        for record_size in (8, 16, 40):
+            with self.subTest(record_size=record_size):
+                terminal = self.start_terminal(records=20000, record_size=record_size)
+                lock_step = self.connect(terminal).read_with_buffer(base.const.CMD_ATTLOG_RRQ)
+                zk = self.connect(terminal, pipeline_depth=4)
+                chunk_reads = terminal.chunk_reads
+                pipelined = zk.read_with_buffer(base.const.CMD_ATTLOG_RRQ)
+                self.assertEqual(pipelined, lock_step)
+                self.assertEqual(zk.pipeline_depth, 4)
+                # the adaptive sizing starts below the lock-step chunk size
+                self.assertGreater(terminal.chunk_reads - chunk_reads, -(-lock_step[1] // 0xFFc0))
+                self.assertAttendances(zk.get_attendance(), terminal)
+
+    def test_falls_back_to_lock_step(self):
+        terminal = self.start_terminal(records=20000, pipelining=False)
+        zk = self.connect(terminal, pipeline_depth=4)
+        attendances = zk.get_attendance()
+        self.assertEqual(zk.pipeline_depth, 1)
+        self.assertAttendances(attendances, terminal)
+
+    def test_pipelined_with_latency(self):
+        terminal = self.start_terminal(records=20000, latency=0.02)
+        zk = self.connect(terminal, pipeline_depth=8)
+        self.assertAttendances(zk.get_attendance(), terminal)
+
+
+if __name__ == '__main__':
+    unittest.main()
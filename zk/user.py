@@ -5,10 +5,12 @@
 #    Email : sales@dotsprime.com / dotsprime@gmail.com
 ########################################################
 
+from array import array
 from struct import pack  # , unpack
 
 
 class User(object):
+    __slots__ = ('uid', 'name', 'privilege', 'password', 'group_id', 'user_id', 'card')
     encoding = 'UTF-8'
 
     def __init__(self, uid, name, privilege, password='', group_id='', user_id='', card=0):
@@ -49,3 +51,103 @@ class User(object):
 
     def __repr__(self):
         return '<User>: [uid:{}, name:{} user_id:{}]'.format(self.uid, self.name, self.user_id)
+
+
+class UserTable(object):
+    """
+    Columnar list of device users, as returned by get_users.
+
+    Fields are kept in arrays and lists rather than one object per user;
+    indexing or iterating builds the User objects on demand, so a table
+    reads like the former list. uid and user_id are indexed as the table is
+    filled, the first user of a duplicated user_id wins; upsert and remove
+    keep the indexes in step when the table is used as a cache.
+    """
+
+    def __init__(self):
+        self.uids = array('H')
+        self.privileges = array('B')
+        self.cards = array('Q')
+        self.names = []
+        self.passwords = []
+        self.group_ids = []
+        self.user_ids = []
+        self.rows_by_uid = {}
+        self.rows_by_user_id = {}
+
+    def append(self, uid, name, privilege, password='', group_id='', user_id='', card=0):
+        row = len(self.uids)
+        self.uids.append(uid)
+        self.privileges.append(privilege)
+        self.cards.append(int(card))
+        self.names.append(str(name))
+        self.passwords.append(str(password))
+        self.group_ids.append(str(group_id))
+        self.user_ids.append(user_id)
+        self.rows_by_uid.setdefault(uid, row)
+        self.rows_by_user_id.setdefault(user_id, row)
+
+    def upsert(self, uid, name, privilege, password='', group_id='', user_id='', card=0):
+        """ update the user of uid in place, or append it """
+        row = self.rows_by_uid.get(uid)
+        if row is None:
+            self.append(uid, name, privilege, password, group_id, user_id, card)
+            return
+        self.privileges[row] = privilege
+        self.cards[row] = int(card)
+        self.names[row] = str(name)
+        self.passwords[row] = str(password)
+        self.group_ids[row] = str(group_id)
+        if self.user_ids[row] != user_id:
+            self.user_ids[row] = user_id
+            self._reindex()
+
+    def remove(self, uid):
+        """ remove the users of uid, return whether there was one """
+        rows = [row for row, row_uid in enumerate(self.uids) if row_uid == uid] if uid in self.rows_by_uid else []
+        for row in reversed(rows):
+            for column in (self.uids, self.privileges, self.cards, self.names, self.passwords, self.group_ids,
+                           self.user_ids):
+                del column[row]
+        if rows:
+            self._reindex()
+        return bool(rows)
+
+    def _reindex(self):
+        # built backwards so the first row of a duplicated key wins
+        self.rows_by_uid = {uid: row for row, uid in reversed(list(enumerate(self.uids)))}
+        self.rows_by_user_id = {user_id: row for row, user_id in reversed(list(enumerate(self.user_ids)))}
+
+    def by_uid(self, uid):
+        row = self.rows_by_uid.get(uid)
+        return None if row is None else self[row]
+
+    def by_user_id(self, user_id):
+        row = self.rows_by_user_id.get(user_id)
+        return None if row is None else self[row]
+
+    def uid_of(self, user_id, default=None):
+        row = self.rows_by_user_id.get(user_id)
+        return default if row is None else self.uids[row]
+
+    def user_id_of(self, uid, default=None):
+        row = self.rows_by_uid.get(uid)
+        return default if row is None else self.user_ids[row]
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[index] for index in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        return User(self.uids[row], self.names[row], self.privileges[row], self.passwords[row],
+                    self.group_ids[row], self.user_ids[row], self.cards[row])
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def __repr__(self):
+        return '<UserTable>: {} users'.format(len(self))